@@ -1,8 +1,14 @@
+import os
 import re
 import json
+import time
+from collections import OrderedDict
+from html import escape
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
-import streamlit.components.v1 as components
 from bs4 import BeautifulSoup
 from streamlit_option_menu import option_menu
 
@@ -11,15 +17,33 @@ st.set_page_config(page_title="AI Code Assistant", layout="wide")
 
 # Constants
 API_CONFIG = {
-    "BASE_URL": "https://generation-ai.onrender.com/v1/generate",
+    "BASE_URL": os.getenv("API_BASE_URL", "https://generation-ai.onrender.com/v1/generate"),
     "ENDPOINTS": {
         "code": "/generate-code",
         "document": "/generate-document",
         "story": "/generate-story",
-        "chat": "/chat",
+        "chat": "/chat/",
+        "chat_sessions": "/chat/sessions",
+    },
+    # Server-Sent Events variants of the generation endpoints
+    "STREAM_ENDPOINTS": {
+        "code": "/generate-code/stream",
+        "document": "/generate-document/stream",
+        "story": "/generate-story/stream",
+        "chat": "/chat/stream",
     },
+    # (connect, read) seconds; the read timeout applies between streamed chunks
+    "TIMEOUT": (5, 120),
+    "POOL_SIZE": 20,
 }
 
+# Responses remembered per browser session, keyed by endpoint and payload
+RESPONSE_CACHE_SIZE = 50
+# Chat messages rendered at once; older ones are revealed a page at a time
+CHAT_PAGE_SIZE = 20
+# Minimum seconds between placeholder updates while streaming
+STREAM_RENDER_INTERVAL = 0.05
+
 LANGUAGE_OPTIONS = ["Python", "JavaScript", "Java","Laravel","Typescript","Nextjs", "C++", "PHP", "HTML", "CSS", "Ruby", "Kotlin"]
 STORY_FORMS = ["Short Story", "Poem", "Novel Chapter"]
 
@@ -28,18 +52,109 @@ USER_AVATAR_URL = "https://cdn-icons-png.flaticon.com/512/3135/3135715.png"
 BOT_AVATAR_URL = "https://cdn-icons-png.flaticon.com/512/4712/4712109.png"
 
 
+@st.cache_resource
+def get_http_session():
+    """
+    One pooled keep-alive session per Streamlit process, shared by every rerun and browser
+    session, so requests reuse TCP/TLS connections to the API.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=API_CONFIG["POOL_SIZE"],
+        # Only connection failures are retried; generation requests are not idempotent
+        max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
 class APIClient:
     @staticmethod
-    def send_request(endpoint, payload):
+    def send_request(endpoint, payload, method="POST"):
         url = f"{API_CONFIG['BASE_URL']}{API_CONFIG['ENDPOINTS'][endpoint]}"
         try:
-            response = requests.post(url, json=payload, headers={"Content-Type": "application/json"})
+            response = get_http_session().request(method, url, json=payload, timeout=API_CONFIG["TIMEOUT"])
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             st.error(f"API Request failed: {str(e)}")
             return None
 
+    @staticmethod
+    def stream_events(endpoint, payload):
+        """
+        POSTs to the streaming variant of `endpoint` and yields (event, data) pairs
+        from the Server-Sent Events response as they arrive.
+        """
+        url = f"{API_CONFIG['BASE_URL']}{API_CONFIG['STREAM_ENDPOINTS'][endpoint]}"
+        with get_http_session().post(url, json=payload, stream=True, timeout=API_CONFIG["TIMEOUT"]) as response:
+            response.raise_for_status()
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):])
+                    event = "message"
+
+    @staticmethod
+    def stream_request(endpoint, payload, render, memoize=True):
+        """
+        Streams a generation, calling `render(text_so_far)` as tokens arrive (throttled),
+        and returns the final payload, or None on failure. With `memoize`, results are
+        remembered per browser session, so repeating a request renders instantly.
+        """
+        if memoize:
+            cached = APIClient.cached_response(endpoint, payload)
+            if cached is not None:
+                return cached
+
+        parts = []
+        last_render = 0.0
+        try:
+            for event, data in APIClient.stream_events(endpoint, payload):
+                if event == "token":
+                    parts.append(data["text"])
+                    now = time.monotonic()
+                    if now - last_render >= STREAM_RENDER_INTERVAL:
+                        render("".join(parts))
+                        last_render = now
+                elif event == "done":
+                    if memoize:
+                        APIClient.remember_response(endpoint, payload, data)
+                    return data
+                elif event == "error":
+                    st.error(f"Generation failed: {data.get('detail')}")
+                    return None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            st.error(f"API Request failed: {str(e)}")
+            return None
+        st.error("The response ended before generation finished.")
+        return None
+
+    @staticmethod
+    def _cache_key(endpoint, payload):
+        return endpoint, json.dumps(payload, sort_keys=True)
+
+    @staticmethod
+    def cached_response(endpoint, payload):
+        cache = st.session_state.setdefault("response_cache", OrderedDict())
+        key = APIClient._cache_key(endpoint, payload)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        return None
+
+    @staticmethod
+    def remember_response(endpoint, payload, result):
+        cache = st.session_state.setdefault("response_cache", OrderedDict())
+        cache[APIClient._cache_key(endpoint, payload)] = result
+        while len(cache) > RESPONSE_CACHE_SIZE:
+            cache.popitem(last=False)
+
     @staticmethod
     def generate_curl_command(endpoint, payload):
         url = f"{API_CONFIG['BASE_URL']}{API_CONFIG['ENDPOINTS'][endpoint]}"
@@ -115,11 +230,13 @@ class UI:
                 st.error("Please provide both language and question.")
                 return
 
-            with st.spinner("Generating code..."):
-                payload = {"language": language, "question": question}
-                result = APIClient.send_request("code", payload)
-                if result:
-                    UI.display_code_results(result, language)
+            payload = {"language": language, "question": question}
+            placeholder = st.empty()
+            placeholder.caption("Generating code...")
+            result = APIClient.stream_request("code", payload, UI.html_renderer(placeholder))
+            placeholder.empty()
+            if result:
+                UI.display_code_results(result, language)
 
     @staticmethod
     def show_document_generator():
@@ -132,14 +249,15 @@ class UI:
                 st.error("Please provide a document topic.")
                 return
 
-            with st.spinner("Generating document..."):
-                payload = {"document_topic": topic, "word_count": word_count}
-                result = APIClient.send_request("document", payload)
-                if result:
-                    st.markdown(
-                        ResponseParser.format_document(result.get("document", "")),
-                        unsafe_allow_html=True,
-                    )
+            payload = {"document_topic": topic, "word_count": word_count}
+            placeholder = st.empty()
+            placeholder.caption("Generating document...")
+            result = APIClient.stream_request("document", payload, UI.html_renderer(placeholder))
+            if result:
+                placeholder.markdown(
+                    ResponseParser.format_document(result.get("document", "")),
+                    unsafe_allow_html=True,
+                )
 
     @staticmethod
     def show_story_generator():
@@ -152,63 +270,122 @@ class UI:
                 st.error("Please provide a story title.")
                 return
 
-            with st.spinner("Generating story..."):
-                payload = {"story_title": title, "story_form": story_form}
-                result = APIClient.send_request("story", payload)
-                if result:
-                    st.markdown(
-                        ResponseParser.format_document(result.get("document", "")),
-                        unsafe_allow_html=True,
-                    )
+            payload = {"story_title": title, "story_form": story_form}
+            placeholder = st.empty()
+            placeholder.caption("Generating story...")
+            result = APIClient.stream_request("story", payload, UI.html_renderer(placeholder))
+            if result:
+                placeholder.markdown(
+                    ResponseParser.format_document(result.get("document", "")),
+                    unsafe_allow_html=True,
+                )
+
+    @staticmethod
+    def html_renderer(placeholder):
+        return lambda text: placeholder.markdown(text, unsafe_allow_html=True)
+
+    @staticmethod
+    def chat_bubble(sender, message):
+        """
+        Builds the markup for one chat message. Called once per message; the result is
+        kept in the history so reruns don't rebuild it.
+        """
+        avatar = USER_AVATAR_URL if sender == "user" else BOT_AVATAR_URL
+        align = "flex-start" if sender == "user" else "flex-end"
+        bg_color = "#f0f0f0" if sender == "user" else "#dceeff"
+        text_color = "#000000" if sender == "user" else "#1a1a1a"
+
+        return f"""
+            <div style='display: flex; justify-content: {align}; margin-bottom: 1rem;'>
+                <img src='{avatar}' style='width: 40px; height: 40px; border-radius: 50%; margin-right: 10px;' />
+                <div style='background-color: {bg_color}; color: {text_color}; padding: 10px 15px; border-radius: 10px; max-width: 75%; word-wrap: break-word;'>
+                    {message}
+                </div>
+            </div>
+        """
+
+    @staticmethod
+    def add_chat_message(sender, message):
+        st.session_state.chat_history.append(
+            {"sender": sender, "message": message, "html": UI.chat_bubble(sender, message)}
+        )
+
+    @staticmethod
+    def chat_session_id():
+        """
+        Returns the server-side chat session for this browser session, creating it on
+        first use. The server keeps the conversation context, so only the new message is sent.
+        """
+        if st.session_state.get("chat_session_id") is None:
+            result = APIClient.send_request("chat_sessions", None)
+            st.session_state.chat_session_id = result["session_id"] if result else None
+        return st.session_state.chat_session_id
 
     @staticmethod
     def show_chat():
         st.header("Chat")
 
-        # Reset chat instantly on clear button
-        clear = st.button("Clear Chat")
-        if clear:
-            st.session_state.chat_history = []
-            st.experimental_user()
-
         # Initialize history
         if "chat_history" not in st.session_state:
             st.session_state.chat_history = []
+            st.session_state.chat_visible = CHAT_PAGE_SIZE
 
-        user_input = st.text_input("Enter your message")
+        # Reset chat instantly on clear button
+        if st.button("Clear Chat"):
+            session_id = st.session_state.pop("chat_session_id", None)
+            if session_id is not None:
+                url = f"{API_CONFIG['BASE_URL']}{API_CONFIG['ENDPOINTS']['chat_sessions']}/{session_id}"
+                try:
+                    get_http_session().delete(url, timeout=API_CONFIG["TIMEOUT"])
+                except requests.exceptions.RequestException:
+                    pass
+            st.session_state.chat_history = []
+            st.session_state.chat_visible = CHAT_PAGE_SIZE
 
-        if st.button("Send") and user_input.strip():
-            st.session_state.chat_history.append({"sender": "user", "message": user_input})
+        history = st.session_state.chat_history
+        hidden = len(history) - st.session_state.chat_visible
+        if hidden > 0 and st.button(f"Show earlier messages ({hidden} hidden)"):
+            st.session_state.chat_visible += CHAT_PAGE_SIZE
+            hidden -= CHAT_PAGE_SIZE
 
-            with st.spinner("Processing..."):
-                payload = {"prompt": user_input}
-                result = APIClient.send_request("chat", payload)
+        # Show the visible page of history as a single element
+        st.markdown("".join(chat["html"] for chat in history[max(hidden, 0):]), unsafe_allow_html=True)
+        # New messages of this run go right below the history, above the input
+        live = st.container()
 
-                if result and "response" in result:
-                    st.session_state.chat_history.append({"sender": "bot", "message": result["response"]})
-                else:
-                    st.session_state.chat_history.append({"sender": "bot", "message": "❌ Failed to get a response."})
-
-        # Show chat history
-        for chat in st.session_state.chat_history:
-            avatar = USER_AVATAR_URL if chat["sender"] == "user" else BOT_AVATAR_URL
-            align = "flex-start" if chat["sender"] == "user" else "flex-end"
-            bg_color = "#f0f0f0" if chat["sender"] == "user" else "#dceeff"
-            text_color = "#000000" if chat["sender"] == "user" else "#1a1a1a"
-
-            st.markdown(f"""
-                <div style='display: flex; justify-content: {align}; margin-bottom: 1rem;'>
-                    <img src='{avatar}' style='width: 40px; height: 40px; border-radius: 50%; margin-right: 10px;' />
-                    <div style='background-color: {bg_color}; color: {text_color}; padding: 10px 15px; border-radius: 10px; max-width: 75%; word-wrap: break-word;'>
-                        {chat["message"]}
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+        user_input = st.text_input("Enter your message")
+
+        if st.button("Send") and user_input.strip():
+            UI.add_chat_message("user", escape(user_input))
+            live.markdown(history[-1]["html"], unsafe_allow_html=True)
+
+            payload = {"prompt": user_input}
+            session_id = UI.chat_session_id()
+            if session_id is not None:
+                payload["session_id"] = session_id
+
+            # Only the reply being generated is re-rendered while tokens arrive
+            placeholder = live.empty()
+            result = APIClient.stream_request(
+                "chat",
+                payload,
+                lambda text: placeholder.markdown(UI.chat_bubble("bot", text), unsafe_allow_html=True),
+                memoize=False,
+            )
+
+            if result and "response" in result:
+                UI.add_chat_message("bot", result["response"])
+            else:
+                UI.add_chat_message("bot", "❌ Failed to get a response.")
+                # The server session may have expired; start a new one next time
+                st.session_state.chat_session_id = None
+            placeholder.markdown(history[-1]["html"], unsafe_allow_html=True)
 
 
     @staticmethod
     def display_code_results(result, language):
-        cleaned_data = ResponseParser.clean_html_response(result.get("code", ""))
+        # The API extracts the sections; parse locally only for servers that predate it
+        cleaned_data = result.get("structured") or ResponseParser.clean_html_response(result.get("code", ""))
 
         st.subheader("Generated Code Results")
 
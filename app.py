@@ -1,18 +1,57 @@
 import os
-from fastapi import FastAPI
-import uvicorn
-from endpoints.generate.api import code_router
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+# Load .env before any module reads its settings
+load_dotenv()
+
+from fastapi import FastAPI, Response
+from endpoints.generate.api import code_router, document_jobs
+from endpoints.history.api import history_router
 from fastapi.middleware.cors import CORSMiddleware
-import openai
-app = FastAPI()
+from utils.client import close_client, init_client
+from utils.history import generation_history
+from utils.metrics import MetricsMiddleware, mark_process_dead, render_metrics
+from utils.render import shutdown_executor
+from utils.sandbox import sandbox_pool
+from utils.sessions import chat_sessions
+from utils.validate import shutdown_validate_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled AsyncOpenAI client shared by every request
+    app.state.openai_client = init_client()
+    await generation_history.start()
+    await document_jobs.start()
+    await sandbox_pool.start()
+    yield
+    await sandbox_pool.stop()
+    await document_jobs.stop()
+    await chat_sessions.stop()
+    await generation_history.stop()
+    await close_client()
+    shutdown_executor()
+    shutdown_validate_executor()
+    mark_process_dead()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.include_router(code_router,prefix='/v1')
+app.include_router(history_router,prefix='/v1')
 
 @app.get("/")
 def home():
     return {"message": "Welcome to Code AI!"}
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -21,5 +60,10 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
+app.add_middleware(MetricsMiddleware)
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5000, reload=True)
+    # Development server; use serve.py for production
+    import uvicorn
+
+    uvicorn.run("app:app", host="0.0.0.0", port=5000, reload=True)
@@ -0,0 +1,108 @@
+"""
+Measures completion tokens and latency of HTML versus compact (JSON structured) output.
+
+Runs the generation functions in-process against the configured upstream, with
+the response caches bypassed, alternating HTML and compact requests for the same
+inputs. Token counts come from upstream usage, so the savings need the real API;
+against benchmarks/fake_openai.py the run only checks that everything works.
+
+    OPENAI_API_KEY=... python benchmarks/compact_benchmark.py --runs 5 --endpoints code document story
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.cache import bypass_cache
+from utils.client import close_client, init_client
+from utils.generate import generate_code_response, generate_document_response, generate_story_response
+from utils.history import Generation, current_generation
+from utils.prompt import create_code_prompt, create_document_prompt, create_story_prompt
+
+CODE_INPUTS = [
+    ("Python", "Implement an LRU cache class with get and put, with type hints"),
+    ("JavaScript", "Write a debounce function and an example of using it on window resize"),
+    ("Go", "Write an HTTP handler that returns the current time as JSON"),
+]
+DOCUMENT_INPUTS = [("The history of solar power", 400), ("How vaccines train the immune system", 400)]
+STORY_INPUTS = [("The Lighthouse Keeper", "Children's Story"), ("Signal from Europa", "Sci-Fi")]
+
+ENDPOINTS = {
+    "code": [
+        lambda compact, language=language, question=question: generate_code_response(
+            create_code_prompt(language, question), language, compact=compact
+        )
+        for language, question in CODE_INPUTS
+    ],
+    "document": [
+        lambda compact, topic=topic, words=words: generate_document_response(
+            create_document_prompt(topic, words), words, compact=compact
+        )
+        for topic, words in DOCUMENT_INPUTS
+    ],
+    "story": [
+        lambda compact, title=title, form=form: generate_story_response(create_story_prompt(title, form), compact=compact)
+        for title, form in STORY_INPUTS
+    ],
+}
+
+
+async def measure(call, compact: bool) -> tuple:
+    """
+    Returns (latency in ms, completion tokens) for one uncached generation.
+    """
+    generation = Generation("benchmark", {})
+    token = current_generation.set(generation)
+    try:
+        start = time.perf_counter()
+        await call(compact)
+        return (time.perf_counter() - start) * 1000, generation.completion_tokens
+    finally:
+        current_generation.reset(token)
+
+
+def report(label: str, samples: list, baseline: list = None) -> None:
+    latency = statistics.median(latency for latency, _ in samples)
+    tokens = statistics.mean(tokens for _, tokens in samples)
+    line = f"  {label:<8} completion tokens {tokens:8.1f}   p50 latency {latency:8.0f} ms"
+    if baseline:
+        base_latency = statistics.median(latency for latency, _ in baseline)
+        base_tokens = statistics.mean(tokens for _, tokens in baseline)
+        if base_tokens:
+            line += f"   tokens {100 * (1 - tokens / base_tokens):+5.1f}% saved"
+        line += f"   latency {100 * (1 - latency / base_latency):+5.1f}% saved"
+    print(line)
+
+
+async def main(endpoints: list, runs: int) -> None:
+    init_client()
+    bypass_cache.set(True)
+    try:
+        for endpoint in endpoints:
+            html, compact = [], []
+            for _ in range(runs):
+                for call in ENDPOINTS[endpoint]:
+                    # Interleaved so upstream load drift affects both modes alike
+                    html.append(await measure(call, False))
+                    compact.append(await measure(call, True))
+            print(f"{endpoint} ({len(html)} requests per mode)")
+            report("html", html)
+            report("compact", compact, html)
+    finally:
+        await close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.endpoints, args.runs))
@@ -0,0 +1,104 @@
+"""
+Compares the Streamlit UI's BeautifulSoup parsing of code responses with the
+server-side single-pass extractor.
+
+"Whole text" parses a complete response once. "Streamed" feeds the same
+response in token-sized chunks, as /generate-code/stream does.
+
+    python benchmarks/extract_benchmark.py --lines 40 400 --runs 200
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from utils.extract import CodeResponseParser, extract_code_sections
+
+
+def sample_response(lines: int) -> str:
+    body = "<br>".join(f"&nbsp;&nbsp;&nbsp;&nbsp;total = total + values[{i}] &lt; limit" for i in range(lines))
+    return (
+        "<h2>Description</h2><p>This function sums the values below a limit and returns the total.</p>"
+        f"<h2>Code Block</h2><pre><code class='python'>def total_below(values, limit):<br>{body}</code></pre>"
+        "<h2>Conclusion</h2><p>Call total_below with a list and a limit to get the sum.</p>"
+    )
+
+
+def legacy_clean(html_content: str) -> dict:
+    """
+    ResponseParser.clean_html_response from User_interface.py, before the API returned the sections.
+    """
+    matches = re.findall(r"```(?:\w+)?\n([\s\S]*?)\n```", html_content)
+    code = "\n\n".join(matches) if matches else None
+    if code:
+        soup = BeautifulSoup(code, "html.parser")
+        if not any(soup.find(tag) for tag in ["h1", "h2", "p", "pre"]):
+            return {"description": "Generated code:", "code": code, "conclusion": "Code generation complete."}
+
+    soup = BeautifulSoup(html_content, "html.parser")
+    description = soup.find("p").text.strip() if soup.find("p") else ""
+    code_element = soup.find("pre")
+    if code_element and code_element.find("code"):
+        code = code_element.find("code").text.strip()
+    elif code_element:
+        code = code_element.text.strip()
+    else:
+        code = code or html_content
+    conclusion = ""
+    if len(soup.find_all("p")) > 1:
+        conclusion = soup.find_all("p")[-1].text.strip()
+    return {"description": description, "code": code, "conclusion": conclusion}
+
+
+def streamed(text: str, chunk: int = 16) -> dict:
+    parser = CodeResponseParser()
+    for i in range(0, len(text), chunk):
+        parser.feed(text[i:i + chunk])
+    parser.close()
+    return parser.result()
+
+
+def timed(fn, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def report(label: str, samples: list, baseline: list = None) -> None:
+    line = f"{label:<36} p50 {statistics.median(samples):9.1f} us   max {max(samples):9.1f} us"
+    if baseline:
+        line += f"   {statistics.median(baseline) / statistics.median(samples):5.1f}x faster"
+    print(line)
+
+
+def main(line_counts: list, runs: int) -> None:
+    for lines in line_counts:
+        text = sample_response(lines)
+        legacy = legacy_clean(text)
+        extracted = extract_code_sections(text)
+        assert extracted["description"] == legacy["description"]
+        assert extracted["conclusion"] == legacy["conclusion"]
+        assert streamed(text) == extracted
+
+        print(f"{lines} code lines, {len(text)} chars")
+        before = timed(lambda: legacy_clean(text), runs)
+        report("  before: BeautifulSoup (UI)", before)
+        report("  after: single pass, whole text", timed(lambda: extract_code_sections(text), runs), before)
+        report("  after: single pass, streamed", timed(lambda: streamed(text), runs), before)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[40, 400])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    main(args.lines, args.runs)
@@ -0,0 +1,168 @@
+"""
+Local stand-in for the OpenAI chat-completions API, for benchmarks and CI.
+
+Point the service at it with OPENAI_BASE_URL and any API key:
+
+    python benchmarks/fake_openai.py --port 9000 --ttft-ms 300 --tokens-per-second 80 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=fake uvicorn app:app --port 8000
+
+Latency is time-to-first-token (drawn from the chosen distribution) plus
+completion tokens / token rate. Injected errors are 429s, 500s and stalls.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CONFIG = {
+    "distribution": os.getenv("FAKE_DISTRIBUTION", "lognormal"),
+    "ttft_ms": float(os.getenv("FAKE_TTFT_MS", 300)),
+    "ttft_sigma": float(os.getenv("FAKE_TTFT_SIGMA", 0.5)),
+    "tokens_per_second": float(os.getenv("FAKE_TOKENS_PER_SECOND", 80)),
+    "completion_tokens": int(os.getenv("FAKE_COMPLETION_TOKENS", 300)),
+    "error_rate": float(os.getenv("FAKE_ERROR_RATE", 0)),
+    "stall_rate": float(os.getenv("FAKE_STALL_RATE", 0)),
+    "stall_seconds": float(os.getenv("FAKE_STALL_SECONDS", 60)),
+}
+
+WORDS = (
+    "the service generates structured content quickly while upstream latency dominates every request "
+    "so batching caching streaming and admission control matter for throughput"
+).split()
+
+app = FastAPI(title="Fake OpenAI")
+stats = {"requests": 0, "errors": 0, "stalls": 0}
+
+
+def first_token_delay() -> float:
+    median = CONFIG["ttft_ms"] / 1000
+    if CONFIG["distribution"] == "fixed":
+        return median
+    if CONFIG["distribution"] == "uniform":
+        return random.uniform(0, 2 * median)
+    return random.lognormvariate(math.log(median), CONFIG["ttft_sigma"])
+
+
+def completion_text(body: dict, tokens: int) -> str:
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") in ("json_object", "json_schema"):
+        sections = [{"heading": f"Section {i + 1}", "points": ["overview", "details"]} for i in range(4)]
+        return json.dumps({
+            "title": "Generated Document",
+            "sections": sections,
+            "description": "Generated code.",
+            "code": "print('hello')",
+            "conclusion": "Done.",
+        })
+    words = [random.choice(WORDS) for _ in range(max(int(tokens * 0.75), 1))]
+    return "<p>" + " ".join(words) + "</p>"
+
+
+def usage(body: dict, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+def error_response():
+    if random.random() < 0.5:
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+            status_code=429,
+            headers={"retry-after": "1"},
+        )
+    return JSONResponse({"error": {"message": "Injected server error", "type": "server_error"}}, status_code=500)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if random.random() < CONFIG["error_rate"]:
+        stats["errors"] += 1
+        return error_response()
+    if random.random() < CONFIG["stall_rate"]:
+        stats["stalls"] += 1
+        await asyncio.sleep(CONFIG["stall_seconds"])
+
+    tokens = min(body.get("max_tokens") or CONFIG["completion_tokens"], CONFIG["completion_tokens"])
+    text = completion_text(body, tokens)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4o-mini")
+    per_token = 1 / CONFIG["tokens_per_second"]
+
+    if not body.get("stream"):
+        await asyncio.sleep(first_token_delay() + tokens * per_token)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(body, tokens),
+        }
+
+    async def events():
+        await asyncio.sleep(first_token_delay())
+        pieces = text.split(" ")
+        for i, piece in enumerate(pieces):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece + (" " if i < len(pieces) - 1 else "")}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(per_token)
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        if (body.get("stream_options") or {}).get("include_usage"):
+            final["usage"] = usage(body, tokens)
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "config": CONFIG}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default=CONFIG["distribution"])
+    parser.add_argument("--ttft-ms", type=float, default=CONFIG["ttft_ms"], help="median time to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=CONFIG["ttft_sigma"], help="lognormal shape")
+    parser.add_argument("--tokens-per-second", type=float, default=CONFIG["tokens_per_second"])
+    parser.add_argument("--completion-tokens", type=int, default=CONFIG["completion_tokens"], help="upper bound per completion")
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"], help="fraction answered with 429/500")
+    parser.add_argument("--stall-rate", type=float, default=CONFIG["stall_rate"], help="fraction that stall before answering")
+    parser.add_argument("--stall-seconds", type=float, default=CONFIG["stall_seconds"])
+    args = parser.parse_args()
+
+    for key in CONFIG:
+        CONFIG[key] = getattr(args, key)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
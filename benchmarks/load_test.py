@@ -0,0 +1,160 @@
+"""
+Open-loop load generator for the generation API.
+
+Sends requests at a fixed rate per endpoint (new requests do not wait for
+earlier ones), then reports p50/p95/p99 latency, time to first byte,
+throughput and error rate per endpoint. Results are saved as JSON so runs can
+be compared across changes.
+
+    python benchmarks/fake_openai.py --port 9000 &
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=fake uvicorn app:app --port 8000 &
+    python benchmarks/load_test.py --rps 20 --duration 30 --endpoints code chat code-stream
+    python benchmarks/load_test.py --rps 20 --duration 30 --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+
+import httpx
+
+QUESTIONS = ["binary search", "quicksort", "a REST client", "an LRU cache", "parsing CSV files", "a thread pool"]
+LANGUAGES = ["Python", "JavaScript", "Go", "Rust"]
+
+ENDPOINTS = {
+    "code": ("/v1/generate/generate-code", lambda i: {"language": random.choice(LANGUAGES), "question": f"Write {random.choice(QUESTIONS)} #{i}"}),
+    "code-stream": ("/v1/generate/generate-code/stream", lambda i: {"language": random.choice(LANGUAGES), "question": f"Write {random.choice(QUESTIONS)} #{i}"}),
+    "document": ("/v1/generate/generate-document", lambda i: {"document_topic": f"Distributed systems #{i}", "word_count": 500}),
+    "story": ("/v1/generate/generate-story", lambda i: {"story_title": f"The Lighthouse #{i}", "story_form": "Short Story"}),
+    "chat": ("/v1/generate/chat/", lambda i: {"prompt": f"Explain caching in one paragraph #{i}"}),
+    "chat-stream": ("/v1/generate/chat/stream", lambda i: {"prompt": f"Explain caching in one paragraph #{i}"}),
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(values: list, quantile: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+
+async def send(client: httpx.AsyncClient, name: str, index: int, headers: dict, samples: list) -> None:
+    path, payload = ENDPOINTS[name]
+    start = time.perf_counter()
+    first_byte = None
+    status = None
+    try:
+        async with client.stream("POST", path, json=payload(index), headers=headers) as response:
+            status = response.status_code
+            body = b""
+            async for chunk in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                body += chunk[-256:]
+            # Streaming endpoints report failures in-band after a 200
+            if status == 200 and b"event: error" in body[-512:]:
+                status = "stream_error"
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    elapsed = time.perf_counter() - start
+    samples.append({"status": status, "latency": elapsed, "ttfb": first_byte if first_byte is not None else elapsed})
+
+
+async def run_endpoint(client: httpx.AsyncClient, name: str, rps: float, duration: float, headers: dict) -> dict:
+    samples = []
+    tasks = []
+    interval = 1 / rps
+    start = time.perf_counter()
+    index = 0
+    while time.perf_counter() - start < duration:
+        tasks.append(asyncio.create_task(send(client, name, index, headers, samples)))
+        index += 1
+        # Open loop: schedule against the wall clock, not against completions
+        await asyncio.sleep(max(0, start + index * interval - time.perf_counter()))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - start
+
+    ok = [s for s in samples if s["status"] == 200]
+    latencies = [s["latency"] * 1000 for s in ok]
+    ttfbs = [s["ttfb"] * 1000 for s in ok]
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "error_rate": 1 - len(ok) / len(samples) if samples else 0.0,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "latency_ms": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99),
+                       "mean": statistics.mean(latencies) if latencies else None},
+        "ttfb_ms": {"p50": percentile(ttfbs, 0.5), "p95": percentile(ttfbs, 0.95), "p99": percentile(ttfbs, 0.99)},
+        "statuses": {str(k): sum(1 for s in samples if s["status"] == k) for k in {s["status"] for s in samples}},
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: dict, baseline: dict = None) -> None:
+    print(f"{'endpoint':<12} {'reqs':>6} {'err%':>6} {'rps':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'ttfb50':>9}")
+    for name, r in results["endpoints"].items():
+        lat, ttfb = r["latency_ms"], r["ttfb_ms"]
+        fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+        print(f"{name:<12} {r['requests']:>6} {r['error_rate'] * 100:>6.1f} {r['throughput_rps']:>7.2f}"
+              f" {fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])} {fmt(ttfb['p50'])}")
+        if baseline and name in baseline.get("endpoints", {}):
+            base = baseline["endpoints"][name]["latency_ms"]
+            deltas = [
+                f"{q} {((lat[q] - base[q]) / base[q] * 100):+.1f}%"
+                for q in ("p50", "p95", "p99") if lat[q] is not None and base.get(q)
+            ]
+            print(f"{'':<12} vs {baseline.get('revision', '?')}: " + ", ".join(deltas))
+
+
+async def main(args) -> None:
+    headers = {"X-Cache-Bypass": "1"} if args.bypass_cache else {}
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        endpoint_results = await asyncio.gather(*[
+            run_endpoint(client, name, args.rps, args.duration, headers) for name in args.endpoints
+        ])
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"rps": args.rps, "duration": args.duration, "base_url": args.base_url, "bypass_cache": args.bypass_cache},
+        "endpoints": dict(zip(args.endpoints, endpoint_results)),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{results['timestamp'].replace(':', '')}-{results['revision']}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"saved {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=["code", "chat"])
+    parser.add_argument("--rps", type=float, default=10, help="requests per second, per endpoint")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per endpoint")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument("--bypass-cache", action="store_true", help="send X-Cache-Bypass so every request reaches upstream")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+Compares the old eager PDF/DOCX rendering with the lazy process-pool path.
+
+"Request latency" is the rendering work done inside /generate-document:
+both formats before, only the HTML source write after. "Render time" is the
+cost paid on the first /download hit.
+
+    python benchmarks/render_benchmark.py --words 3000 --runs 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.render import render_in_pool, save_source, save_text_to_docx, save_text_to_pdf, shutdown_executor
+
+
+def sample_document(words: int) -> str:
+    sections = []
+    per_section = max(words // 6, 1)
+    for i in range(6):
+        body = " ".join(f"word{j}" for j in range(per_section))
+        sections.append(f"<h2>Section {i + 1}</h2><p>{body}</p><br>")
+    return "<h1>Benchmark Document</h1>" + "".join(sections)
+
+
+def legacy_render(text: str, directory: str) -> None:
+    """
+    The rendering the request path did before: one drawString per line, both formats.
+    """
+    from docx import Document
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(os.path.join(directory, "legacy.pdf"))
+    c.drawString(100, 750, "Generated Document")
+    y_position = 730
+    for line in text.split("\n"):
+        c.drawString(100, y_position, line)
+        y_position -= 20
+    c.save()
+
+    doc = Document()
+    doc.add_paragraph(text)
+    doc.save(os.path.join(directory, "legacy.docx"))
+
+
+def timed(fn, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def timed_async(fn, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list) -> None:
+    print(f"{label:<42} p50 {statistics.median(samples):8.2f} ms   max {max(samples):8.2f} ms")
+
+
+async def main(words: int, runs: int) -> None:
+    text = sample_document(words)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "doc.html")
+
+        report("before: request latency (eager both)", timed(lambda: legacy_render(text, directory), runs))
+        report("after: request latency (source write)", timed(lambda: save_source(text, source), runs))
+
+        report("after: inline PDF render (paginated)", timed(lambda: save_text_to_pdf(text, os.path.join(directory, "a.pdf")), runs))
+        report("after: inline DOCX render", timed(lambda: save_text_to_docx(text, os.path.join(directory, "a.docx")), runs))
+
+        save_source(text, source)
+        await render_in_pool(source, os.path.join(directory, "warm.pdf"))
+        report("after: first download PDF (process pool)", await timed_async(lambda: render_in_pool(source, os.path.join(directory, "b.pdf")), runs))
+        report("after: first download DOCX (process pool)", await timed_async(lambda: render_in_pool(source, os.path.join(directory, "b.docx")), runs))
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, default=3000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.words, args.runs))
@@ -0,0 +1,88 @@
+"""
+Compares per-run overhead of the warm sandbox pool with spawning a fresh process per run.
+
+"Fresh process" is what a runner without a pool does: `subprocess.run` of the
+interpreter (or toolchain) for every snippet. "Warm pool" forks a limited child
+from an already running sandbox worker (utils/sandbox.py). Both run the same
+trivial program, so the numbers are overhead rather than work.
+
+    python benchmarks/sandbox_benchmark.py --runs 50 --languages python bash javascript
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sandbox import SandboxPool
+
+PROGRAMS = {
+    "python": ("main.py", [sys.executable, "main.py"], "print('hello')"),
+    "bash": ("main.sh", ["bash", "main.sh"], "echo hello"),
+    "javascript": ("main.js", ["node", "main.js"], "console.log('hello')"),
+    "c": ("main.c", ["sh", "-c", "gcc -O1 -o main main.c && ./main"], '#include <stdio.h>\nint main(){puts("hello");}'),
+}
+
+
+def fresh_process(language: str) -> float:
+    filename, command, code = PROGRAMS[language]
+    start = time.perf_counter()
+    directory = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(directory, filename), "w") as f:
+            f.write(code)
+        subprocess.run(command, cwd=directory, capture_output=True, check=True)
+    finally:
+        shutil.rmtree(directory)
+    return (time.perf_counter() - start) * 1000
+
+
+async def warm_pool(pool: SandboxPool, language: str) -> float:
+    start = time.perf_counter()
+    result = await pool.execute(language, PROGRAMS[language][2])
+    assert result["stdout"] == "hello\n", result
+    return (time.perf_counter() - start) * 1000
+
+
+def report(label: str, samples: list, baseline: list = None) -> None:
+    samples = sorted(samples)
+    line = f"  {label:<16} p50 {statistics.median(samples):8.1f} ms   p95 {samples[int(len(samples) * 0.95) - 1]:8.1f} ms"
+    if baseline:
+        line += f"   {statistics.median(baseline) / statistics.median(samples):5.1f}x speedup"
+    print(line)
+
+
+async def main(languages: list, runs: int) -> None:
+    pool = SandboxPool(workers=1)
+    await pool.start()
+    if pool.error:
+        sys.exit(pool.error)
+    try:
+        for language in languages:
+            if language not in pool.languages:
+                print(f"{language}: toolchain not installed, skipped")
+                continue
+            # Warm-up run outside the samples (first fork, compiler caches)
+            fresh_process(language)
+            await warm_pool(pool, language)
+            before = [fresh_process(language) for _ in range(runs)]
+            after = [await warm_pool(pool, language) for _ in range(runs)]
+            print(language)
+            report("fresh process", before)
+            report("warm pool", after, before)
+    finally:
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--languages", nargs="+", default=["python", "bash", "javascript"], choices=sorted(PROGRAMS))
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.languages, args.runs))
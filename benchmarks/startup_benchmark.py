@@ -0,0 +1,169 @@
+"""
+Tracks import time of the app module and cold start of the production launcher.
+
+"Import" is `import app` in a fresh interpreter (from -X importtime), with the
+heaviest top-level packages listed. "Cold start" is launching serve.py until
+GET / answers; "shutdown" is SIGTERM until every worker has exited.
+
+    python benchmarks/startup_benchmark.py --runs 5 --workers 1 2
+    python benchmarks/startup_benchmark.py --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+HEAVY_PACKAGES = ("openai", "httpx", "reportlab", "docx", "bs4", "sqlalchemy", "prometheus_client", "dotenv")
+
+
+def environment() -> dict:
+    # The app refuses to start without a key; any value works since no upstream call is made
+    return {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "fake")}
+
+
+def measure_import() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app, sys; print(','.join(sorted(sys.modules)))"],
+        cwd=ROOT, env=environment(), capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    total = None
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        if name == "app":
+            total = int(cumulative) / 1000
+        elif depth <= 3:
+            top = name.split(".")[0]
+            packages[top] = max(packages.get(top, 0), int(cumulative) / 1000)
+    loaded = set(completed.stdout.strip().split(","))
+    return {"total_ms": total, "packages_ms": packages, "heavy_loaded": sorted(p for p in HEAVY_PACKAGES if p in loaded)}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_cold_start(workers: int, timeout: float) -> dict:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=environment(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        ready = time.perf_counter() - start
+                        break
+            except OSError:
+                time.sleep(0.02)
+    finally:
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        shutdown = time.perf_counter() - stopping
+    return {"ready_ms": ready * 1000 if ready is not None else None, "shutdown_ms": shutdown * 1000}
+
+
+def summarize(values: list) -> dict:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"median": None, "min": None, "max": None}
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: dict, baseline: dict = None) -> None:
+    def delta(current, previous):
+        if current is None or not previous:
+            return ""
+        return f" ({(current - previous) / previous * 100:+.1f}% vs {baseline.get('revision', '?')})"
+
+    imports = results["import"]
+    base_import = (baseline or {}).get("import", {}).get("total_ms", {}).get("median")
+    print(f"import app      median {imports['total_ms']['median']:8.1f} ms{delta(imports['total_ms']['median'], base_import)}")
+    print(f"heavy loaded    {', '.join(imports['heavy_loaded']) or 'none'}")
+    for name, ms in sorted(imports["packages_ms"].items(), key=lambda item: -item[1])[:8]:
+        print(f"  {name:<22} {ms:8.1f} ms")
+    for workers, r in results["cold_start"].items():
+        base = (baseline or {}).get("cold_start", {}).get(workers, {}).get("ready_ms", {}).get("median")
+        ready, shutdown = r["ready_ms"]["median"], r["shutdown_ms"]["median"]
+        ready_text = f"{ready:8.1f} ms" if ready is not None else f"{'timeout':>11}"
+        print(f"cold start x{workers:<3} ready {ready_text}{delta(ready, base)}, shutdown {shutdown:8.1f} ms")
+
+
+def main(args) -> None:
+    import_runs = [measure_import() for _ in range(args.runs)]
+    packages = {}
+    for run in import_runs:
+        for name, ms in run["packages_ms"].items():
+            packages.setdefault(name, []).append(ms)
+
+    cold_start = {}
+    for workers in args.workers:
+        runs = [measure_cold_start(workers, args.timeout) for _ in range(args.runs)]
+        cold_start[str(workers)] = {
+            "ready_ms": summarize([r["ready_ms"] for r in runs]),
+            "shutdown_ms": summarize([r["shutdown_ms"] for r in runs]),
+        }
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"runs": args.runs, "workers": args.workers, "python": sys.version.split()[0]},
+        "import": {
+            "total_ms": summarize([r["total_ms"] for r in import_runs]),
+            "packages_ms": {name: statistics.median(values) for name, values in packages.items()},
+            "heavy_loaded": import_runs[-1]["heavy_loaded"],
+        },
+        "cold_start": cold_start,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"startup-{results['timestamp'].replace(':', '')}-{results['revision']}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"saved {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    main(parser.parse_args())
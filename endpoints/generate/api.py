@@ -1,31 +1,140 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
-from schema.codeai import ChatRequest, CodeRequest, DocsRequest, StoryRequest
+from schema.codeai import BatchRequest, ChatRequest, CodeCompilerRequest, CodeRequest, DocsRequest, StoryRequest
+from utils.cache import cache_bypass, response_cache
+from utils.compact import parse_structured, render_code_html, render_document_html, render_story_html
 from utils.generate import (
+    LONG_DOCUMENT_THRESHOLD,
+    chat_request,
+    code_request,
+    document_request,
+    generate_chat_response,
     generate_code_response,
     generate_document_response,
+    generate_long_document_response,
     generate_story_response,
-    save_text_to_docx,
-    save_text_to_pdf,
+    reserve_cached_stream,
+    reserve_stream,
+    story_request,
+    stream_chat_completion,
+    summarize_chat,
+    validate_code_response,
 )
+import asyncio
+import json
 import os
-import openai
-from utils.prompt import create_code_prompt, create_document_prompt, create_story_prompt
-openapi_key = os.getenv("OPENAI_API_KEY")
+import time
+from utils.extract import CodeResponseParser, extracting, parse_code_response
+from utils.history import generation_history
+from utils.jobs import JobQueue, QueueFull
+from utils.length import length_stats
+from utils.metrics import ARTIFACT_SIZE, RENDER_LATENCY, prompt_cache_stats, stage
+from urllib.parse import quote
+from utils.artifacts import ARTIFACT_FILENAME, SOURCE_EXTENSION, artifact_store
+from utils.render import render_in_pool
+from utils.resilience import resilience
+from utils.router import current_routes, router
+from utils.sandbox import sandbox_pool
+from utils.scheduler import priority, request_priority, scheduler
+from utils.sessions import chat_sessions
+from utils.prompt import create_code_prompt, create_document_prompt, create_story_prompt, document_word_band
+from utils.similarity import similar_cache
+from utils.singleflight import inflight
+from utils.sse import sse_events, sse_response
+from utils.validate import CODE_VALIDATION, validation_stats
 
-code_router = APIRouter(prefix="/generate", tags=["CodeAI"])
+code_router = APIRouter(prefix="/generate", tags=["CodeAI"], dependencies=[Depends(cache_bypass)])
 
+# Upper bound on concurrent upstream calls per batch request
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
 
-@code_router.post("/generate-code")
-def generate_code(request: CodeRequest):
+
+@code_router.post("/generate-code", dependencies=[Depends(priority("code"))])
+async def generate_code(request: CodeRequest):
     """
-    Generate code based on the given question and programming language.
+    Generate code based on the given question and programming language. `structured`
+    carries the description, code and conclusion extracted from the HTML response.
+    With validation, `structured` holds the repaired code and `validation` the outcome.
+    With `compact`, the model returns `structured` directly and `code` (HTML) is only
+    rendered when `render_html` is set.
     """
 
     prompt = create_code_prompt(request.language, request.question)
-    generated_code = generate_code_response(prompt)
-    return {"language": request.language, "code": generated_code}
+    with generation_history.track("code", request, prompt) as generation:
+        generated_code = await generate_code_response(prompt, request.language, request.question, request.compact)
+        generation.output = generated_code
+        if request.compact:
+            payload = await code_payload(request, None, parse_structured(generated_code))
+            if request.render_html:
+                payload["code"] = render_code_html(payload["structured"], request.language)
+            return payload
+        parser = parse_code_response(generated_code)
+        return await code_payload(request, generated_code, parser.result(), parser.format_error())
+
+
+@code_router.post("/generate-code/stream", dependencies=[Depends(priority("code"))])
+async def generate_code_stream(request: CodeRequest):
+    """
+    Streams generated code as Server-Sent Events; the sections are extracted while tokens
+    arrive. Validation and repair, when enabled, run before the final event.
+    """
+    reject_compact_stream(request)
+    prompt = create_code_prompt(request.language, request.question)
+    parser = CodeResponseParser()
+
+    async def build_payload(text):
+        parser.close()
+        return await code_payload(request, text, parser.result(), parser.format_error())
+
+    spec = code_request(prompt, request.language)
+    tokens = generation_history.track_stream(await reserve_cached_stream(spec), "code", request, prompt)
+    return sse_response(extracting(tokens, parser), build_payload)
+
+
+async def code_payload(request: CodeRequest, text: str, sections: dict, format_error: str = None) -> dict:
+    payload = {"language": request.language, "code": text, "structured": sections}
+    if text is None:
+        del payload["code"]
+    if CODE_VALIDATION if request.validate_code is None else request.validate_code:
+        payload["structured"], payload["validation"] = await validate_code_response(request.language, sections, format_error)
+    payload["routing"] = current_routes()
+    return payload
+
+
+def reject_compact_stream(request) -> None:
+    # Partial JSON is of no use to a streaming client
+    if request.compact:
+        raise HTTPException(status_code=400, detail="Compact output is not available for streaming endpoints")
+
+
+@code_router.post("/compile")
+async def compile_code(request: CodeCompilerRequest):
+    """
+    Runs code in the sandbox pool (CPU, memory, wall clock and output limits, no
+    network) and returns its output. `reason` is "exited" or the limit that stopped it.
+    """
+    return await sandbox_pool.execute(request.language, request.code)
+
+
+@code_router.post("/compile/stream")
+async def compile_code_stream(request: CodeCompilerRequest):
+    """
+    Runs code in the sandbox pool, streaming `stdout` and `stderr` events as output is
+    produced and a final `exit` event. Disconnecting cancels the run.
+    """
+    sandbox_pool.check(request.language, request.code)
+    return sse_events(sandbox_pool.run(request.language, request.code))
+
+
+@code_router.get("/compile/languages")
+async def compile_languages():
+    """
+    Returns the languages with a toolchain installed on this host, and the sandbox pool state.
+    """
+    return sandbox_pool.get_stats()
 
 
 # @code_router.post("/generate-document")
@@ -40,55 +149,345 @@ def generate_code(request: CodeRequest):
 
 
 
-@code_router.post("/generate-document")
+@code_router.post("/generate-document", dependencies=[Depends(priority("document"))])
 async def generate_document(request: DocsRequest):
     """
-    Generates a document response and returns downloadable PDF and DOCX files.
+    Generates a document response and returns downloadable PDF and DOCX files. With
+    `compact` (single-pass only), `structured` holds the title and sections.
     """
     try:
-        prompt = create_document_prompt(request.document_topic, request.word_count)
-        response_text = generate_document_response(prompt)
-
-        pdf_filename = f"{request.document_topic}.pdf"
-        docx_filename = f"{request.document_topic}.docx"
-
-        pdf_path = save_text_to_pdf(response_text, pdf_filename)
-        docx_path = save_text_to_docx(response_text, docx_filename)
-
-        
-        return {
-            "document": response_text,
-            "pdf_url": f"/download/{pdf_filename}",
-            "docx_url": f"/download/{docx_filename}"
-        }
-    
+        with generation_history.track("document", request) as generation:
+            response_text = generation.output = await generate_document_text(request)
+        return {**await document_payload(request, response_text), "routing": generation.routing}
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@code_router.post("/generate-story")
-def generate_docs(request: StoryRequest):
+@code_router.post("/generate-document/stream", dependencies=[Depends(priority("document"))])
+async def generate_document_stream(request: DocsRequest):
+    """
+    Streams the generated document as Server-Sent Events; the final event carries the download links.
+    """
+    reject_compact_stream(request)
+    prompt = create_document_prompt(request.document_topic, request.word_count)
+
+    async def build_payload(text):
+        return {**await render_document(request.document_topic, text), "routing": current_routes()}
+
+    word_band = document_word_band(request.word_count)
+    spec = document_request(prompt, request.word_count)
+    tokens = generation_history.track_stream(await reserve_cached_stream(spec, word_band), "document", request)
+    return sse_response(tokens, build_payload)
+
+
+def uses_sections(request: DocsRequest) -> bool:
+    return request.mode == "sections" or (request.mode == "auto" and request.word_count >= LONG_DOCUMENT_THRESHOLD)
+
+
+async def generate_document_text(request: DocsRequest) -> str:
+    """
+    Picks single-pass or outline-then-parallel-sections generation for a document request.
+    """
+    if uses_sections(request):
+        return await generate_long_document_response(request.document_topic, request.word_count)
+
+    prompt = create_document_prompt(request.document_topic, request.word_count)
+    return await generate_document_response(prompt, request.word_count, request.compact)
+
+
+async def document_payload(request: DocsRequest, response_text: str) -> dict:
+    """
+    Stores the document and returns the response payload. Compact documents are rendered
+    to HTML locally for the PDF/DOCX artifacts; the HTML is only returned with `render_html`.
+    """
+    if not request.compact or uses_sections(request):
+        return await render_document(request.document_topic, response_text)
+
+    structured = parse_structured(response_text)
+    payload = await render_document(request.document_topic, render_document_html(structured))
+    if not request.render_html:
+        del payload["document"]
+    return {**payload, "structured": structured}
+
+
+async def run_document_job(request: DocsRequest) -> dict:
+    request_priority.set("document")
+    with generation_history.track("document_job", request) as generation:
+        response_text = generation.output = await generate_document_text(request)
+    return {**await document_payload(request, response_text), "routing": generation.routing}
+
+
+# Started and stopped by the app lifespan
+document_jobs = JobQueue("document", run_document_job)
+
+
+@code_router.post("/generate-document/jobs", status_code=202)
+async def submit_document_job(request: DocsRequest):
     """
-    Generate Story Based on title and its form.
+    Queues document generation and rendering, returning a job id to poll.
+    """
+    try:
+        job_id = await document_jobs.submit(request)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return {"job_id": job_id, "status": "queued", "status_url": f"/v1/generate/jobs/{job_id}"}
+
+
+@code_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """
+    Returns the job state; with `wait`, long-polls up to that many seconds for completion.
+    """
+    job = await document_jobs.wait(job_id, wait) if wait else await document_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def render_document(document_topic: str, response_text: str) -> dict:
+    """
+    Stores the document source and returns the response payload. The PDF and DOCX
+    are rendered lazily on their first download.
+    """
+    with stage("file_io"):
+        digest = await run_in_threadpool(artifact_store.put_source, response_text)
+    name = quote(document_topic)
+
+    return {
+        "document": response_text,
+        "pdf_url": f"/download/{digest}.pdf?name={name}.pdf",
+        "docx_url": f"/download/{digest}.docx?name={name}.docx"
+    }
+
+
+@code_router.post("/generate-story", dependencies=[Depends(priority("story"))])
+async def generate_docs(request: StoryRequest):
+    """
+    Generate Story Based on title and its form. With `compact`, `structured` holds the
+    title and paragraphs and `document` (HTML) is only rendered when `render_html` is set.
     """
     prompt = create_story_prompt(request.story_title, request.story_form)
-    generated_story = generate_story_response(prompt)
-    return {"document topic": request.story_title, "document": generated_story}
+    with generation_history.track("story", request, prompt) as generation:
+        generated_story = generation.output = await generate_story_response(
+            prompt, request.story_title, request.story_form, request.compact
+        )
+    if not request.compact:
+        return {"document topic": request.story_title, "document": generated_story, "routing": generation.routing}
+
+    structured = parse_structured(generated_story)
+    payload = {"document topic": request.story_title, "structured": structured}
+    if request.render_html:
+        payload["document"] = render_story_html(structured)
+    payload["routing"] = generation.routing
+    return payload
 
-@code_router.post("/chat/")
+
+@code_router.post("/generate-story/stream", dependencies=[Depends(priority("story"))])
+async def generate_story_stream(request: StoryRequest):
+    """
+    Streams the generated story as Server-Sent Events.
+    """
+    reject_compact_stream(request)
+    prompt = create_story_prompt(request.story_title, request.story_form)
+
+    async def build_payload(text):
+        return {"document topic": request.story_title, "document": text, "routing": current_routes()}
+
+    spec = story_request(prompt)
+    tokens = generation_history.track_stream(await reserve_cached_stream(spec), "story", request, prompt)
+    return sse_response(tokens, build_payload)
+
+@code_router.post("/batch", dependencies=[Depends(priority("batch"))])
+async def generate_batch(request: BatchRequest):
+    """
+    Runs a list of code, document and story requests concurrently and streams the
+    results back as NDJSON in completion order. A failing item yields an error line
+    without failing the batch.
+    """
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+
+    concurrency = min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    handlers = {
+        CodeRequest: ("code", generate_code),
+        DocsRequest: ("document", generate_document),
+        StoryRequest: ("story", generate_docs),
+    }
+
+    async def run_item(index, item):
+        kind, handler = handlers[type(item)]
+        async with semaphore:
+            try:
+                return {"index": index, "type": kind, "result": await handler(item)}
+            except HTTPException as e:
+                return {"index": index, "type": kind, "error": e.detail, "status_code": e.status_code}
+            except Exception as e:
+                return {"index": index, "type": kind, "error": str(e), "status_code": 500}
+
+    async def results():
+        tasks = [asyncio.ensure_future(run_item(i, item)) for i, item in enumerate(request.items)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+        finally:
+            # Client went away: stop the remaining upstream calls
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@code_router.post("/chat/", dependencies=[Depends(priority("chat"))])
 async def chat(request: ChatRequest):
-    client = openai.OpenAI(api_key=openapi_key)
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": request.prompt}]
-    )
-    return {"response": response.choices[0].message.content}
+    with generation_history.track("chat", request, request.prompt) as generation:
+        response = generation.output = await generate_chat_response(request.prompt, request.session_id)
+    if request.session_id is not None:
+        return {"response": response, "session_id": request.session_id, "routing": generation.routing}
+    return {"response": response, "routing": generation.routing}
+
+
+@code_router.post("/chat/stream", dependencies=[Depends(priority("chat"))])
+async def chat_stream(request: ChatRequest):
+    """
+    Streams the chat reply as Server-Sent Events. With a session, the exchange is
+    stored once the reply is complete.
+    """
+    if request.session_id is None:
+        async def build_payload(text):
+            return {"response": text, "routing": current_routes()}
+
+        spec = chat_request(request.prompt)
+        tokens = scheduler.holding(await reserve_stream(spec), stream_chat_completion(**spec))
+        return sse_response(generation_history.track_stream(tokens, "chat", request, request.prompt), build_payload)
+
+    context = await chat_sessions.context(request.session_id, request.prompt)
+
+    async def build_session_payload(text):
+        await chat_sessions.record(request.session_id, request.prompt, text, summarize_chat)
+        return {"response": text, "session_id": request.session_id, "routing": current_routes()}
+
+    spec = chat_request(request.prompt, context)
+    tokens = scheduler.holding(await reserve_stream(spec), stream_chat_completion(**spec))
+    return sse_response(generation_history.track_stream(tokens, "chat", request, request.prompt), build_session_payload)
+
+
+@code_router.post("/chat/sessions", status_code=201)
+async def create_chat_session():
+    """
+    Starts a server-side chat session; pass its id as `session_id` to /chat/ or /chat/stream.
+    """
+    return {"session_id": await chat_sessions.create()}
+
+
+@code_router.get("/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str, before: int = Query(None, ge=1), limit: int = Query(50, ge=1, le=200)):
+    """
+    Returns the session summary and a page of its turns, newest page first. Pass
+    `next_before` back as `before` to fetch older turns.
+    """
+    return await chat_sessions.history(session_id, before, limit)
 
 
+@code_router.delete("/chat/sessions/{session_id}", status_code=204)
+async def delete_chat_session(session_id: str):
+    await chat_sessions.delete(session_id)
+    return Response(status_code=204)
+
+
+
+@code_router.get("/cache/stats")
+async def cache_stats():
+    """
+    Returns hit/miss counters for the response caches, request coalescing and the
+    provider's prompt-prefix cache (`cached_tokens` from upstream usage) of this worker.
+    """
+    prompt_cache = {
+        model: {**stats, "hit_rate": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0}
+        for model, stats in prompt_cache_stats.items()
+    }
+    return {
+        **response_cache.get_stats(), "similar": similar_cache.stats, "inflight": inflight.stats,
+        "prompt_cache": prompt_cache,
+    }
+
+
+@code_router.get("/validation/stats")
+async def validation_stats_view():
+    """
+    Returns first-pass validity and repair counters for generated code on this worker.
+    """
+    return validation_stats
+
+
+@code_router.get("/length/stats")
+async def length_stats_view():
+    """
+    Returns document token budgets, early stops and estimated tokens saved for this worker.
+    """
+    return length_stats
+
+
+@code_router.get("/scheduler/stats")
+async def scheduler_stats():
+    """
+    Returns per-model admission counters, active calls and queue lengths, plus retry,
+    hedging and circuit breaker state for this worker.
+    """
+    return {"models": scheduler.get_stats(), "resilience": resilience.get_stats()}
+
+
+@code_router.get("/routing/stats")
+async def routing_stats():
+    """
+    Returns the model routing table, decision and fallback counters, and the per-model
+    error rate, p95 latency and health the router sees on this worker.
+    """
+    return router.get_stats()
+
+
+async def render_artifact(source_path: str, file_path: str, extension: str) -> None:
+    file_format = extension.lstrip(".")
+    start = time.perf_counter()
+    with stage("render"):
+        await render_in_pool(source_path, file_path)
+    RENDER_LATENCY.labels(file_format).observe(time.perf_counter() - start)
+    ARTIFACT_SIZE.labels(file_format).observe(os.path.getsize(file_path))
+
 
 @code_router.get("/download/{filename}")
-async def download_file(filename: str):
-    file_path = f"static/{filename}"
-    if os.path.exists(file_path):
-        return FileResponse(file_path, filename=filename)
-    raise HTTPException(status_code=404, detail="File not found")
\ No newline at end of file
+async def download_file(filename: str, request: Request, name: str = None):
+    """
+    Serves a stored document artifact, rendering it on first request. Artifacts are
+    immutable per content hash, so responses carry a strong ETag and long-lived cache
+    headers; FileResponse handles Range requests.
+    """
+    match = ARTIFACT_FILENAME.match(filename)
+    if not match:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    digest, extension = match.groups()
+    source_path = artifact_store.path(digest, SOURCE_EXTENSION)
+    file_path = artifact_store.path(digest, extension)
+    if not os.path.exists(source_path) and not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = f'"{digest}{extension}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    if not os.path.exists(file_path):
+        # Concurrent first downloads share one render
+        await inflight.do(f"render:{file_path}", lambda: render_artifact(source_path, file_path, extension))
+        await run_in_threadpool(artifact_store.added, file_path)
+    else:
+        await run_in_threadpool(artifact_store.touch, digest)
+
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path, filename=name or filename, headers=headers)
\ No newline at end of file
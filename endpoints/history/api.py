@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from utils.history import generation_history
+
+history_router = APIRouter(prefix="/history", tags=["History"])
+
+
+@history_router.get("")
+async def list_generations(
+    endpoint: str = None,
+    model: str = None,
+    before: int = Query(None, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """
+    Returns recorded generations newest first, without their output. Pass
+    `next_before` back as `before` for the next page.
+    """
+    items = await generation_history.page(endpoint=endpoint, model=model, before=before, limit=limit)
+    return {"items": items, "next_before": items[-1]["id"] if len(items) == limit else None}
+
+
+@history_router.get("/search")
+async def search_generations(
+    q: str = None,
+    endpoint: str = None,
+    model: str = None,
+    prompt_hash: str = None,
+    since: float = Query(None, description="Unix timestamp, inclusive"),
+    until: float = Query(None, description="Unix timestamp, exclusive"),
+    before: int = Query(None, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """
+    Searches recorded generations by output text and/or exact filters.
+    """
+    items = await generation_history.page(
+        query=q, endpoint=endpoint, model=model, prompt_hash=prompt_hash,
+        since=since, until=until, before=before, limit=limit,
+    )
+    return {"items": items, "next_before": items[-1]["id"] if len(items) == limit else None}
+
+
+@history_router.get("/stats")
+async def history_stats():
+    """
+    Returns write-behind buffer counters for this worker.
+    """
+    return generation_history.get_stats()
+
+
+@history_router.get("/{generation_id}")
+async def get_generation(generation_id: int):
+    generation = await generation_history.get(generation_id)
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return generation
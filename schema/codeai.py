@@ -1,21 +1,39 @@
-import openai
-from pydantic import BaseModel
+from typing import List, Literal, Optional, Union
+from pydantic import BaseModel, Field
 
 class CodeRequest(BaseModel):
     language: str
     question: str
+    # Syntax-check the code and repair it once on failure; None uses CODE_VALIDATION
+    validate_code: Optional[bool] = None
+    # JSON structured output without HTML markup; HTML is rendered locally only with render_html
+    compact: bool = False
+    render_html: bool = False
 
 class DocsRequest(BaseModel):
     document_topic: str
     word_count: int
+    # "sections" generates an outline, then all sections in parallel; "auto" does so for long documents
+    mode: Literal["auto", "single", "sections"] = "auto"
+    # Single-pass documents only; "sections" generation is unaffected
+    compact: bool = False
+    render_html: bool = False
 
 class StoryRequest(BaseModel):
     story_title: str
     story_form: str
+    compact: bool = False
+    render_html: bool = False
 
 class ChatRequest(BaseModel): 
     prompt: str 
+    # Server-side session from POST /chat/sessions; without one the chat is stateless
+    session_id: Optional[str] = None
 
 class CodeCompilerRequest(BaseModel):  
     language: str
-    code: str
\ No newline at end of file
+    code: str
+
+class BatchRequest(BaseModel):
+    items: List[Union[CodeRequest, DocsRequest, StoryRequest]] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1)
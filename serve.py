@@ -0,0 +1,68 @@
+"""
+Production entry point: N worker processes behind one listening socket.
+
+    WEB_CONCURRENCY=4 python serve.py --port 8000
+
+The supervisor starts every worker up front, restarts workers that die, and
+on SIGTERM/SIGINT stops accepting connections and lets in-flight requests
+finish (up to --graceful-timeout) before each worker runs its shutdown hooks.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+# Worker processes; defaults to one per CPU
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+KEEPALIVE_TIMEOUT = int(os.getenv("KEEPALIVE_TIMEOUT", 5))
+# Recycle a worker after this many requests (0 disables), with jitter so workers don't restart together
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", 0))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", 0))
+
+
+def prepare_metrics_dir(workers: int) -> None:
+    """
+    With several workers each process keeps its own metrics; point prometheus_client
+    at a shared, empty directory so /metrics aggregates them. Must run before workers start.
+    """
+    if workers < 2:
+        return
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), "generation-ai-metrics")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    # Samples left by a previous run would be counted again
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+
+    prepare_metrics_dir(args.workers)
+    # Upstream admission limits are split between the workers (utils/scheduler.py)
+    os.environ["SCHEDULER_WORKERS"] = str(args.workers)
+    uvicorn.run(
+        "app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=KEEPALIVE_TIMEOUT,
+        limit_max_requests=MAX_REQUESTS or None,
+        limit_max_requests_jitter=MAX_REQUESTS_JITTER,
+        proxy_headers=True,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
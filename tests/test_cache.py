@@ -0,0 +1,57 @@
+import sqlite3
+
+from utils.cache import DiskCache
+
+
+def stored(cache: DiskCache) -> tuple:
+    conn = sqlite3.connect(cache.path)
+    total = conn.execute("SELECT total_bytes FROM responses_size").fetchone()[0]
+    actual = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    conn.close()
+    return total, actual
+
+
+def test_running_total_follows_writes_replacements_and_expiry(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), max_bytes=10_000, ttl=3600)
+    cache.set("a", "x" * 100)
+    cache.set("b", "x" * 200)
+    cache.set("a", "x" * 50)
+    assert stored(cache) == (250, 250)
+
+    cache.ttl = -1
+    assert cache.get("b") is None
+    assert stored(cache) == (50, 50)
+
+    cache.clear()
+    assert stored(cache) == (0, 0)
+
+
+def test_evicts_least_recently_used_down_to_the_low_water_mark(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), max_bytes=1000, ttl=3600, evict_target=0.5)
+    for key in "abcdefghi":
+        cache.set(key, "x" * 100)
+    # Read keeps "a" warm, so "b" is the oldest
+    assert cache.get("a") is not None
+    cache.set("j", "x" * 100)
+    cache.set("k", "x" * 100)
+
+    total, actual = stored(cache)
+    assert total == actual <= 500
+    assert cache.get("a") is not None and cache.get("k") is not None
+    assert cache.get("b") is None
+
+
+def test_existing_cache_is_counted_once(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+        "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO responses VALUES ('old', 'xyz', 3, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    cache = DiskCache(path, max_bytes=10_000, ttl=1e12)
+    cache.set("new", "x" * 10)
+    assert stored(cache) == (13, 13)
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import utils.generate as generate
+from utils.similarity import SimilarityCache
+
+
+class Cache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+
+def test_truncated_structured_output_is_never_cached(monkeypatch):
+    replies = ['{"title": "The Fox", "paragraphs": ["Once upon', '{"title": "The Fox", "paragraphs": ["Once."]}']
+    calls = []
+
+    async def upstream(messages, model, max_retries=None, **params):
+        calls.append(model)
+        return replies[min(len(calls), len(replies)) - 1]
+
+    cache = Cache()
+    monkeypatch.setattr(generate, "response_cache", cache)
+    monkeypatch.setattr(generate, "similar_cache", SimilarityCache())
+    monkeypatch.setattr(generate, "_chat_completion", upstream)
+
+    async def story():
+        return await generate.generate_story_response("prompt", "The clever fox", "fable", compact=True)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(story())
+    assert error.value.status_code == 502
+    assert cache.data == {}
+
+    # The repeat goes upstream again instead of replaying the truncated reply
+    assert asyncio.run(story()) == replies[1]
+    assert asyncio.run(story()) == replies[1]
+    assert len(calls) == 2
+
+
+def test_compact_documents_are_streamed_whole(monkeypatch):
+    document = '{"title": "Caching", "sections": [{"heading": "Why", "paragraphs": ["Speed."]}]}'
+
+    async def stream(messages, model, max_retries=None, **params):
+        for start in range(0, len(document), 8):
+            yield document[start:start + 8]
+
+    async def completion(*args, **kwargs):
+        raise AssertionError("compact documents must not be a single non-streamed call")
+
+    monkeypatch.setattr(generate, "response_cache", Cache())
+    monkeypatch.setattr(generate, "_stream_chat_completion", stream)
+    monkeypatch.setattr(generate, "_chat_completion", completion)
+    text = asyncio.run(generate.generate_document_response("prompt", 5000, compact=True))
+    assert text == document
@@ -0,0 +1,32 @@
+import asyncio
+import sqlite3
+
+from pydantic import BaseModel
+
+from utils.jobs import JobQueue, JobStore, QueueFull
+
+
+class Request(BaseModel):
+    topic: str
+
+
+def test_concurrent_submits_never_overfill_the_queue(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+
+    async def main():
+        # No workers, so nothing drains the queue
+        queue = JobQueue("test", None, workers=0, depth=2, store=store)
+        await queue.start()
+        results = await asyncio.gather(
+            *[queue.submit(Request(topic=str(i))) for i in range(5)], return_exceptions=True
+        )
+        await queue.stop()
+        return results
+
+    results = asyncio.run(main())
+    accepted = [result for result in results if isinstance(result, str)]
+    assert len(accepted) == 2
+    assert all(isinstance(result, QueueFull) for result in results if not isinstance(result, str))
+
+    rows = sqlite3.connect(store.path).execute("SELECT id FROM jobs").fetchall()
+    assert sorted(row[0] for row in rows) == sorted(accepted)
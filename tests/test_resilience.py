@@ -0,0 +1,210 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+import utils.resilience as resilience_module
+from utils.resilience import CircuitBreaker, CircuitOpen, Resilience
+
+
+def status_error(status: int, headers: dict = None) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://upstream.test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return openai.APIStatusError(f"status {status}", response=response, body=None)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Upstream:
+    """
+    Stub for one upstream attempt: raises the queued errors in order, then returns "ok".
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def make_resilience(sleeps: list, **kwargs) -> Resilience:
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    return Resilience(sleep=sleep, hedge=False, **kwargs)
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503])
+def test_retries_retryable_status_with_backoff(status):
+    sleeps = []
+    layer = make_resilience(sleeps, max_retries=2, backoff_base=0.5, backoff_cap=8)
+    upstream = Upstream(status_error(status), status_error(status))
+
+    assert asyncio.run(layer.call("m", upstream)) == "ok"
+    assert upstream.calls == 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+    assert layer.stats["retries"] == 2
+
+
+def test_backoff_honours_retry_after_up_to_the_cap():
+    sleeps = []
+    layer = make_resilience(sleeps, max_retries=2, backoff_cap=8)
+    upstream = Upstream(status_error(429, {"retry-after": "3"}), status_error(429, {"retry-after": "30"}))
+
+    asyncio.run(layer.call("m", upstream))
+    assert sleeps[0] >= 3
+    assert sleeps[1] == 8
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 422])
+def test_does_not_retry_client_errors(status):
+    sleeps = []
+    layer = make_resilience(sleeps, max_retries=2)
+    upstream = Upstream(status_error(status))
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(layer.call("m", upstream))
+    assert upstream.calls == 1
+    assert sleeps == []
+    # A client error says nothing about upstream health
+    assert layer.breaker("m").failures == 0
+
+
+def test_max_retries_is_honoured():
+    sleeps = []
+    layer = make_resilience(sleeps, max_retries=3)
+    upstream = Upstream(*[status_error(500)] * 10)
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(layer.call("m", upstream))
+    assert upstream.calls == 4
+
+    # Per-call override, as used for a routed model that has a fallback
+    upstream = Upstream(*[status_error(500)] * 10)
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(layer.call("other", upstream, max_retries=0))
+    assert upstream.calls == 1
+
+
+def test_attempt_timeout_is_retried():
+    sleeps = []
+    layer = make_resilience(sleeps, max_retries=1, attempt_timeout=0.05)
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return "ok"
+
+    assert asyncio.run(layer.call("m", upstream)) == "ok"
+    assert layer.stats["timeouts"] == 1
+
+
+def test_hedge_fires_after_p95_and_cancels_the_loser(monkeypatch):
+    monkeypatch.setattr(resilience_module, "HEDGE_MIN_DELAY", 0.01)
+    layer = Resilience(hedge=True)
+    for _ in range(resilience_module.HEDGE_MIN_SAMPLES):
+        layer.latency.record("m", 0.05)
+    assert layer.hedge_delay("m") == 0.05
+
+    started, cancelled = [], []
+
+    async def upstream():
+        attempt = len(started)
+        started.append(asyncio.get_running_loop().time())
+        if attempt == 0:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(attempt)
+                raise
+        return f"attempt {attempt}"
+
+    async def main():
+        result = await layer.call("m", upstream)
+        # Let the cancelled loser run its handler
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "attempt 1"
+    assert started[1] - started[0] >= 0.05
+    assert cancelled == [0]
+    assert layer.stats["hedges"] == 1 and layer.stats["hedge_wins"] == 1
+
+
+def test_no_hedge_before_enough_samples():
+    layer = Resilience(hedge=True)
+    layer.latency.record("m", 0.05)
+    assert layer.hedge_delay("m") is None
+
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.before_call("m")
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.before_call("m")
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 5
+    with pytest.raises(CircuitOpen) as fast:
+        breaker.before_call("m")
+    assert fast.value.headers["Retry-After"] == "5"
+
+    clock.now = 10
+    breaker.before_call("m")
+    assert breaker.state == "half_open"
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call("m")
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call("m")
+
+
+def test_failed_trial_reopens_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    breaker.before_call("m")
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened_at == 10
+
+
+def test_open_breaker_fails_fast_through_call():
+    clock = Clock()
+    sleeps = []
+    layer = make_resilience(
+        sleeps, max_retries=0, breaker_factory=lambda: CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    )
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            asyncio.run(layer.call("m", Upstream(status_error(503))))
+
+    upstream = Upstream()
+    with pytest.raises(CircuitOpen):
+        asyncio.run(layer.call("m", upstream))
+    assert upstream.calls == 0
+    assert layer.stats["fast_failures"] == 1
+
+    clock.now = 10
+    assert asyncio.run(layer.call("m", upstream)) == "ok"
+    assert layer.breaker("m").state == "closed"
@@ -0,0 +1,53 @@
+import asyncio
+
+import utils.generate as generate
+from utils.router import router
+from utils.similarity import SimilarityCache
+
+QUESTION = (
+    "python script that connects to a postgres database, reads the users table, "
+    "filters out inactive accounts and exports the result to a csv file sorted by signup date"
+)
+
+
+class Cache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+
+def test_requests_are_routed_only_on_a_cache_miss(monkeypatch):
+    models = []
+
+    async def chat_completion(messages, model, route=None, **params):
+        models.append(route["model"])
+        return "code"
+
+    monkeypatch.setattr(generate, "response_cache", Cache())
+    monkeypatch.setattr(generate, "chat_completion", chat_completion)
+    monkeypatch.setattr(generate, "similar_cache", SimilarityCache())
+    decisions = router.stats["decisions"]
+
+    async def main():
+        await generate.generate_code_response("prompt", "python", QUESTION)
+        # Exact repeat, then a rephrasing the near-duplicate cache serves
+        await generate.generate_code_response("prompt", "python", QUESTION)
+        await generate.generate_code_response("other prompt", "python", f"Please write a {QUESTION}.")
+
+    asyncio.run(main())
+    assert len(models) == 1
+    assert router.stats["decisions"] == decisions + 1
+
+
+def test_cache_key_does_not_depend_on_the_routed_model(monkeypatch):
+    spec = generate.code_request("prompt", "python")
+    key = generate.make_key(**spec)
+    monkeypatch.setattr(router, "unhealthy", lambda model, max_p95=None: None if model == "gpt-4o" else "error_rate")
+    generate.route_spec(spec)
+    assert spec["route"]["model"] == "gpt-4o" and spec["route"]["reason"] == "error_rate"
+    assert generate.make_key(**spec) == key
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from utils.sandbox import SandboxPool
+
+PROBE = """
+import os
+for path in {paths!r}:
+    try:
+        open(path).read()
+        print("readable", path)
+    except OSError:
+        pass
+"""
+
+
+def run(code: str) -> dict:
+    async def main():
+        pool = SandboxPool(1)
+        await pool.start()
+        if pool.error:
+            pytest.skip(pool.error)
+        try:
+            return await pool.execute("python", code)
+        finally:
+            await pool.stop()
+
+    return asyncio.run(main())
+
+
+def test_jobs_cannot_read_server_files(tmp_path):
+    secret = tmp_path / ".env"
+    secret.write_text("OPENAI_API_KEY=sk-secret\n")
+    secret.chmod(0o644)
+    tmp_path.chmod(0o755)
+    result = run(PROBE.format(paths=[str(secret), __file__, "/etc/passwd"]))
+    assert result["exit_code"] == 0, result["stderr"]
+    assert result["stdout"] == ""
+
+
+def test_jobs_cannot_write_the_toolchains():
+    result = run("open('/usr/sandbox-probe', 'w')")
+    assert "Read-only file system" in result["stderr"]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.scheduler import TOKEN_WINDOW_SECONDS, ModelScheduler, Overloaded, PRIORITY_CLASSES
+
+
+def chat_deadline():
+    return PRIORITY_CLASSES["chat"][1]
+
+
+def test_exhausted_token_window_is_shed_on_arrival_with_window_reset():
+    async def main():
+        model = ModelScheduler("m", concurrency=4, tpm=1000)
+        await model.acquire(1000, "chat")
+        model.release(0.1)
+        start = time.monotonic()
+        with pytest.raises(Overloaded) as shed:
+            await model.acquire(500, "chat")
+        return time.monotonic() - start, int(shed.value.headers["Retry-After"])
+
+    elapsed, retry_after = asyncio.run(main())
+    assert elapsed < 0.1
+    assert TOKEN_WINDOW_SECONDS - 2 <= retry_after <= TOKEN_WINDOW_SECONDS
+
+
+def test_queue_past_deadline_is_shed_on_arrival():
+    async def main():
+        model = ModelScheduler("m", concurrency=1, tpm=10 ** 9)
+        # Observed service time well beyond the chat deadline
+        model._service_time = chat_deadline() * 2
+        await model.acquire(10, "chat")
+        start = time.monotonic()
+        with pytest.raises(Overloaded) as shed:
+            await model.acquire(10, "chat")
+        return time.monotonic() - start, int(shed.value.headers["Retry-After"])
+
+    elapsed, retry_after = asyncio.run(main())
+    assert elapsed < 0.1
+    assert retry_after == chat_deadline() * 2
+
+
+def test_request_within_deadline_waits_for_a_slot():
+    async def main():
+        model = ModelScheduler("m", concurrency=1, tpm=10 ** 9)
+        model._service_time = 0.05
+        await model.acquire(10, "chat")
+        waiter = asyncio.ensure_future(model.acquire(10, "chat"))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        model.release(0.05)
+        await waiter
+        return model.stats
+
+    assert asyncio.run(main()) == {"admitted": 2, "shed": 0}
@@ -0,0 +1,25 @@
+import asyncio
+
+from utils.history import Generation, current_generation
+from utils.sessions import ChatSessions, SessionStore
+
+
+def test_background_summary_is_not_attributed_to_the_chat_turn(tmp_path):
+    sessions = ChatSessions(SessionStore(str(tmp_path / "sessions.db")), window_tokens=1, summary_batch_tokens=1)
+    seen = []
+
+    async def summarize(summary, turns):
+        seen.append(current_generation.get())
+        return "summary"
+
+    async def main():
+        session_id = await sessions.create()
+        current_generation.set(Generation("chat", {}))
+        await sessions.record(session_id, "first question", "first answer", summarize)
+        await sessions.record(session_id, "second question", "second answer", summarize)
+        await asyncio.gather(*sessions._summarizing.values())
+        await sessions.stop()
+
+    asyncio.run(main())
+    assert seen and all(generation is None for generation in seen)
+    assert sessions.stats["summaries"] >= 1
@@ -0,0 +1,52 @@
+import pytest
+
+from utils.similarity import SimilarityCache, same_request
+
+SCOPE = "code:python"
+STORED = (
+    "python script that connects to a postgres database, reads the users table, "
+    "filters out inactive accounts and exports the result to a csv file sorted by signup date"
+)
+
+
+@pytest.fixture
+def cache():
+    cache = SimilarityCache()
+    cache.set(SCOPE, STORED, "cached answer")
+    return cache
+
+
+@pytest.mark.parametrize("old, new", [
+    ("postgres", "mysql"),
+    ("inactive", "active"),
+    ("csv", "json"),
+    ("signup date", "last login"),
+])
+def test_one_word_substitution_misses(cache, old, new):
+    assert cache.get(SCOPE, STORED.replace(old, new)) is None
+
+
+@pytest.mark.parametrize("question", [
+    STORED,
+    STORED.upper(),
+    "Please write a python script that connects to a postgres database, reads the users table, "
+    "filters out inactive accounts and exports the result to a csv file sorted by signup date.",
+    "Connect to a postgres database with python, read the users table, filter out inactive "
+    "accounts and export the result sorted by signup date to a csv file",
+])
+def test_rephrasing_hits(cache, question):
+    assert cache.get(SCOPE, question) == "cached answer"
+
+
+def test_other_scope_misses(cache):
+    assert cache.get("code:go", STORED) is None
+
+
+def test_same_request_allows_few_extra_words_on_long_prompts():
+    long = frozenset(f"word{i}" for i in range(20))
+    assert same_request(long, long | {"extra"})
+    assert not same_request(long, long | {"extra", "more", "words"})
+    # Short prompts must match exactly
+    assert not same_request(frozenset({"reverse", "string"}), frozenset({"reverse", "string", "unicode"}))
+    # Swapping a word is never allowed
+    assert not same_request(long, (long - {"word0"}) | {"other"})
@@ -0,0 +1,155 @@
+import asyncio
+
+from utils.singleflight import SharedCallCancelled, SingleFlight
+
+
+class Upstream:
+    """
+    Stub upstream call that waits on `release` before returning, or raises `error`.
+    """
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return f"result {self.calls}"
+
+    async def stream(self):
+        self.calls += 1
+        try:
+            for index in range(3):
+                yield f"t{index} "
+                if index == 0:
+                    await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+
+
+async def collect(tokens) -> str:
+    return "".join([token async for token in tokens])
+
+
+def test_do_failure_reaches_every_waiter():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream(ValueError("boom"))
+        waiters = [asyncio.ensure_future(flight.do("k", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        return upstream.calls, results
+
+    calls, results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_do_cancelling_one_waiter_leaves_the_others():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        waiters = [asyncio.ensure_future(flight.do("k", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        return upstream, results
+
+    upstream, results = asyncio.run(main())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ["result 1", "result 1"]
+    assert upstream.calls == 1 and upstream.cancelled == 0
+
+
+def test_do_last_waiter_cancelling_cancels_upstream_and_late_joiner_starts_fresh():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        first = asyncio.ensure_future(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        # Joins before the cancelled call has finished unwinding
+        late = asyncio.ensure_future(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return upstream, await asyncio.gather(first, late, return_exceptions=True)
+
+    upstream, (first, late) = asyncio.run(main())
+    assert isinstance(first, asyncio.CancelledError)
+    assert late == "result 2"
+    assert upstream.cancelled == 1
+
+
+def test_do_waiters_take_over_when_the_shared_call_is_cancelled_elsewhere():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        waiters = [asyncio.ensure_future(flight.do("k", upstream)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        flight._calls["k"].task.cancel()
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return upstream, await asyncio.gather(*waiters, return_exceptions=True)
+
+    upstream, results = asyncio.run(main())
+    assert results == ["result 2", "result 2"]
+    assert upstream.calls == 2
+
+
+def test_stream_failure_reaches_every_subscriber():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream(ValueError("boom"))
+        subscribers = [asyncio.ensure_future(collect(flight.stream("k", upstream.stream))) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return upstream.calls, await asyncio.gather(*subscribers, return_exceptions=True)
+
+    calls, results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_stream_cancelling_one_subscriber_leaves_the_others():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        subscribers = [asyncio.ensure_future(collect(flight.stream("k", upstream.stream))) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        subscribers[0].cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return upstream, await asyncio.gather(*subscribers, return_exceptions=True)
+
+    upstream, results = asyncio.run(main())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ["t0 t1 t2 ", "t0 t1 t2 "]
+    assert upstream.calls == 1 and upstream.cancelled == 0
+
+
+def test_stream_cancelled_elsewhere():
+    async def main():
+        flight, upstream = SingleFlight(), Upstream()
+        early = asyncio.ensure_future(collect(flight.stream("k", upstream.stream)))
+        await asyncio.sleep(0.01)
+        # t0 has been delivered to `early`; `fresh` subscribes but has not been scheduled yet
+        fresh = asyncio.ensure_future(collect(flight.stream("k", upstream.stream)))
+        flight._streams["k"].task.cancel()
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        return upstream, await asyncio.gather(early, fresh, return_exceptions=True)
+
+    upstream, (early, fresh) = asyncio.run(main())
+    # Tokens already sent cannot be taken back, so that subscriber gets an ordinary error
+    assert isinstance(early, SharedCallCancelled)
+    assert fresh == "t0 t1 t2 "
+    assert upstream.calls == 2
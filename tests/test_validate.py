@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+import utils.validate as validate
+from utils.sandbox import SandboxPool
+
+
+def check_all(monkeypatch, language: str, sources: list) -> list:
+    async def main():
+        pool = SandboxPool(1)
+        await pool.start()
+        if pool.error or language not in pool.checkers:
+            pytest.skip(pool.error or f"no {language} checker")
+        monkeypatch.setattr(validate, "sandbox_pool", pool)
+        try:
+            return [await validate.check_in_pool(validate.checker_language(language), code) for code in sources]
+        finally:
+            await pool.stop()
+
+    return asyncio.run(main())
+
+
+def test_c_checks_run_in_the_sandbox(monkeypatch, tmp_path):
+    secret = tmp_path / ".env"
+    secret.write_text("OPENAI_API_KEY=sk-SECRET123\n")
+    secret.chmod(0o644)
+    tmp_path.chmod(0o755)
+    valid, broken, include = check_all(monkeypatch, "c", [
+        "#include <stdio.h>\nint main(void) { puts(\"hi\"); return 0; }\n",
+        "int main(void) { return 0 }\n",
+        f'#include "{secret}"\nint main(void) {{ return 0; }}\n',
+    ])
+    assert valid is None
+    assert "error" in broken
+    assert "SECRET" not in include and "No such file" in include
+
+
+def test_python_is_checked_without_the_sandbox():
+    assert asyncio.run(validate.check_in_pool("python", "def f(:\n")).startswith('File "main.py", line 1')
+    validate.shutdown_validate_executor()
+
+
+def test_diagnostics_do_not_carry_sandbox_paths(monkeypatch):
+    [error] = check_all(monkeypatch, "javascript", ["function f( {\n"])
+    assert error.startswith("main.js:") and "/jobs/" not in error
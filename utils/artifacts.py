@@ -0,0 +1,105 @@
+import hashlib
+import os
+import re
+import threading
+
+from utils.render import RENDERERS, save_source
+
+# Artifact store settings
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "static")
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", 1024 * 1024 * 1024))
+
+SOURCE_EXTENSION = ".html"
+ARTIFACT_FILENAME = re.compile(r"^([0-9a-f]{32})(\.html|\.pdf|\.docx)$")
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for generated documents: the HTML source and its rendered
+    formats live under the hash of the generated text. Files are written atomically and
+    whole documents are evicted least recently used first once the directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, root: str = ARTIFACT_DIR, max_bytes: int = ARTIFACT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.root, f"{digest}{extension}")
+
+    def put_source(self, text: str) -> str:
+        """
+        Stores the generated text (once per distinct content) and returns its digest.
+        """
+        digest = self.digest(text)
+        path = self.path(digest, SOURCE_EXTENSION)
+        if os.path.exists(path):
+            self.touch(digest)
+        else:
+            save_source(text, path)
+            self.added(path)
+        return digest
+
+    def touch(self, digest: str) -> None:
+        """
+        Marks every file of a document as recently used.
+        """
+        for extension in (SOURCE_EXTENSION, *RENDERERS):
+            try:
+                os.utime(self.path(digest, extension))
+            except FileNotFoundError:
+                pass
+
+    def added(self, path: str) -> None:
+        """
+        Accounts for a newly written file and evicts if the store is over budget.
+        """
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, _, size in self._scan())
+            else:
+                try:
+                    self._total_bytes += os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> list:
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for entry in os.scandir(self.root):
+            match = ARTIFACT_FILENAME.match(entry.name)
+            if match and entry.is_file():
+                stat = entry.stat()
+                entries.append((match.group(1), stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        documents = {}
+        for digest, mtime, size in self._scan():
+            last_used, total = documents.get(digest, (0.0, 0))
+            documents[digest] = (max(last_used, mtime), total + size)
+
+        self._total_bytes = sum(total for _, total in documents.values())
+        # Leave some headroom so every write does not trigger another scan
+        target = self.max_bytes * 0.9
+        for digest, (_, total) in sorted(documents.items(), key=lambda item: item[1][0]):
+            if self._total_bytes <= target:
+                break
+            for extension in (SOURCE_EXTENSION, *RENDERERS):
+                try:
+                    os.remove(self.path(digest, extension))
+                except FileNotFoundError:
+                    pass
+            self._total_bytes -= total
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from fastapi import Request
+
+# Cache settings
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache/responses.db")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Share of CACHE_MAX_BYTES eviction frees down to, so a full cache does not evict on every write
+CACHE_EVICT_TARGET = float(os.getenv("CACHE_EVICT_TARGET", 0.9))
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+# Set per request by the `cache_bypass` dependency
+bypass_cache = ContextVar("bypass_cache", default=False)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses runs of whitespace so trivially different prompts share a key.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_key(model: str, messages: list, route: dict = None, routing: tuple = None, validate=None, **params) -> str:
+    """
+    Builds a cache key from the model, the full message list and the request parameters.
+    Routing, pending or decided, and the response validator are not part of the key.
+    """
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": m["role"], "content": normalize_text(m["content"])} for m in messages
+        ],
+        "params": params,
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+class LRUCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    SQLite-backed cache shared by all uvicorn workers on the host.
+    Least recently used rows are evicted once the stored size exceeds `max_bytes`, down
+    to `evict_target` of it. The stored size is kept in a one-row table updated with
+    every write, so checking the budget never scans the cache.
+    """
+
+    def __init__(self, path: str = CACHE_DB_PATH, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL_SECONDS,
+                 evict_target: float = CACHE_EVICT_TARGET):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evict_target = evict_target
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses_size ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL)"
+            )
+            # Counted once for a cache written before the size table existed
+            conn.execute(
+                "INSERT OR IGNORE INTO responses_size (id, total_bytes) "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM responses"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] + self.ttl < now:
+                self._delete(conn, [key])
+                conn.commit()
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode())
+        with self._lock:
+            conn = self._connect()
+            # The running total is read and written by every worker process
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE responses_size SET total_bytes = total_bytes + ? "
+                    "- COALESCE((SELECT size FROM responses WHERE key = ?), 0)",
+                    (size, key),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                total = conn.execute("SELECT total_bytes FROM responses_size").fetchone()[0]
+                if total > self.max_bytes:
+                    self._evict(conn, total - self.max_bytes * self.evict_target)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def _delete(self, conn: sqlite3.Connection, keys: list) -> None:
+        placeholders = ",".join("?" * len(keys))
+        conn.execute(
+            f"UPDATE responses_size SET total_bytes = total_bytes - "
+            f"(SELECT COALESCE(SUM(size), 0) FROM responses WHERE key IN ({placeholders}))",
+            keys,
+        )
+        conn.execute(f"DELETE FROM responses WHERE key IN ({placeholders})", keys)
+
+    def _evict(self, conn: sqlite3.Connection, excess: float) -> None:
+        """
+        Deletes the least recently used rows until `excess` bytes are freed.
+        """
+        while excess > 0:
+            rows = conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            keys = []
+            for key, size in rows:
+                keys.append(key)
+                excess -= size
+                if excess <= 0:
+                    break
+            self._delete(conn, keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.execute("UPDATE responses_size SET total_bytes = 0")
+            conn.commit()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: a per-process LRU in front of the shared on-disk store.
+    """
+
+    def __init__(self, memory: LRUCache = None, disk: DiskCache = None):
+        self.memory = memory or LRUCache()
+        self.disk = disk or DiskCache()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0}
+
+    async def get(self, key: str):
+        if not CACHE_ENABLED:
+            return None
+        if bypass_cache.get():
+            self.stats["bypassed"] += 1
+            return None
+
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+
+        value = await asyncio.to_thread(self.disk.get, key)
+        if value is not None:
+            self.stats["disk_hits"] += 1
+            self.memory.set(key, value)
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        if not CACHE_ENABLED:
+            return
+        self.memory.set(key, value)
+        await asyncio.to_thread(self.disk.set, key, value)
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "memory_entries": len(self.memory),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+
+
+async def cache_bypass(request: Request) -> None:
+    """
+    Router dependency: honours `X-Cache-Bypass: 1` or `Cache-Control: no-cache` for the current request.
+    """
+    header = request.headers.get(CACHE_BYPASS_HEADER, "").lower()
+    cache_control = request.headers.get("Cache-Control", "").lower()
+    bypass_cache.set(header in ("1", "true", "yes") or "no-cache" in cache_control)
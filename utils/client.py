@@ -0,0 +1,66 @@
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import openai
+
+# Connection pool settings for the shared upstream client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 100))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 30))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 120))
+
+_client = None
+
+
+def init_client() -> "openai.AsyncOpenAI":
+    """
+    Creates the app-lifetime AsyncOpenAI client with a pooled HTTP transport.
+    Called once from the FastAPI lifespan in app.py. The openai SDK is imported
+    here rather than at module level to keep worker start-up fast.
+    """
+    global _client
+    if _client is None:
+        import httpx
+        import openai
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        # Ensure API key is properly loaded
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is not set!")
+
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=OPENAI_TIMEOUT,
+        )
+        _client = openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            # Retries are handled by utils.resilience
+            max_retries=0,
+        )
+    return _client
+
+
+def get_client() -> "openai.AsyncOpenAI":
+    """
+    Returns the shared client, creating it lazily if the lifespan has not run
+    (e.g. when the generate functions are used outside the web app).
+    """
+    return _client if _client is not None else init_client()
+
+
+async def close_client() -> None:
+    """
+    Closes the shared client and its connection pool.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
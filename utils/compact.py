@@ -0,0 +1,86 @@
+import json
+from html import escape
+
+from fastapi import HTTPException
+
+# JSON schemas for compact structured output. The model returns plain text fields
+# (real newlines and spaces in code, no markup) and HTML is rendered here on request.
+CODE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "code": {"type": "string"},
+        "conclusion": {"type": "string"},
+    },
+    "required": ["description", "code", "conclusion"],
+    "additionalProperties": False,
+}
+
+DOCUMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "heading": {"type": "string"},
+                    "paragraphs": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["heading", "paragraphs"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["title", "sections"],
+    "additionalProperties": False,
+}
+
+STORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "paragraphs": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["title", "paragraphs"],
+    "additionalProperties": False,
+}
+
+
+def response_format(name: str, schema: dict) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def parse_structured(text: str) -> dict:
+    """
+    Parses a compact response. With strict schemas this only fails when the output
+    was cut off by the token limit.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise HTTPException(status_code=502, detail="Upstream returned incomplete structured output")
+
+
+def render_code_html(sections: dict, language: str) -> str:
+    """
+    Renders compact code output in the layout `create_code_prompt` asks the model for.
+    """
+    return (
+        f"<h2>Description</h2><p>{escape(sections['description'])}</p>"
+        f"<h2>Code Block</h2><pre><code class='{escape(language.lower())}'>{escape(sections['code'])}</code></pre>"
+        f"<h2>Conclusion</h2><p>{escape(sections['conclusion'])}</p>"
+    )
+
+
+def render_document_html(document: dict) -> str:
+    parts = [f"<h1>{escape(document['title'])}</h1>"]
+    for section in document["sections"]:
+        parts.append(f"<h2>{escape(section['heading'])}</h2>")
+        parts.extend(f"<p>{escape(paragraph)}</p>" for paragraph in section["paragraphs"])
+    return "".join(parts)
+
+
+def render_story_html(story: dict) -> str:
+    return f"<h1>{escape(story['title'])}</h1>" + "".join(f"<p>{escape(paragraph)}</p>" for paragraph in story["paragraphs"])
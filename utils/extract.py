@@ -0,0 +1,128 @@
+import re
+from html.parser import HTMLParser
+
+FENCED_CODE = re.compile(r"```(?:\w+)?\n([\s\S]*?)\n```")
+
+
+class CodeResponseParser(HTMLParser):
+    """
+    Single-pass extractor for code responses (<p> description, <pre><code> block,
+    <p> conclusion). Feed it the whole text or streamed chunks in order; `result()`
+    reflects everything fed so far, so it also works on partial responses.
+
+    description: text of the first <p>
+    code: text of the first <pre> (its <code> when present), with <br> as newlines
+        and &nbsp; as spaces; Markdown fences are used when the model ignored the HTML
+        format, and the whole text once the response is closed without either
+    conclusion: text of the last <p>, when there is more than one
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.raw = []
+        self.paragraphs = 0
+        self.description = []
+        self.conclusion = []
+        self.code = []
+        self.code_blocks = 0
+        self._in_p = False
+        self._pre_depth = 0
+        self._pre_done = False
+        self._saw_code_tag = False
+        self._closed = False
+
+    def feed(self, data: str) -> None:
+        self.raw.append(data)
+        super().feed(data)
+
+    def close(self) -> None:
+        super().close()
+        self._closed = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "p":
+            self._in_p = True
+            self.paragraphs += 1
+            if self.paragraphs > 1:
+                self.conclusion = []
+        elif tag == "pre" and not self._pre_done:
+            if not self._pre_depth:
+                self.code_blocks += 1
+            self._pre_depth += 1
+        elif tag == "pre":
+            self.code_blocks += 1
+        elif tag == "code" and self._pre_depth and not self._saw_code_tag:
+            # Keep only the <code> contents, as the description/conclusion live outside it
+            self._saw_code_tag = True
+            self.code = []
+        elif tag == "br" and self._pre_depth:
+            self.code.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "br" and self._pre_depth:
+            self.code.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "p":
+            self._in_p = False
+        elif tag == "pre" and self._pre_depth:
+            self._pre_depth -= 1
+            if not self._pre_depth:
+                self._pre_done = True
+
+    def handle_data(self, data):
+        if self._pre_depth:
+            self.code.append(data)
+        elif self._in_p:
+            if self.paragraphs == 1:
+                self.description.append(data)
+            else:
+                self.conclusion.append(data)
+
+    def result(self) -> dict:
+        code = "".join(self.code).replace("\xa0", " ").strip()
+        if not code and not self._pre_depth:
+            matches = FENCED_CODE.findall("".join(self.raw))
+            code = "\n\n".join(matches) if matches else ""
+            if not code and self._closed:
+                code = "".join(self.raw).strip()
+        return {
+            "description": "".join(self.description).strip(),
+            "code": code,
+            "conclusion": "".join(self.conclusion).strip() if self.paragraphs > 1 else "",
+        }
+
+
+    def format_error(self) -> str:
+        """
+        Describes how the response strayed from the single <pre><code> block the code
+        prompt asks for, or returns None.
+        """
+        if not self.code_blocks:
+            return "The code was not inside a <pre><code> block."
+        if self.code_blocks > 1:
+            return f"The code was split across {self.code_blocks} <pre> blocks; only the first was kept."
+        return None
+
+
+def parse_code_response(text: str) -> CodeResponseParser:
+    parser = CodeResponseParser()
+    parser.feed(text)
+    parser.close()
+    return parser
+
+
+def extract_code_sections(text: str) -> dict:
+    """
+    Splits a complete code response into description, code and conclusion.
+    """
+    return parse_code_response(text).result()
+
+
+async def extracting(tokens, parser: CodeResponseParser):
+    """
+    Forwards streamed tokens while feeding them to `parser`.
+    """
+    async for token in tokens:
+        parser.feed(token)
+        yield token
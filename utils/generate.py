@@ -1,36 +1,515 @@
-from docx import Document
-from dotenv import load_dotenv
-import openai
 from fastapi import HTTPException
+from html import escape
+import asyncio
+import json
 import os
-from reportlab.pdfgen import canvas
+import re
+import time
 
-load_dotenv()
-# Ensure API key is properly loaded
-api_key = os.getenv("OPENAI_API_KEY")
+from utils.cache import make_key, response_cache
+from utils.client import get_client
+from utils.compact import CODE_SCHEMA, DOCUMENT_SCHEMA, STORY_SCHEMA, parse_structured, response_format
+from utils.extract import FENCED_CODE
+from utils.history import note_usage
+from utils.length import max_tokens_for_words, stop_at_word_count
+from utils.prompt import (
+    create_document_prompt,
+    code_compact_system_prompt,
+    code_system_prompt,
+    create_outline_prompt,
+    create_repair_prompt,
+    create_section_prompt,
+    create_summary_prompt,
+    document_compact_system_prompt,
+    document_system_prompt,
+    document_word_band,
+    normalize_language,
+    outline_system_prompt,
+    section_system_prompt,
+    story_compact_system_prompt,
+    story_system_prompt,
+)
+from utils.metrics import (
+    CODE_REPAIRS,
+    CODE_VALIDATIONS,
+    REPAIR_LATENCY,
+    STAGE_LATENCY,
+    UPSTREAM_TTFT,
+    record_usage,
+    stage,
+)
+from utils.resilience import resilience
+from utils.router import ROUTER_PRIMARY_RETRIES, fallback_cause, note_route, router
+from utils.scheduler import Overloaded, request_priority, scheduler
+from utils.sessions import CHAT_SUMMARY_TOKENS, chat_sessions
+from utils.similarity import similar_cache
+from utils.singleflight import inflight
+from utils.validate import check_in_pool, checker_language, validation_stats
 
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable is not set!")
+# Documents at or above this word count are generated section by section in parallel
+LONG_DOCUMENT_THRESHOLD = int(os.getenv("LONG_DOCUMENT_THRESHOLD", 2500))
+WORDS_PER_SECTION = int(os.getenv("WORDS_PER_SECTION", 450))
+MAX_SECTIONS = 12
 
 
-def generate_code_response(prompt: str) -> str:
+async def _chat_completion(messages: list, model: str, max_retries: int = None, **params) -> str:
+    client = get_client()
+    try:
+        async with scheduler.slot(model, messages, params.get("max_tokens")):
+            with stage("upstream"):
+                response = await resilience.call(
+                    model,
+                    lambda: client.chat.completions.create(model=model, messages=messages, **params),
+                    max_retries=max_retries,
+                )
+    except Exception as e:
+        if fallback_cause(e) is not None:
+            router.record(model, False)
+        raise
+    router.record(model, True)
+    record_usage(model, response.usage)
+    note_usage(response.usage)
+    return response.choices[0].message.content.strip()
+
+
+async def chat_completion(messages: list, model: str = "gpt-4o-mini", route: dict = None, validate=None, **params) -> str:
+    """
+    Sends a chat completion through the shared AsyncOpenAI client and returns the text.
+    With a `route` from `router.select`, its model is called and a timeout or overload
+    is retried on the route's fallback model. `validate(text)` raises when the text is
+    unusable (truncated structured output), before any caller can cache it.
+    """
+    if validate is not None:
+        text = await chat_completion(messages, model, route, **params)
+        validate(text)
+        return text
+    if route is not None:
+        note_route(route)
+        model = route["model"]
+    if route is None or route["fallback"] is None:
+        return await _chat_completion(messages, model, **params)
+    try:
+        # Retrying the routed model at length would only delay the fallback
+        return await _chat_completion(messages, model, ROUTER_PRIMARY_RETRIES, **params)
+    except Exception as e:
+        cause = fallback_cause(e)
+        if cause is None:
+            raise
+    return await _chat_completion(messages, router.fell_back(route, cause), **params)
+
+
+async def _stream_chat_completion(messages: list, model: str, max_retries: int = None, **params):
+    client = get_client()
+    opened = False
+    try:
+        async with scheduler.slot(model, messages, params.get("max_tokens")):
+            start = time.perf_counter()
+            # Retries and timeouts cover opening the stream; tokens already sent cannot be retried
+            stream = await resilience.call(
+                model,
+                lambda: client.chat.completions.create(
+                    model=model, messages=messages, stream=True,
+                    stream_options={"include_usage": True}, **params
+                ),
+                hedge=False,
+                max_retries=max_retries,
+            )
+            opened = True
+            router.record(model, True)
+            first_token = True
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            UPSTREAM_TTFT.labels(model).observe(time.perf_counter() - start)
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+                    if getattr(chunk, "usage", None):
+                        record_usage(model, chunk.usage)
+                        note_usage(chunk.usage)
+            finally:
+                await stream.close()
+                STAGE_LATENCY.labels("upstream").observe(time.perf_counter() - start)
+    except Exception as e:
+        if not opened and fallback_cause(e) is not None:
+            router.record(model, False)
+        raise
+
+
+async def stream_chat_completion(messages: list, model: str = "gpt-4o-mini", route: dict = None, validate=None, **params):
+    """
+    Streams a chat completion through the shared AsyncOpenAI client, yielding text deltas.
+    With a `route`, its model is called and a timeout or overload before the stream
+    opens is retried on the route's fallback model. `validate` is applied to the whole
+    text once the stream ends, as in `chat_completion`.
+    """
+    if validate is not None:
+        parts = []
+        async for token in stream_chat_completion(messages, model, route, **params):
+            parts.append(token)
+            yield token
+        validate("".join(parts).strip())
+        return
+    if route is not None:
+        note_route(route)
+        model = route["model"]
+    if route is None or route["fallback"] is None:
+        async for token in _stream_chat_completion(messages, model, **params):
+            yield token
+        return
+
+    started = False
+    try:
+        async for token in _stream_chat_completion(messages, model, ROUTER_PRIMARY_RETRIES, **params):
+            started = True
+            yield token
+        return
+    except Exception as e:
+        cause = fallback_cause(e)
+        if started or cause is None:
+            raise
+    async for token in _stream_chat_completion(messages, router.fell_back(route, cause), **params):
+        yield token
+
+
+async def reserve_stream(spec: dict):
+    """
+    Routes a streaming request and reserves its upstream slot before the response starts,
+    so overload is a 503 with Retry-After rather than an in-band error after a 200. On
+    overload the route's fallback model is tried. Wrap the stream in `scheduler.holding`.
+    """
+    route = route_spec(spec).get("route")
+    model = spec["model"] if route is None else route["model"]
+    try:
+        return await scheduler.reserve(model, spec["messages"], spec.get("max_tokens"))
+    except Overloaded:
+        if route is None or route["fallback"] is None:
+            raise
+        router.record(model, False)
+    reservation = await scheduler.reserve(route["fallback"], spec["messages"], spec.get("max_tokens"))
+    router.fell_back(route, "overloaded")
+    return reservation
+
+
+def note_cache_hit(spec: dict) -> None:
+    if spec.get("routing") is not None:
+        note_route({"endpoint": spec["routing"][0], "model": spec["model"], "cache_hit": True})
+
+
+async def cached_completion(spec: dict) -> str:
+    """
+    Returns the cached text for a request spec, calling upstream only on a miss.
+    Text the spec's `validate` rejects is raised and never stored.
+    """
+    key = make_key(**spec)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        note_cache_hit(spec)
+        return cached
+
+    async def fetch():
+        text = await chat_completion(**route_spec(spec))
+        await response_cache.set(key, text)
+        return text
+
+    # Identical concurrent misses share one upstream call
+    return await inflight.do(key, fetch)
+
+
+async def cached_stream(spec: dict, word_band: tuple = None):
+    """
+    Streaming counterpart of `cached_completion`: a hit is replayed as a single delta,
+    a miss is streamed from upstream (shared with identical in-flight streams) and stored once complete.
+    With `word_band`, the upstream stream is stopped early once the document reaches that length.
+    """
+    key = make_key(**spec)
+    cached = await response_cache.get(key)
+    tokens = _replay(spec, cached) if cached is not None else _shared_stream(key, spec, word_band)
+    async for token in tokens:
+        yield token
+
+
+async def reserve_cached_stream(spec: dict, word_band: tuple = None):
+    """
+    Returns the tokens of `cached_stream` for a streaming endpoint. A hit is replayed
+    without routing or a scheduler slot; a miss is routed and reserved up front (see
+    `reserve_stream`), so overload is still answered before the response starts.
+    """
+    key = make_key(**spec)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return _replay(spec, cached)
+    reservation = await reserve_stream(spec)
+    return scheduler.holding(reservation, _shared_stream(key, spec, word_band))
+
+
+async def _replay(spec: dict, text: str):
+    note_cache_hit(spec)
+    yield text
+
+
+async def _shared_stream(key: str, spec: dict, word_band: tuple = None):
+    async def fetch():
+        parts = []
+        tokens = stream_chat_completion(**route_spec(spec))
+        if word_band is not None:
+            tokens = stop_at_word_count(tokens, *word_band, max_tokens=spec.get("max_tokens", 0))
+        async for token in tokens:
+            parts.append(token)
+            yield token
+        await response_cache.set(key, "".join(parts).strip())
+
+    # Identical concurrent misses subscribe to one upstream stream
+    async for token in inflight.stream(key, fetch):
+        yield token
+
+
+# Static instructions go first as the system message and the user's inputs last, so
+# requests of one kind share a byte-stable prefix the provider can cache.
+# `prompt_cache_key` groups those requests onto the same cache. The model comes from
+# the routing table (utils/router.py), which sees only the user's inputs, and is only
+# picked once the request misses the caches, so hits are not counted as routing decisions.
+# Until then `model` is the matching rule's model, which is also what the response cache
+# is keyed on whichever model ends up serving the request.
+
+def routed(endpoint: str, prompt: str, **features) -> dict:
+    _, rule = router.match(endpoint, len(prompt), features.get("language"), features.get("word_count"))
+    return {"model": rule["model"], "routing": (endpoint, prompt, features)}
+
+
+def route_spec(spec: dict) -> dict:
+    """
+    Replaces the pending routing of a spec from `routed` with the routing decision.
+    """
+    routing = spec.pop("routing", None)
+    if routing is not None:
+        endpoint, prompt, features = routing
+        spec["route"] = router.select(endpoint, prompt, **features)
+    return spec
+
+
+def code_request(prompt: str, language: str) -> dict:
+    return {
+        **routed("code", prompt, language=normalize_language(language)),
+        "messages": [
+            {"role": "system", "content": code_system_prompt(language)},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": f"code:{normalize_language(language).lower()}",
+    }
+
+
+def code_compact_request(prompt: str, language: str) -> dict:
+    return {
+        **routed("code", prompt, language=normalize_language(language)),
+        "messages": [
+            {"role": "system", "content": code_compact_system_prompt(language)},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": f"code-compact:{normalize_language(language).lower()}",
+        "response_format": response_format("code_response", CODE_SCHEMA),
+        "validate": parse_structured,
+    }
+
+
+def repair_request(prompt: str, code: str) -> dict:
+    return {
+        **routed("repair", prompt),
+        "messages": [
+            {"role": "system", "content": "You fix syntax errors in code."},
+            {"role": "user", "content": prompt},
+        ],
+        # Room for the whole corrected code, at ~4 characters per token, plus slack
+        "max_tokens": len(code) // 4 * 2 + 256,
+    }
+
+
+def document_request(prompt: str, word_count: int = None) -> dict:
+    max_tokens = 1500
+    if word_count is not None:
+        max_tokens = max_tokens_for_words(document_word_band(word_count)[1])
+    return {
+        **routed("document", prompt, word_count=word_count),
+        "messages": [
+            {"role": "system", "content": document_system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": "document",
+        "max_tokens": max_tokens,
+    }
+
+
+def document_compact_request(prompt: str, word_count: int) -> dict:
+    return {
+        **routed("document", prompt, word_count=word_count),
+        "messages": [
+            {"role": "system", "content": document_compact_system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": "document-compact",
+        "max_tokens": max_tokens_for_words(document_word_band(word_count)[1]),
+        "response_format": response_format("document", DOCUMENT_SCHEMA),
+        "validate": parse_structured,
+    }
+
+
+def outline_request(prompt: str) -> dict:
+    return {
+        **routed("outline", prompt),
+        "messages": [
+            {"role": "system", "content": outline_system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": "outline",
+        "max_tokens": 800,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def section_request(prompt: str, word_count: int) -> dict:
+    return {
+        **routed("section", prompt, word_count=word_count),
+        "messages": [
+            {"role": "system", "content": section_system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": "section",
+        "max_tokens": max_tokens_for_words(word_count + 30),
+    }
+
+
+def story_request(prompt: str) -> dict:
+    return {
+        **routed("story", prompt),
+        "messages": [
+            {"role": "system", "content": story_system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": "story",
+        "max_tokens": 700,
+    }
+
+
+def story_compact_request(prompt: str) -> dict:
+    return {
+        **routed("story", prompt),
+        "messages": [
+            {"role": "system", "content": story_compact_system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        "prompt_cache_key": "story-compact",
+        "max_tokens": 700,
+        "response_format": response_format("story", STORY_SCHEMA),
+        "validate": parse_structured,
+    }
+
+
+def chat_request(prompt: str, context: list = None) -> dict:
+    return {
+        **routed("chat", prompt),
+        "messages": [*(context or []), {"role": "user", "content": prompt}],
+    }
+
+
+def summary_request(prompt: str) -> dict:
+    return {
+        **routed("summary", prompt),
+        "messages": [
+            {"role": "system", "content": "You are a concise conversation summarizer."},
+            {"role": "user", "content": prompt},
+        ],
+        "max_tokens": CHAT_SUMMARY_TOKENS,
+    }
+
+
+async def generate_code_response(prompt: str, language: str = None, question: str = None, compact: bool = False) -> str:
     """
     Handles the response from OpenAI API for code generation (Compatible with OpenAI v1.0.0+).
+    When `language` and `question` are given, rephrasings of an earlier question are served
+    from the near-duplicate cache. With `compact`, the response is JSON (see utils.compact).
     """
     try:
-        # Pass the API key explicitly when creating the client
-        client = openai.OpenAI(api_key=api_key)
+        spec = (code_compact_request if compact else code_request)(prompt, language or "")
+        if question is None:
+            return await cached_completion(spec)
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}]
-        )
+        scope = f"{'code-compact' if compact else 'code'}:{normalize_language(language or '')}"
+        similar = similar_cache.get(scope, question)
+        if similar is not None:
+            note_cache_hit(spec)
+            return similar
 
-        return response.choices[0].message.content.strip()
+        text = await cached_completion(spec)
+        similar_cache.set(scope, question, text)
+        return text
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def strip_code_fences(text: str) -> str:
+    matches = FENCED_CODE.findall(text)
+    return "\n\n".join(matches) if matches else text.strip()
+
+
+async def validate_code_response(language: str, sections: dict, format_error: str = None) -> tuple:
+    """
+    Syntax-checks the code of a code response (from `CodeResponseParser.result()` or
+    compact output). On an error, sends one repair request carrying only the code and
+    the error rather than regenerating the whole response. Code found outside the
+    <pre><code> block is already recovered by the parser, so `format_error` is
+    reported without a repair.
+
+    Returns:
+        tuple: (sections, validation); the sections hold the repaired code when it parses.
+    """
+    checker = checker_language(language)
+    with stage("validate"):
+        error = await check_in_pool(checker, sections["code"]) if checker and sections["code"] else None
+
+    label = checker or "unchecked"
+    result = "syntax_error" if error else "format_error" if format_error else "valid" if checker else "unchecked"
+    CODE_VALIDATIONS.labels(label, result).inc()
+    validation_stats["checked" if checker else "unchecked"] += 1
+    validation_stats["first_pass_valid"] += result == "valid"
+    validation_stats["format_errors"] += format_error is not None
+    validation_stats["syntax_errors"] += error is not None
+    validation = {
+        "checked": checker is not None,
+        "first_pass_valid": result == "valid",
+        "format_error": format_error,
+        "syntax_error": error,
+        "repaired": False,
+        # Unknown without a checker for the language
+        "valid": error is None if checker else None,
+    }
+    if error is None:
+        return sections, validation
+
+    start = time.perf_counter()
+    validation_stats["repairs"] += 1
+    try:
+        prompt = create_repair_prompt(language, sections["code"], error)
+        repaired = strip_code_fences(await cached_completion(repair_request(prompt, sections["code"])))
+        remaining = await check_in_pool(checker, repaired)
+    except Exception as e:
+        # The unrepaired response is still worth returning
+        repaired, remaining = None, getattr(e, "detail", None) or str(e)
+    elapsed = time.perf_counter() - start
+    REPAIR_LATENCY.labels(label).observe(elapsed)
+    CODE_REPAIRS.labels(label, "failed" if remaining else "fixed").inc()
+    validation["repair_ms"] = round(elapsed * 1000, 1)
+
+    if remaining:
+        validation["repair_error"] = remaining
+        return sections, validation
+    validation_stats["repaired"] += 1
+    validation.update(repaired=True, valid=True)
+    return {**sections, "code": repaired}, validation
+
+
 # def generate_document_response(prompt: str) -> str:
 #     """
 #     Handles the response from OpenAI API for document generation (Compatible with OpenAI v1.0.0+).
@@ -53,67 +532,156 @@ def generate_code_response(prompt: str) -> str:
 #         raise HTTPException(status_code=500, detail=str(e))
 
 
-def generate_document_response(prompt: str) -> str:
+async def generate_document_response(prompt: str, word_count: int = None, compact: bool = False) -> str:
     """
     Handles the response from OpenAI API for document generation.
+    When `word_count` is given, `max_tokens` is sized from it and generation stops
+    at a section boundary once the requested length is reached. With `compact`, the
+    response is JSON (see utils.compact) and is never cut short, as that would break it.
     """
     try:
-        client = openai.OpenAI()
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful document creator."},
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=1500,
-        )
+        if compact:
+            # Streamed, so the per-attempt upstream timeout covers opening the stream rather
+            # than thousands of tokens; no word band, as stopping early would break the JSON
+            parts = [token async for token in cached_stream(document_compact_request(prompt, word_count))]
+            return "".join(parts).strip()
+        if word_count is None:
+            return await cached_completion(document_request(prompt))
 
-        return response.choices[0].message.content.strip()
+        spec = document_request(prompt, word_count)
+        parts = [token async for token in cached_stream(spec, document_word_band(word_count))]
+        return "".join(parts).strip()
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def save_text_to_pdf(text: str, filename: str) -> str:
-    pdf_path = f"static/{filename}"
-    c = canvas.Canvas(pdf_path)
-    c.drawString(100, 750, "Generated Document")
+def parse_outline(text: str):
+    """
+    Extracts (title, [(heading, points), ...]) from the outline JSON, or None if unusable.
+    """
+    try:
+        outline = json.loads(text)
+        sections = [
+            (str(section["heading"]).strip(), [str(point) for point in section.get("points", [])])
+            for section in outline["sections"]
+            if str(section.get("heading", "")).strip()
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    if not sections:
+        return None
+    return str(outline.get("title") or "").strip(), sections[:MAX_SECTIONS]
+
+
+def _strip_headings(body: str) -> str:
+    # Sections must not carry their own <h1>/<h2>; those come from the outline
+    return re.sub(r"<h[12][^>]*>.*?</h[12]>", "", body, flags=re.IGNORECASE | re.DOTALL).strip()
 
-    y_position = 730
-    for line in text.split("\n"):
-        c.drawString(100, y_position, line)
-        y_position -= 20
 
-    c.save()
-    return pdf_path
+async def generate_long_document_response(document_topic: str, word_count: int) -> str:
+    """
+    Generates a long document by first requesting an outline, then writing every section
+    concurrently with a share of the word budget, and stitching them into the HTML
+    structure `create_document_prompt` asks for. Falls back to a single completion if
+    the outline cannot be parsed.
+    """
+    try:
+        min_words, max_words = document_word_band(word_count)
+        target = (min_words + max_words) // 2
+        section_count = min(max(round(target / WORDS_PER_SECTION), 3), MAX_SECTIONS)
 
+        outline = parse_outline(
+            await cached_completion(outline_request(create_outline_prompt(document_topic, section_count)))
+        )
+        if outline is None:
+            return await generate_document_response(
+                create_document_prompt(document_topic, word_count), word_count
+            )
 
-def save_text_to_docx(text: str, filename: str) -> str:
-    doc_path = f"static/{filename}"
-    doc = Document()
-    doc.add_paragraph(text)
-    doc.save(doc_path)
-    return doc_path
+        title, sections = outline
+        title = title or document_topic
+        edge_words = max(target // 12, 60)
+        body_words = max((target - 2 * edge_words) // len(sections), 80)
+        parts = (
+            [("Introduction", ["introduce the topic and what the document covers"], edge_words)]
+            + [(heading, points, body_words) for heading, points in sections]
+            + [("Conclusion", ["summarize the key points of every section"], edge_words)]
+        )
+        headings = [heading for heading, _, _ in parts]
+
+        # Wall-clock time is bounded by the slowest section rather than the whole document
+        bodies = await asyncio.gather(*[
+            cached_completion(section_request(
+                create_section_prompt(document_topic, title, headings, heading, points, words), words
+            ))
+            for heading, points, words in parts
+        ])
+        bodies = [_strip_headings(body) for body in bodies]
+
+        return f"<h1>{escape(title)}</h1>{bodies[0]}" + "".join(
+            f"<h2>{escape(heading)}</h2>{body}" for heading, body in zip(headings[1:], bodies[1:])
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
-def generate_story_response(prompt: str) -> str:
+async def generate_story_response(prompt: str, title: str = None, story_form: str = None, compact: bool = False) -> str:
     """
     Handles the response from OpenAI API for document generation (Compatible with OpenAI v1.0.0+).
+    When `title` and `story_form` are given, near-duplicate titles are served from the similarity cache.
+    With `compact`, the response is JSON (see utils.compact).
     """
     try:
-        client = openai.OpenAI()
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful Story creator."},
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=700,
-        )
+        spec = story_compact_request(prompt) if compact else story_request(prompt)
+        if title is None:
+            return await cached_completion(spec)
+
+        scope = f"{'story-compact' if compact else 'story'}:{(story_form or '').lower().strip()}"
+        similar = similar_cache.get(scope, title)
+        if similar is not None:
+            note_cache_hit(spec)
+            return similar
+
+        text = await cached_completion(spec)
+        similar_cache.set(scope, title, text)
+        return text
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def summarize_chat(summary: str, turns: list) -> str:
+    """
+    Folds chat turns that left the context window into the session summary.
+    """
+    # Background work: yield to interactive requests
+    request_priority.set("batch")
+    return (await chat_completion(**route_spec(summary_request(create_summary_prompt(summary, turns))))).strip()
+
+
+async def generate_chat_response(prompt: str, session_id: str = None) -> str:
+    """
+    Handles the response from OpenAI API for the chat endpoint. With `session_id`, the
+    session summary and recent turns are sent as context and the exchange is stored.
+    """
+    try:
+        if session_id is None:
+            return await chat_completion(**route_spec(chat_request(prompt)))
 
-        return response.choices[0].message.content.strip()
+        context = await chat_sessions.context(session_id, prompt)
+        text = await chat_completion(**route_spec(chat_request(prompt, context)))
+        await chat_sessions.record(session_id, prompt, text, summarize_chat)
+        return text
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Generation history settings
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() == "true"
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", 1.0))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 200))
+# Rows held in memory while the database is slow or down; newer rows are dropped beyond this
+HISTORY_BUFFER_MAX = int(os.getenv("HISTORY_BUFFER_MAX", 10000))
+HISTORY_POOL_SIZE = int(os.getenv("HISTORY_POOL_SIZE", 5))
+HISTORY_MAX_OVERFLOW = int(os.getenv("HISTORY_MAX_OVERFLOW", 5))
+
+# The generation being served by the current request, if any
+current_generation = ContextVar("current_generation", default=None)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class Generation:
+    """
+    Accumulates one generation's details while it is served. Upstream token usage is
+    added by `note_usage`; cache hits and coalesced followers therefore record zero tokens.
+    Routing decisions are added by `utils.router.note_route`.
+    """
+
+    def __init__(self, endpoint: str, inputs: dict, prompt: str = None):
+        self.endpoint = endpoint
+        self.inputs = inputs
+        self.routing = []
+        self.prompt = prompt
+        self.output = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.created_at = time.time()
+        self._start = time.perf_counter()
+
+    @property
+    def model(self) -> str:
+        # The first upstream request is the generation's main one; it may have fallen back
+        return self.routing[0]["model"] if self.routing else None
+
+    def add_route(self, route: dict) -> None:
+        self.routing.append(route)
+
+    def add_usage(self, usage) -> None:
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+
+    def row(self, status: str, error: str = None) -> dict:
+        key = self.prompt if self.prompt is not None else json.dumps(self.inputs, sort_keys=True)
+        return {
+            "created_at": self.created_at,
+            "endpoint": self.endpoint,
+            # Near-duplicate cache hits make no upstream request
+            "model": self.model or "",
+            "status": status,
+            "prompt_hash": prompt_hash(key),
+            "inputs": self.inputs,
+            "output": self.output,
+            "error": error,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_ms": (time.perf_counter() - self._start) * 1000,
+        }
+
+
+def note_usage(usage) -> None:
+    """
+    Adds upstream token usage to the generation being served, if any.
+    """
+    generation = current_generation.get()
+    if generation is not None and usage is not None:
+        generation.add_usage(usage)
+
+
+class HistoryRecorder:
+    """
+    Write-behind recorder: requests only append rows to an in-memory buffer, and a
+    background task bulk-inserts them every `flush_interval` seconds or `batch_size` rows.
+    Failed flushes keep their rows for the next attempt, up to `buffer_max`.
+    """
+
+    def __init__(self, enabled: bool = HISTORY_ENABLED, flush_interval: float = HISTORY_FLUSH_INTERVAL,
+                 batch_size: int = HISTORY_BATCH_SIZE, buffer_max: int = HISTORY_BUFFER_MAX):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.buffer_max = buffer_max
+        self.engine = None
+        self._db = None
+        self._buffer = deque()
+        self._wakeup = None
+        self._task = None
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flushes": 0, "flush_failures": 0}
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        from utils import history_db
+
+        self._db = history_db
+        self.engine = history_db.create_engine(history_db.database_url(), HISTORY_POOL_SIZE, HISTORY_MAX_OVERFLOW)
+        if self.engine.url.get_backend_name() == "sqlite":
+            os.makedirs(os.path.dirname(history_db.HISTORY_SQLITE_PATH), exist_ok=True)
+        await history_db.create_tables(self.engine)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+        await self.engine.dispose()
+
+    def record(self, row: dict) -> None:
+        if self._task is None:
+            return
+        if len(self._buffer) >= self.buffer_max:
+            self.stats["dropped"] += 1
+            return
+        self._buffer.append(row)
+        self.stats["recorded"] += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    @contextmanager
+    def track(self, endpoint: str, request, prompt: str = None):
+        """
+        Records the generation served inside the block. Set `output` (and `prompt`
+        if not known up front) on the yielded `Generation`; errors are recorded too.
+        """
+        generation = Generation(endpoint, _inputs(request), prompt)
+        token = current_generation.set(generation)
+        try:
+            yield generation
+        except Exception as e:
+            self.record(generation.row("error", getattr(e, "detail", None) or str(e)))
+            raise
+        else:
+            self.record(generation.row("ok"))
+        finally:
+            current_generation.reset(token)
+
+    async def track_stream(self, tokens, endpoint: str, request, prompt: str = None):
+        """
+        Streaming counterpart of `track`: forwards `tokens` and records the full text once
+        the stream ends. A client disconnect is recorded as "cancelled" with the partial text.
+        """
+        generation = Generation(endpoint, _inputs(request), prompt)
+        current_generation.set(generation)
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield token
+        except (asyncio.CancelledError, GeneratorExit):
+            generation.output = "".join(parts)
+            self.record(generation.row("cancelled"))
+            raise
+        except Exception as e:
+            generation.output = "".join(parts) or None
+            self.record(generation.row("error", getattr(e, "detail", None) or str(e)))
+            raise
+        generation.output = "".join(parts).strip()
+        self.record(generation.row("ok"))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        while self._buffer:
+            rows = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                await self._db.insert_rows(self.engine, rows)
+            except Exception:
+                logger.exception("Failed to write %d history rows", len(rows))
+                self.stats["flush_failures"] += 1
+                # Keep them for the next flush; the oldest are dropped if the buffer is full
+                self._buffer.extendleft(reversed(rows))
+                while len(self._buffer) > self.buffer_max:
+                    self._buffer.popleft()
+                    self.stats["dropped"] += 1
+                return
+            self.stats["written"] += len(rows)
+            self.stats["flushes"] += 1
+
+    async def page(self, **filters) -> list:
+        if self.engine is None:
+            return []
+        return await self._db.fetch_page(self.engine, **filters)
+
+    async def get(self, generation_id: int):
+        if self.engine is None:
+            return None
+        return await self._db.fetch_one(self.engine, generation_id)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "enabled": self.enabled, "buffered": len(self._buffer)}
+
+
+def _inputs(request) -> dict:
+    return request.model_dump() if hasattr(request, "model_dump") else dict(request)
+
+
+generation_history = HistoryRecorder()
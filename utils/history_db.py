@@ -0,0 +1,144 @@
+# Schema and queries for generation history; imported lazily by utils.history
+# so SQLAlchemy stays off the app's import path.
+import os
+
+from sqlalchemy import (
+    DDL,
+    JSON,
+    Column,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    event,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+)
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config import DATABASE_URL
+
+# SQLite database used when DATABASE_URL is not set (local development and tests)
+HISTORY_SQLITE_PATH = os.getenv("HISTORY_SQLITE_PATH", "data/history.db")
+
+metadata = MetaData()
+
+generations = Table(
+    "generations",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("created_at", Float, nullable=False),
+    Column("endpoint", String(64), nullable=False),
+    Column("model", String(64), nullable=False),
+    Column("status", String(16), nullable=False),
+    Column("prompt_hash", String(64), nullable=False),
+    Column("inputs", JSON, nullable=False),
+    Column("output", Text),
+    Column("error", Text),
+    Column("prompt_tokens", Integer, nullable=False),
+    Column("completion_tokens", Integer, nullable=False),
+    Column("latency_ms", Float, nullable=False),
+)
+
+# History pages are keyset-paginated by id, optionally filtered by endpoint or model
+Index("ix_generations_endpoint_id", generations.c.endpoint, generations.c.id)
+Index("ix_generations_model_id", generations.c.model, generations.c.id)
+Index("ix_generations_prompt_hash", generations.c.prompt_hash)
+Index("ix_generations_created_at", generations.c.created_at)
+
+# Full-text search over outputs on PostgreSQL; SQLite falls back to a LIKE scan
+event.listen(
+    generations,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_generations_output_fts ON generations "
+        "USING GIN (to_tsvector('english', coalesce(output, '')))"
+    ).execute_if(dialect="postgresql"),
+)
+
+SUMMARY_COLUMNS = [c for c in generations.c if c.name != "output"]
+
+
+def database_url(url: str = DATABASE_URL, sqlite_path: str = HISTORY_SQLITE_PATH) -> str:
+    """
+    Maps DATABASE_URL onto an async driver (asyncpg for PostgreSQL), or a local
+    aiosqlite database when it is not set.
+    """
+    if not url:
+        return f"sqlite+aiosqlite:///{sqlite_path}"
+    for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+def create_engine(url: str, pool_size: int, max_overflow: int):
+    if url.startswith("sqlite"):
+        engine = create_async_engine(url, connect_args={"timeout": 10})
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+        return engine
+    return create_async_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+
+
+async def create_tables(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+
+
+async def insert_rows(engine, rows: list) -> None:
+    # One executemany per flush; the driver batches the parameter sets
+    async with engine.begin() as conn:
+        await conn.execute(insert(generations), rows)
+
+
+async def fetch_page(engine, before: int = None, limit: int = 50, endpoint: str = None, model: str = None,
+                     prompt_hash: str = None, query: str = None, since: float = None, until: float = None) -> list:
+    """
+    Returns generation summaries (without output) newest first, filtered and keyset-paginated by id.
+    """
+    statement = select(*SUMMARY_COLUMNS).order_by(generations.c.id.desc()).limit(limit)
+    if before is not None:
+        statement = statement.where(generations.c.id < before)
+    if endpoint is not None:
+        statement = statement.where(generations.c.endpoint == endpoint)
+    if model is not None:
+        statement = statement.where(generations.c.model == model)
+    if prompt_hash is not None:
+        statement = statement.where(generations.c.prompt_hash == prompt_hash)
+    if since is not None:
+        statement = statement.where(generations.c.created_at >= since)
+    if until is not None:
+        statement = statement.where(generations.c.created_at < until)
+    if query:
+        if engine.dialect.name == "postgresql":
+            # Literal arguments so the planner matches the expression index
+            english = literal_column("'english'")
+            document = func.to_tsvector(english, func.coalesce(generations.c.output, literal_column("''")))
+            statement = statement.where(document.bool_op("@@")(func.plainto_tsquery(english, query)))
+        else:
+            pattern = f"%{query}%"
+            statement = statement.where(or_(generations.c.output.like(pattern), generations.c.error.like(pattern)))
+
+    async with engine.connect() as conn:
+        result = await conn.execute(statement)
+        return [dict(row) for row in result.mappings()]
+
+
+async def fetch_one(engine, generation_id: int):
+    async with engine.connect() as conn:
+        result = await conn.execute(select(generations).where(generations.c.id == generation_id))
+        row = result.mappings().first()
+    return dict(row) if row is not None else None
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Job queue settings
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "data/jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", 100))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", 24 * 3600))
+JOB_POLL_INTERVAL = 0.5
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobStore:
+    """
+    SQLite store for job state, readable from every uvicorn worker on the host.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, ttl: float = JOB_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                "request TEXT NOT NULL, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def create(self, job_id: str, kind: str, request: dict) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, request, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(request), now, now),
+            )
+            conn.commit()
+
+    def update(self, job_id: str, status: str, result: dict = None, error: str = None) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+            conn.commit()
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, kind, status, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+
+    def purge(self) -> None:
+        # A job still queued or running after the TTL was lost with its process
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - self.ttl,))
+            conn.commit()
+
+
+class JobQueue:
+    """
+    Bounded in-process queue drained by a fixed pool of asyncio workers.
+    `handler(request)` does the work and returns a JSON-serializable result.
+    """
+
+    def __init__(self, kind: str, handler, workers: int = JOB_WORKERS, depth: int = JOB_QUEUE_DEPTH, store: JobStore = None):
+        self.kind = kind
+        self.handler = handler
+        self.workers = workers
+        self.depth = depth
+        self.store = store or JobStore()
+        self._queue = None
+        self._tasks = []
+        self._finished = {}
+        # Submits holding a queue slot while their row is written
+        self._reserved = 0
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.depth)
+        await asyncio.to_thread(self.store.purge)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            job_id, _ = self._queue.get_nowait()
+            await asyncio.to_thread(self.store.update, job_id, "failed", None, "Server shutting down")
+
+    async def submit(self, request) -> str:
+        """
+        Queues a request and returns its job id, or raises QueueFull.
+        """
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        # The slot is taken before the first await, so concurrent submits cannot overfill the queue
+        if self._queue.qsize() + self._reserved >= self.depth:
+            raise QueueFull(f"{self.kind} job queue is full")
+
+        job_id = uuid.uuid4().hex
+        self._reserved += 1
+        try:
+            await asyncio.to_thread(self.store.create, job_id, self.kind, request.model_dump())
+        finally:
+            self._reserved -= 1
+
+        self._finished[job_id] = asyncio.Event()
+        try:
+            self._queue.put_nowait((job_id, request))
+        except asyncio.QueueFull:
+            del self._finished[job_id]
+            await asyncio.to_thread(self.store.update, job_id, "failed", None, "Job queue is full")
+            raise QueueFull(f"{self.kind} job queue is full")
+        return job_id
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id: str, timeout: float):
+        """
+        Long-polls until the job finishes or `timeout` elapses, then returns its state.
+        Jobs queued by other worker processes are picked up by polling the store.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in ("done", "failed") or remaining <= 0:
+                return job
+            event = self._finished.get(job_id)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(JOB_POLL_INTERVAL, remaining))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, request = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.store.update, job_id, "running")
+                result = await self.handler(request)
+                await asyncio.to_thread(self.store.update, job_id, "done", result)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self.store.update, job_id, "failed", None, "Server shutting down")
+                raise
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                await asyncio.to_thread(self.store.update, job_id, "failed", None, detail)
+            finally:
+                event = self._finished.pop(job_id, None)
+                if event is not None:
+                    event.set()
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "depth": self.depth,
+        }
@@ -0,0 +1,102 @@
+import math
+import os
+
+# Length-aware generation settings
+DOCUMENT_TOKENS_PER_WORD = float(os.getenv("DOCUMENT_TOKENS_PER_WORD", 1.6))
+DOCUMENT_TOKEN_SLACK = int(os.getenv("DOCUMENT_TOKEN_SLACK", 100))
+DOCUMENT_MAX_TOKENS_CAP = int(os.getenv("DOCUMENT_MAX_TOKENS_CAP", 16000))
+CHARS_PER_TOKEN = 4
+
+length_stats = {
+    "documents": 0,
+    "early_stops": 0,
+    "budgeted_tokens": 0,
+    "generated_tokens": 0,
+    "tokens_saved": 0,
+}
+
+
+def max_tokens_for_words(max_words: int) -> int:
+    """
+    Sizes the completion budget from the requested length, HTML markup included.
+    """
+    return min(math.ceil(max_words * DOCUMENT_TOKENS_PER_WORD) + DOCUMENT_TOKEN_SLACK, DOCUMENT_MAX_TOKENS_CAP)
+
+
+class WordCounter:
+    """
+    Incremental word count over text fed in arbitrary pieces.
+    """
+
+    def __init__(self):
+        self.words = 0
+        self._in_word = False
+
+    def feed(self, text: str) -> None:
+        for char in text:
+            if char.isspace() or char == "\xa0":
+                self._in_word = False
+            elif not self._in_word:
+                self._in_word = True
+                self.words += 1
+
+    def boundary(self) -> None:
+        self._in_word = False
+
+
+async def stop_at_word_count(tokens, min_words: int, max_words: int, max_tokens: int = 0):
+    """
+    Re-yields streamed HTML while counting visible words, and ends the stream cleanly
+    once the target band is reached: before a new <h2> section once past the middle of
+    the band, or after a closing </p> once past `max_words`. Partial tags are held back
+    so the output never ends mid-tag.
+    """
+    target = (min_words + max_words) // 2
+    counter = WordCounter()
+    pending = ""
+    generated_chars = 0
+    stopped = False
+
+    try:
+        async for token in tokens:
+            generated_chars += len(token)
+            pending += token
+            while pending and not stopped:
+                start = pending.find("<")
+                if start == -1:
+                    counter.feed(pending)
+                    yield pending
+                    pending = ""
+                elif start > 0:
+                    counter.feed(pending[:start])
+                    yield pending[:start]
+                    pending = pending[start:]
+                else:
+                    end = pending.find(">")
+                    if end == -1:
+                        break
+                    tag, pending = pending[:end + 1], pending[end + 1:]
+                    lowered = tag.lower()
+                    if lowered.startswith("<h2") and counter.words >= target:
+                        stopped = True
+                        break
+                    counter.boundary()
+                    yield tag
+                    if lowered == "</p>" and counter.words >= max_words:
+                        stopped = True
+            if stopped:
+                break
+
+        if pending and not stopped:
+            yield pending
+    finally:
+        # Close upstream promptly so the connection and scheduler slot are released
+        await tokens.aclose()
+        generated_tokens = generated_chars // CHARS_PER_TOKEN
+        length_stats["documents"] += 1
+        length_stats["budgeted_tokens"] += max_tokens
+        length_stats["generated_tokens"] += generated_tokens
+        if stopped:
+            length_stats["early_stops"] += 1
+            # Upper bound: the budget the model was still allowed to spend
+            length_stats["tokens_saved"] += max(max_tokens - generated_tokens, 0)
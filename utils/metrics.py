@@ -0,0 +1,155 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+SIZE_BUCKETS = (1e3, 5e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served", multiprocess_mode="livesum")
+STAGE_LATENCY = Histogram(
+    "generation_stage_duration_seconds", "Time spent per generation stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_TTFT = Histogram(
+    "upstream_time_to_first_token_seconds", "Upstream time to first streamed token", ["model"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_TOKENS = Counter("upstream_tokens_total", "Tokens reported by upstream usage", ["model", "type"])
+RENDER_LATENCY = Histogram(
+    "artifact_render_duration_seconds", "PDF/DOCX render time", ["format"], buckets=LATENCY_BUCKETS
+)
+ARTIFACT_SIZE = Histogram("artifact_size_bytes", "Size of generated artifacts", ["format"], buckets=SIZE_BUCKETS)
+SANDBOX_RUN_LATENCY = Histogram(
+    "sandbox_run_duration_seconds", "Sandboxed code run time, including queueing for a worker", ["language"], buckets=LATENCY_BUCKETS
+)
+CODE_VALIDATIONS = Counter(
+    "code_validation_total", "First-pass syntax/format validation of generated code", ["language", "result"]
+)
+CODE_REPAIRS = Counter("code_repair_total", "Targeted repair requests by outcome", ["language", "outcome"])
+REPAIR_LATENCY = Histogram(
+    "code_repair_duration_seconds", "Repair request plus re-check time", ["language"], buckets=LATENCY_BUCKETS
+)
+ROUTE_DECISIONS = Counter("model_route_decisions_total", "Model routing decisions", ["endpoint", "model", "reason"])
+ROUTE_FALLBACKS = Counter(
+    "model_route_fallbacks_total", "Calls retried on the fallback model", ["endpoint", "from_model", "to_model", "cause"]
+)
+SANDBOX_RUNS = Counter("sandbox_runs_total", "Sandboxed code runs by outcome", ["language", "reason"])
+
+# Per-worker prompt tokens and the share served from the provider's prefix cache, by model
+prompt_cache_stats = {}
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a block as one generation stage (prompt_build, upstream, render, file_io).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+
+def timed(name: str):
+    """
+    Decorator form of `stage` for synchronous functions.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def cached_tokens(usage) -> int:
+    """
+    Prompt tokens the provider served from its prompt-prefix cache.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def record_usage(model: str, usage) -> None:
+    if usage is None:
+        return
+    UPSTREAM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    UPSTREAM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+    UPSTREAM_TOKENS.labels(model, "cached").inc(cached_tokens(usage))
+    stats = prompt_cache_stats.setdefault(model, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0})
+    stats["requests"] += 1
+    stats["prompt_tokens"] += usage.prompt_tokens or 0
+    stats["cached_tokens"] += cached_tokens(usage)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency and in-flight requests.
+    Routes are labelled by their path template to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status["code"])
+            ).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> tuple:
+    """
+    Returns (body, content type) for the /metrics endpoint. With PROMETHEUS_MULTIPROC_DIR
+    set, samples from every uvicorn worker are aggregated.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """
+    Drops this worker's live gauge samples on shutdown in multiprocess mode.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,40 +1,44 @@
-def create_code_prompt(language: str, question: str) -> str:
+from utils.metrics import timed
+
+# Common programming language spelling variations
+LANGUAGE_MAP = {
+    "python": "Python",
+    "javascript": "JavaScript", "js": "JavaScript", "java script": "JavaScript",
+    "typescript": "TypeScript", "ts": "TypeScript", "type script": "TypeScript",
+    "csharp": "C#", "c#": "C#", "c sharp": "C#",
+    "cplusplus": "C++", "c++": "C++",
+    "golang": "Go",
+    "shell": "Bash",
+    "ruby": "Ruby",
+    "php": "PHP",
+    "rust": "Rust",
+    "kotlin": "Kotlin",
+    "scala": "Scala",
+    "swift": "Swift",
+    "objective c": "Objective-C", "objectivec": "Objective-C",
+    "sql": "SQL"
+}
+
+
+def normalize_language(language: str) -> str:
     """
-    Generates a structured HTML response with a description, code block, and conclusion.
-    Handles potential language spelling variations.
+    Maps common spelling variations of a language name to its canonical form.
     """
-    
-    # Common programming language spelling variations
-    language_map = {
-        "python": "Python",
-        "javascript": "JavaScript", "js": "JavaScript", "java script": "JavaScript",
-        "typescript": "TypeScript", "ts": "TypeScript", "type script": "TypeScript",
-        "csharp": "C#", "c#": "C#", "c sharp": "C#",
-        "cplusplus": "C++", "c++": "C++",
-        "golang": "Go",
-        "shell": "Bash",
-        "ruby": "Ruby",
-        "php": "PHP",
-        "rust": "Rust",
-        "kotlin": "Kotlin",
-        "scala": "Scala",
-        "swift": "Swift",
-        "objective c": "Objective-C", "objectivec": "Objective-C",
-        "sql": "SQL"
-    }
-    
-    # Normalize language name if it matches a known variation
     normalized_language = language.lower().strip()
-    if normalized_language in language_map:
-        language = language_map[normalized_language]
-    
-    # Handle vague inputs
-    if len(question.strip()) < 10:
-        question = f"Create a practical {language} example."
+    return LANGUAGE_MAP.get(normalized_language, language)
 
-    prompt = (
+
+def code_system_prompt(language: str) -> str:
+    """
+    Static instructions for code generation in `language`. Nothing request-specific
+    goes here, so the text is byte-identical for every request in that language and
+    the provider can serve it from its prompt-prefix cache.
+    """
+    language = normalize_language(language)
+
+    return (
         f"You are a highly skilled {language} developer. You know everything about {language}. Your task is to generate a structured response in {language} "
-        f"for the given request: \"{question}\". Your response **must** strictly follow this structure: "
+        f"for the request given in the user's message. Your response **must** strictly follow this structure: "
         f"\n\n1. **Description:** Provide a short explanation of what the code does."
         f"\n2. **Code Block:** Format the code inside `<pre><code class='{language.lower()}'>` tags. ALL code must be placed inside these tags."
         f"\n3. **Conclusion:** Summarize the output or how to use the code."
@@ -48,70 +52,180 @@ def create_code_prompt(language: str, question: str) -> str:
         f"\n- Use <h2>Description</h2>, <h2>Code Block</h2>, and <h2>Conclusion</h2> as section headings."
     )
 
-    return prompt
 
+def code_compact_system_prompt(language: str) -> str:
+    """
+    Compact counterpart of `code_system_prompt`: the same sections as plain-text JSON
+    fields, without the HTML markup and `&nbsp;` indentation that inflate completion tokens.
+    """
+    language = normalize_language(language)
+
+    return (
+        f"You are a highly skilled {language} developer. You know everything about {language}. Your task is to generate a response in {language} "
+        f"for the request given in the user's message, as a JSON object with these fields:"
+        f"\n\n1. **description:** A short explanation of what the code does."
+        f"\n2. **code:** The complete {language} source as plain text, with real newlines and spaces for indentation. ALL code goes in this field."
+        f"\n3. **conclusion:** A summary of the output or how to use the code."
+        f"\n\nUse plain text in every field: no HTML tags, entities or Markdown."
+    )
+
+
+@timed("prompt_build")
+def create_code_prompt(language: str, question: str) -> str:
+    """
+    Creates the user message for code generation; the structure it must follow is
+    in `code_system_prompt`. Handles potential language spelling variations.
+    """
+    
+    language = normalize_language(language)
+
+    # Handle vague inputs
+    if len(question.strip()) < 10:
+        question = f"Create a practical {language} example."
+
+    return f"Request: \"{question}\""
+
+def document_word_band(word_count: int) -> tuple:
+    """
+    Returns the (min_words, max_words) range the document prompt asks the model for.
+    """
+    word_count = word_count + 200 
+    # Ensure a reasonable word count limit
+    if word_count < 50:
+        word_count = 50  # Set a reasonable lower limit
+
+    return word_count - 50, word_count + 50
+
+
+def document_system_prompt() -> str:
+    """
+    Static instructions for single-pass documents, shared byte for byte by every
+    request so it stays in the provider's prompt-prefix cache.
+    """
+    return (
+        "You are an expert document generation assistant. Your task is to create a well-structured, high-quality, and formatted HTML document "
+        "on the topic given in the user's message, with a strict word count inside the range given there."
+        "\n\nSTRICT REQUIREMENTS FOR YOUR RESPONSE:"
+        "\n1. The document MUST contain a number of words inside the requested range."
+        "\n2. COUNT WORDS CAREFULLY. Ensure that the total word count falls within this range."
+        "\n3. If the word count is too low, expand ideas, add explanations, and provide additional details."
+        "\n4. If the word count is too high, remove redundant sentences and be more concise."
+        "\n5. Structure the document properly to naturally fit the required word count."
+        "\n6. The output must be a fully structured and well-formatted HTML document."
+        "\n7. The document must include:"
+        "\n   - A clear and engaging title inside <h1> tags."
+        "\n   - An introductory paragraph inside <p> tags."
+        "\n   - Well-structured sections with subheadings (<h2>, <h3> as needed)."
+        "\n   - Informative and detailed content ensuring natural flow and readability."
+        "\n   - A conclusion summarizing the key points."
+        "\n8. The word count must be evenly distributed across all sections for readability."
+        "\n9. BEFORE submitting, recount the words and adjust if necessary to ensure compliance with the requested range."
+        "\n10. The response must be a SINGLE CONTINUOUS HTML string with NO newlines (\\n) or tab characters (\\t)."
+        "\n11. Instead of newlines, use <br> for visual separation."
+        "\n12. Instead of tabs, use &nbsp; for indentation."
+        "\n13. DO NOT USE MARKDOWN - ONLY HTML."
+        "\n14. VERIFY AGAIN before finalizing: The final document MUST stay inside the requested word range."
+    )
+
+
+def document_compact_system_prompt() -> str:
+    """
+    Compact counterpart of `document_system_prompt`: the document as JSON sections
+    of plain-text paragraphs, rendered to HTML by the server.
+    """
+    return (
+        "You are an expert document generation assistant. Your task is to create a well-structured, high-quality document "
+        "on the topic given in the user's message, with a strict word count inside the range given there."
+        "\n\nSTRICT REQUIREMENTS FOR YOUR RESPONSE:"
+        "\n1. The document MUST contain a number of words inside the requested range."
+        "\n2. COUNT WORDS CAREFULLY. If the word count is too low, expand ideas; if it is too high, be more concise."
+        "\n3. Return a JSON object with a clear and engaging `title` and a list of `sections`, each with a `heading` and its `paragraphs`."
+        "\n4. Start with an introduction section, continue with well-structured body sections and end with a conclusion summarizing the key points."
+        "\n5. The word count must be evenly distributed across all sections for readability."
+        "\n6. Paragraphs are plain text: no HTML tags, entities or Markdown."
+    )
+
+
+@timed("prompt_build")
 def create_document_prompt(document_topic: str, word_count: int) -> str:
     """
-    Creates a prompt that enforces an approximate word count range (±50 words) 
-    while generating a complete HTML document.
+    Creates the user message for a document with an approximate word count range
+    (±50 words); the formatting rules are in `document_system_prompt`.
     
     Args:
         document_topic (str): The subject of the document.
         word_count (int): The target number of words required in the document.
         
     Returns:
-        str: A strict prompt enforcing structured HTML output within the word count range.
+        str: The topic and word count range.
     """
     # Handle vague topics
     if len(document_topic.strip()) < 5:
         document_topic = "Comprehensive Informational Document"
 
-    word_count = word_count + 200 
-    # Ensure a reasonable word count limit
-    if word_count < 50:
-        word_count = 50  # Set a reasonable lower limit
+    min_words, max_words = document_word_band(word_count)
 
-    min_words = word_count - 50
-    max_words = word_count + 50
+    return (
+        f"Topic: \"{document_topic}\""
+        f"\nWord count: between {min_words} and {max_words} words."
+    )
 
-    prompt = (
-        f"You are an expert document generation assistant. Your task is to create a well-structured, high-quality, and formatted HTML document "
-        f"on the topic: \"{document_topic}\" with a strict word count between {min_words} and {max_words} words."
-        f"\n\nSTRICT REQUIREMENTS FOR YOUR RESPONSE:"
-        f"\n1. The document MUST contain between {min_words} and {max_words} words."
-        f"\n2. COUNT WORDS CAREFULLY. Ensure that the total word count falls within this range."
-        f"\n3. If the word count is too low, expand ideas, add explanations, and provide additional details."
-        f"\n4. If the word count is too high, remove redundant sentences and be more concise."
-        f"\n5. Structure the document properly to naturally fit the required word count."
-        f"\n6. The output must be a fully structured and well-formatted HTML document."
-        f"\n7. The document must include:"
-        f"\n   - A clear and engaging title inside <h1> tags."
-        f"\n   - An introductory paragraph inside <p> tags."
-        f"\n   - Well-structured sections with subheadings (<h2>, <h3> as needed)."
-        f"\n   - Informative and detailed content ensuring natural flow and readability."
-        f"\n   - A conclusion summarizing the key points."
-        f"\n8. The word count must be evenly distributed across all sections for readability."
-        f"\n9. BEFORE submitting, recount the words and adjust if necessary to ensure compliance with the {min_words}-{max_words} range."
-        f"\n10. The response must be a SINGLE CONTINUOUS HTML string with NO newlines (\\n) or tab characters (\\t)."
-        f"\n11. Instead of newlines, use <br> for visual separation."
-        f"\n12. Instead of tabs, use &nbsp; for indentation."
-        f"\n13. DO NOT USE MARKDOWN - ONLY HTML."
-        f"\n14. VERIFY AGAIN before finalizing: The final document MUST HAVE between {min_words} and {max_words} words."
+def story_system_prompt() -> str:
+    """
+    Static storytelling instructions, shared byte for byte by every story request so
+    they stay in the provider's prompt-prefix cache.
+    """
+    return (
+        "You are a skilled storyteller. Generate a fully detailed, well-structured, and engaging story with the title "
+        "and in the story type given in the user's message. Follow these strict requirements to ensure a complete and properly formatted response: "
+        "1. The response must be a **fully completed** story with a beginning, middle, and end, ensuring it is never cut off. "
+        "2. The output must be a **single, valid HTML string** without any escape sequences, newlines, tabs, or incomplete sentences. "
+        "3. The title must be enclosed within <h1> tags, and the story content must be wrapped in <p> tags. Use <br> for logical line breaks. "
+        "4. Ensure proper HTML structure that renders perfectly in a web browser. "
+        "6. NO Markdown, unnecessary whitespace, or special characters should be present—only valid HTML. "
+        "7. The story must strictly follow the conventions of the chosen genre: "
+        "   - If 'Children's Story' is selected, make it engaging, imaginative, and suitable for young readers. "
+        "   - If 'Horror Story' is selected, create suspenseful, eerie, and immersive storytelling. "
+        "   - If 'Biography' is selected, provide an accurate, chronological, and inspiring life story with real events. "
+        "   - If 'Historical' is selected, craft a compelling narrative that accurately represents the past. "
+        "   - If 'Sci-Fi' is selected, incorporate futuristic or speculative elements while ensuring a logical storyline. "
+        "8. The AI **must not stop mid-sentence** or generate an incomplete response—ensure the full story is outputted. "
+        "9. Maintain a natural storytelling flow while avoiding repetition or unnecessary filler content. "
+    )
+
+
+def story_compact_system_prompt() -> str:
+    """
+    Compact counterpart of `story_system_prompt`: the story as a JSON title and
+    plain-text paragraphs, rendered to HTML by the server.
+    """
+    return (
+        "You are a skilled storyteller. Generate a fully detailed, well-structured, and engaging story with the title "
+        "and in the story type given in the user's message. Follow these strict requirements: "
+        "1. The response must be a **fully completed** story with a beginning, middle, and end, ensuring it is never cut off. "
+        "2. Return a JSON object with the story `title` and its `paragraphs`, in plain text without HTML tags, entities or Markdown. "
+        "3. The story must strictly follow the conventions of the chosen genre: "
+        "   - If 'Children's Story' is selected, make it engaging, imaginative, and suitable for young readers. "
+        "   - If 'Horror Story' is selected, create suspenseful, eerie, and immersive storytelling. "
+        "   - If 'Biography' is selected, provide an accurate, chronological, and inspiring life story with real events. "
+        "   - If 'Historical' is selected, craft a compelling narrative that accurately represents the past. "
+        "   - If 'Sci-Fi' is selected, incorporate futuristic or speculative elements while ensuring a logical storyline. "
+        "4. Maintain a natural storytelling flow while avoiding repetition or unnecessary filler content. "
     )
 
-    return prompt
 
+@timed("prompt_build")
 def create_story_prompt(title: str, story_type: str) -> str:
     """
-    Generates a prompt for AI to create a structured, complete story in strict HTML format
-    without newlines, tabs, Markdown elements, or incomplete outputs.
+    Creates the user message for a story; the format and genre rules are in
+    `story_system_prompt`.
 
     Args:
         title (str): The title of the story.
         story_type (str): The genre of the story (e.g., "Children's Story", "Horror Story", "Biography", "Sci-Fi").
 
     Returns:
-        str: A structured prompt guiding AI to generate a compelling, full-length story in clean HTML format.
+        str: The title and story type.
     """
 
     # Handle vague inputs
@@ -120,22 +234,149 @@ def create_story_prompt(title: str, story_type: str) -> str:
     if len(story_type.strip()) < 3:
         story_type = "General Fiction"
 
+    return (
+        f"Title: '{title}'"
+        f"\nStory type: '{story_type}'"
+    )
+
+
+def outline_system_prompt() -> str:
+    """
+    Static outline instructions, shared byte for byte by every long document.
+    """
+    return (
+        "You are an expert document planner. Create an outline for a well-structured document on the topic given in the user's message."
+        "\n\nReturn ONLY a JSON object with this exact shape:"
+        "\n{\"title\": \"<document title>\", \"sections\": [{\"heading\": \"<section heading>\", \"points\": [\"<key point>\", ...]}]}"
+        "\n\nREQUIREMENTS:"
+        "\n1. Provide exactly the requested number of body sections in a logical reading order."
+        "\n2. Do NOT include an introduction or a conclusion section; they are written separately."
+        "\n3. Give each section 2-4 short key points so sections do not overlap."
+        "\n4. Headings must be plain text without numbering or HTML."
+    )
+
+
+@timed("prompt_build")
+def create_outline_prompt(document_topic: str, section_count: int) -> str:
+    """
+    Creates the user message asking for a JSON outline of a long document, used to
+    generate its sections in parallel; the expected shape is in `outline_system_prompt`.
+
+    Args:
+        document_topic (str): The subject of the document.
+        section_count (int): The number of body sections (excluding introduction and conclusion).
+
+    Returns:
+        str: The topic and section count.
+    """
+    if len(document_topic.strip()) < 5:
+        document_topic = "Comprehensive Informational Document"
+
+    return (
+        f"Topic: \"{document_topic}\""
+        f"\nBody sections: {section_count}"
+    )
+
+
+def section_system_prompt() -> str:
+    """
+    Static instructions for one part of a long document, shared byte for byte by
+    every section request.
+    """
+    return (
+        "You are an expert document writer. The user's message names the document, its outline, "
+        "the one part to write, the points it covers and its word range."
+        "\n\nSTRICT REQUIREMENTS FOR YOUR RESPONSE:"
+        "\n1. Write ONLY the requested part, inside the requested word range."
+        "\n2. Output only the body of this part as HTML: <p> paragraphs and <h3> subheadings if needed."
+        "\n3. Do NOT include the part heading itself, an <h1>, or an <h2>; they are added separately."
+        "\n4. Do not repeat content that belongs to other sections."
+        "\n5. The response must be a SINGLE CONTINUOUS HTML string with NO newlines (\\n) or tab characters (\\t)."
+        "\n6. DO NOT USE MARKDOWN - ONLY HTML."
+    )
+
+
+@timed("prompt_build")
+def create_section_prompt(document_topic: str, title: str, outline: list, heading: str, points: list, word_count: int) -> str:
+    """
+    Creates the user message for one part of a long document. The outline is included
+    so every section stays consistent with the others without seeing their text; it
+    comes first, so the sections of one document also share that part of the prefix.
+
+    Args:
+        document_topic (str): The subject of the document.
+        title (str): The document title from the outline.
+        outline (list): All section headings, in order.
+        heading (str): The part to write ("Introduction", "Conclusion" or a section heading).
+        points (list): Key points this part must cover.
+        word_count (int): Word budget for this part.
+
+    Returns:
+        str: The document, its outline and the part to write.
+    """
+    min_words = max(word_count - 30, 30)
+    max_words = word_count + 30
+    covered = "; ".join(points) if points else "as appropriate for this part"
+
+    return (
+        f"Document: \"{title}\" about \"{document_topic}\""
+        f"\nSections: {' | '.join(outline)}"
+        f"\n\nPart to write: \"{heading}\""
+        f"\nCovering: {covered}"
+        f"\nWord count: between {min_words} and {max_words} words."
+    )
+
+
+@timed("prompt_build")
+def create_summary_prompt(summary: str, turns: list) -> str:
+    """
+    Creates a prompt that folds older chat turns into the running conversation summary.
+
+    Args:
+        summary (str): The current summary ("" for the first one).
+        turns (list): Turns leaving the context window, as dicts with "role" and "content".
+
+    Returns:
+        str: A prompt requesting the updated summary as plain text.
+    """
+    transcript = "\n".join(f"{turn['role'].upper()}: {turn['content']}" for turn in turns)
+
+    prompt = (
+        f"You maintain a running summary of a conversation between a user and an assistant."
+        f"\n\nCURRENT SUMMARY:\n{summary or '(none yet)'}"
+        f"\n\nNEW TURNS TO ADD:\n{transcript}"
+        f"\n\nREQUIREMENTS:"
+        f"\n1. Return the updated summary only, as plain text without HTML or Markdown."
+        f"\n2. Keep facts, names, numbers, decisions and open questions the assistant may need later."
+        f"\n3. Drop greetings, filler and anything superseded by later turns."
+        f"\n4. Stay under 200 words."
+    )
+
+    return prompt
+
+
+@timed("prompt_build")
+def create_repair_prompt(language: str, code: str, error: str) -> str:
+    """
+    Creates a prompt asking for a targeted fix of generated code that failed its syntax check.
+
+    Args:
+        language (str): The programming language of the code.
+        code (str): The code extracted from the generated response.
+        error (str): The parser or compiler error for that code.
+
+    Returns:
+        str: A prompt requesting the corrected code only.
+    """
+    language = normalize_language(language)
+
     prompt = (
-        f"You are a skilled storyteller. Generate a fully detailed, well-structured, and engaging story titled '{title}' "
-        f"in the format of a '{story_type}' story. Follow these strict requirements to ensure a complete and properly formatted response: "
-        f"1. The response must be a **fully completed** story with a beginning, middle, and end, ensuring it is never cut off. "
-        f"2. The output must be a **single, valid HTML string** without any escape sequences, newlines, tabs, or incomplete sentences. "
-        f"3. The title must be enclosed within <h1> tags, and the story content must be wrapped in <p> tags. Use <br> for logical line breaks. "
-        f"4. Ensure proper HTML structure that renders perfectly in a web browser. "
-        f"6. NO Markdown, unnecessary whitespace, or special characters should be present—only valid HTML. "
-        f"7. The story must strictly follow the conventions of the chosen genre: "
-        f"   - If 'Children's Story' is selected, make it engaging, imaginative, and suitable for young readers. "
-        f"   - If 'Horror Story' is selected, create suspenseful, eerie, and immersive storytelling. "
-        f"   - If 'Biography' is selected, provide an accurate, chronological, and inspiring life story with real events. "
-        f"   - If 'Historical' is selected, craft a compelling narrative that accurately represents the past. "
-        f"   - If 'Sci-Fi' is selected, incorporate futuristic or speculative elements while ensuring a logical storyline. "
-        f"8. The AI **must not stop mid-sentence** or generate an incomplete response—ensure the full story is outputted. "
-        f"9. Maintain a natural storytelling flow while avoiding repetition or unnecessary filler content. "
+        f"The following {language} code fails to parse."
+        f"\n\nCODE:\n{code}"
+        f"\n\nERROR:\n{error}"
+        f"\n\nREQUIREMENTS:"
+        f"\n1. Fix the error with the smallest change; keep everything else exactly as it is."
+        f"\n2. Return the complete corrected code only, as plain text without HTML, Markdown or explanations."
     )
 
     return prompt
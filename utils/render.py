@@ -0,0 +1,214 @@
+import asyncio
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from xml.sax.saxutils import escape
+
+# Rendering settings
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 2))
+
+BLOCK_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote", "div", "title"}
+INLINE_TAGS = {"b": "b", "strong": "b", "i": "i", "em": "i", "u": "u", "code": "code"}
+
+_executor = None
+
+
+class _BlockParser(HTMLParser):
+    """
+    Flattens generated HTML into (kind, runs) blocks, where runs are (text, styles) pairs.
+    Unknown tags are ignored and bare text becomes paragraphs.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._kind = None
+        self._runs = []
+        self._styles = []
+        self._in_pre = 0
+
+    def _flush(self):
+        if any(text.strip() for text, _ in self._runs):
+            self.blocks.append((self._kind or "p", self._runs))
+        self._runs = []
+        self._kind = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._flush()
+            self._kind = tag
+            if tag == "pre":
+                self._in_pre += 1
+        elif tag == "br":
+            self._runs.append(("\n", tuple(self._styles)))
+        elif tag in INLINE_TAGS:
+            self._styles.append(INLINE_TAGS[tag])
+
+    def handle_endtag(self, tag):
+        if tag in BLOCK_TAGS:
+            if tag == "pre":
+                self._in_pre = max(0, self._in_pre - 1)
+            self._flush()
+        elif tag in INLINE_TAGS and INLINE_TAGS[tag] in self._styles:
+            self._styles.remove(INLINE_TAGS[tag])
+
+    def handle_data(self, data):
+        if not self._in_pre:
+            data = re.sub(r"[ \t\r\f\v]+", " ", data)
+            if self._kind is None and "\n\n" in data:
+                # Plain-text documents: blank lines separate paragraphs
+                for i, part in enumerate(re.split(r"\n\s*\n", data)):
+                    if i:
+                        self._flush()
+                    self._runs.append((part.replace("\n", " "), tuple(self._styles)))
+                return
+            data = data.replace("\n", " ")
+        self._runs.append((data, tuple(self._styles)))
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def html_to_blocks(text: str) -> list:
+    parser = _BlockParser()
+    parser.feed(text)
+    parser.close()
+    return parser.blocks
+
+
+def _pdf_markup(runs: list, preformatted: bool = False) -> str:
+    parts = []
+    for text, styles in runs:
+        text = escape(text.replace("\xa0", " ") if not preformatted else text)
+        if preformatted:
+            text = text.replace(" ", "&nbsp;").replace("\xa0", "&nbsp;")
+        text = text.replace("\n", "<br/>")
+        for style in styles:
+            text = f'<font face="Courier">{text}</font>' if style == "code" else f"<{style}>{text}</{style}>"
+        parts.append(text)
+    return "".join(parts).strip()
+
+
+def save_text_to_pdf(text: str, pdf_path: str) -> str:
+    """
+    Renders generated HTML to a wrapped, paginated PDF.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    styles = getSampleStyleSheet()
+    style_map = {
+        "h1": styles["Title"], "title": styles["Title"], "h2": styles["Heading2"],
+        "h3": styles["Heading3"], "h4": styles["Heading4"], "h5": styles["Heading5"],
+        "h6": styles["Heading6"], "pre": styles["Code"], "li": styles["Bullet"],
+    }
+
+    story = []
+    for kind, runs in html_to_blocks(text):
+        markup = _pdf_markup(runs, preformatted=kind == "pre")
+        if not markup:
+            continue
+        if kind == "li":
+            markup = f"• {markup}"
+        story.append(Paragraph(markup, style_map.get(kind, styles["BodyText"])))
+        story.append(Spacer(1, 4))
+
+    if not story:
+        story.append(Paragraph("Generated Document", styles["Title"]))
+
+    SimpleDocTemplate(pdf_path, pagesize=A4, title="Generated Document").build(story)
+    return pdf_path
+
+
+def save_text_to_docx(text: str, doc_path: str) -> str:
+    """
+    Renders generated HTML to a DOCX with headings, paragraphs, lists and code blocks.
+    """
+    from docx import Document
+    from docx.shared import Pt
+
+    doc = Document()
+    for kind, runs in html_to_blocks(text):
+        if kind in ("h1", "title"):
+            paragraph = doc.add_heading(level=0)
+        elif kind[0] == "h" and kind[1:].isdigit():
+            paragraph = doc.add_heading(level=int(kind[1:]) - 1)
+        elif kind == "li":
+            paragraph = doc.add_paragraph(style="List Bullet")
+        else:
+            paragraph = doc.add_paragraph()
+
+        for index, (run_text, run_styles) in enumerate(runs):
+            if kind != "pre":
+                run_text = run_text.replace("\xa0", " ")
+                if index == 0:
+                    run_text = run_text.lstrip()
+            run = paragraph.add_run(run_text)
+            run.bold = "b" in run_styles or None
+            run.italic = "i" in run_styles or None
+            run.underline = "u" in run_styles or None
+            if kind == "pre" or "code" in run_styles:
+                run.font.name = "Courier New"
+                run.font.size = Pt(9)
+
+    doc.save(doc_path)
+    return doc_path
+
+
+RENDERERS = {".pdf": save_text_to_pdf, ".docx": save_text_to_docx}
+
+
+def save_source(text: str, source_path: str) -> str:
+    """
+    Atomically stores the generated HTML that artifacts are rendered from on demand.
+    """
+    directory = os.path.dirname(source_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{source_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, source_path)
+    return source_path
+
+
+def render_file(source_path: str, target_path: str) -> str:
+    """
+    Renders the HTML source to `target_path` atomically. Runs inside the process pool.
+    """
+    with open(source_path, encoding="utf-8") as f:
+        text = f.read()
+    renderer = RENDERERS[os.path.splitext(target_path)[1]]
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    try:
+        renderer(text, tmp_path)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return target_path
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def render_in_pool(source_path: str, target_path: str) -> str:
+    """
+    Renders an artifact in the process pool so ReportLab and python-docx stay off the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), render_file, source_path, target_path)
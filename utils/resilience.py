@@ -0,0 +1,236 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+
+from fastapi import HTTPException
+
+# Resilience settings for upstream calls
+UPSTREAM_ATTEMPT_TIMEOUT = float(os.getenv("UPSTREAM_ATTEMPT_TIMEOUT", 45))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", 2))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", 0.5))
+UPSTREAM_BACKOFF_CAP = float(os.getenv("UPSTREAM_BACKOFF_CAP", 8))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 0.5))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+
+
+class CircuitOpen(HTTPException):
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"Upstream for {model} is degraded, failing fast",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Timeouts, connection failures, rate limits and 5xx responses are worth another attempt.
+    """
+    import openai
+
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures and fails fast for
+    `reset_timeout` seconds; then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self, model: str) -> None:
+        if self.state == "open":
+            remaining = self.opened_at + self.reset_timeout - self.clock()
+            if remaining > 0:
+                raise CircuitOpen(model, max(1, int(remaining + 0.999)))
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                raise CircuitOpen(model, 1)
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = self.clock()
+
+    def release(self) -> None:
+        # A non-retryable error says nothing about upstream health
+        self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies per model.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, quantile: float):
+        samples = self._samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+    def count(self, model: str) -> int:
+        return len(self._samples.get(model, ()))
+
+
+class Resilience:
+    """
+    Wraps upstream calls with per-attempt timeouts, jittered exponential retries on
+    retryable errors, optional hedging after the model's observed p95 latency, and a
+    per-model circuit breaker. `fn` is a zero-argument coroutine function making one attempt.
+    """
+
+    def __init__(
+        self,
+        attempt_timeout: float = UPSTREAM_ATTEMPT_TIMEOUT,
+        max_retries: int = UPSTREAM_MAX_RETRIES,
+        backoff_base: float = UPSTREAM_BACKOFF_BASE,
+        backoff_cap: float = UPSTREAM_BACKOFF_CAP,
+        hedge: bool = HEDGE_ENABLED,
+        breaker_factory=CircuitBreaker,
+        sleep=asyncio.sleep,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.breaker_factory = breaker_factory
+        self.sleep = sleep
+        self.latency = LatencyTracker()
+        self._breakers = {}
+        self.stats = {"attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "fast_failures": 0}
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = self.breaker_factory()
+        return self._breakers[model]
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        hinted = _retry_after(error)
+        return max(delay, min(hinted, self.backoff_cap)) if hinted is not None else delay
+
+    def hedge_delay(self, model: str):
+        if not self.hedge or self.latency.count(model) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.latency.percentile(model, 0.95), HEDGE_MIN_DELAY)
+
+    async def _attempt(self, fn):
+        self.stats["attempts"] += 1
+        try:
+            return await asyncio.wait_for(fn(), self.attempt_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+
+    async def _hedged(self, model: str, fn, hedge: bool):
+        first = asyncio.ensure_future(self._attempt(fn))
+        delay = self.hedge_delay(model) if hedge else None
+        tasks = {first}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.stats["hedges"] += 1
+                    tasks.add(asyncio.ensure_future(self._attempt(fn)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if not first.done():
+                first.cancel()
+
+    async def call(self, model: str, fn, hedge: bool = True, max_retries: int = None):
+        breaker = self.breaker(model)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                breaker.before_call(model)
+            except CircuitOpen:
+                self.stats["fast_failures"] += 1
+                raise
+
+            start = time.monotonic()
+            try:
+                result = await self._hedged(model, fn, hedge)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt == max_retries:
+                    raise
+                self.stats["retries"] += 1
+                await self.sleep(self.backoff(attempt, e))
+                continue
+
+            breaker.record_success()
+            self.latency.record(model, time.monotonic() - start)
+            return result
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "breakers": {model: breaker.state for model, breaker in self._breakers.items()},
+            "p95": {model: self.latency.percentile(model, 0.95) for model in self.latency._samples},
+        }
+
+
+resilience = Resilience()
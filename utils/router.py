@@ -0,0 +1,189 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+
+from utils.history import current_generation
+from utils.metrics import ROUTE_DECISIONS, ROUTE_FALLBACKS
+from utils.resilience import CircuitOpen, is_retryable, resilience
+from utils.scheduler import Overloaded, scheduler
+
+# Routing table: endpoint -> rules tried in order; the first rule whose conditions all hold
+# picks `model`, with `fallback` used when the call fails on timeout or overload.
+# Conditions: min_prompt_chars / max_prompt_chars (the user message), languages,
+# min_words / max_words (requested word count) and max_p95 (seconds of observed upstream
+# latency the model may show before the fallback is preferred).
+# Override per endpoint with MODEL_ROUTES='{"chat": [{"model": "gpt-4o", "fallback": "gpt-4o-mini"}]}'
+DEFAULT_MODEL_ROUTES = {
+    "chat": [
+        {"max_prompt_chars": 300, "model": "gpt-4o-mini", "fallback": "gpt-4o"},
+        {"model": "gpt-4o", "fallback": "gpt-4o-mini", "max_p95": 30},
+    ],
+    "code": [
+        {"min_prompt_chars": 800, "model": "gpt-4o", "fallback": "gpt-4o-mini", "max_p95": 40},
+        {"languages": ["c++", "rust", "haskell", "scala"], "min_prompt_chars": 300, "model": "gpt-4o", "fallback": "gpt-4o-mini"},
+        {"model": "gpt-4o-mini", "fallback": "gpt-4o"},
+    ],
+    "document": [{"model": "gpt-4o-mini", "fallback": "gpt-4o"}],
+    "story": [{"model": "gpt-4o-mini", "fallback": "gpt-4o"}],
+    "default": [{"model": "gpt-4o-mini", "fallback": "gpt-4o"}],
+}
+MODEL_ROUTES = {**DEFAULT_MODEL_ROUTES, **json.loads(os.getenv("MODEL_ROUTES", "{}"))}
+
+# Health inputs: a model failing this share of its calls in the window is routed around
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", 0.5))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", 10))
+ROUTER_WINDOW_SECONDS = float(os.getenv("ROUTER_WINDOW_SECONDS", 60))
+# Share of requests still sent to a model routed around for latency, so its p95 gets refreshed
+ROUTER_PROBE_RATE = float(os.getenv("ROUTER_PROBE_RATE", 0.05))
+# Retries after the first attempt on the routed model when a fallback is available (max_retries);
+# the fallback gets the full retry budget
+ROUTER_PRIMARY_RETRIES = int(os.getenv("ROUTER_PRIMARY_RETRIES", 1))
+
+
+def fallback_cause(error: Exception) -> str:
+    """
+    Returns why a failed call may be retried on another model, or None when it may not.
+    """
+    if isinstance(error, Overloaded):
+        return "overloaded"
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if is_retryable(error):
+        return "upstream_error"
+    return None
+
+
+def note_route(route: dict) -> None:
+    """
+    Adds a routing decision to the generation being served, if any.
+    """
+    generation = current_generation.get()
+    if generation is not None:
+        generation.add_route(route)
+
+
+def current_routes() -> list:
+    """
+    Routing decisions of the generation being served, for the response payload.
+    """
+    generation = current_generation.get()
+    return generation.routing if generation is not None else []
+
+
+class ModelRouter:
+    """
+    Picks a model per request from the routing table, steering away from a model whose
+    breaker is open, whose scheduler is saturated, whose recent error rate is too high or
+    whose observed p95 latency exceeds the rule's `max_p95`.
+    """
+
+    def __init__(self, routes: dict = None, window: float = ROUTER_WINDOW_SECONDS, clock=time.monotonic):
+        self.routes = routes or MODEL_ROUTES
+        self.window = window
+        self.clock = clock
+        self._outcomes = {}
+        self.stats = {"decisions": 0, "rerouted": 0, "probes": 0, "fallbacks": 0}
+
+    def match(self, endpoint: str, prompt_chars: int, language: str = None, word_count: int = None):
+        rules = self.routes.get(endpoint) or self.routes["default"]
+        for index, rule in enumerate(rules):
+            if prompt_chars < rule.get("min_prompt_chars", 0):
+                continue
+            if "max_prompt_chars" in rule and prompt_chars > rule["max_prompt_chars"]:
+                continue
+            if "languages" in rule and (language or "").lower() not in rule["languages"]:
+                continue
+            if "min_words" in rule or "max_words" in rule:
+                if word_count is None or not rule.get("min_words", 0) <= word_count <= rule.get("max_words", word_count):
+                    continue
+            return index, rule
+        # A table without a catch-all rule still routes somewhere
+        return len(rules) - 1, rules[-1]
+
+    def record(self, model: str, ok: bool) -> None:
+        """
+        Records the outcome of one call to `model`: success, or a failure `fallback_cause` covers.
+        """
+        self._outcomes.setdefault(model, deque()).append((self.clock(), ok))
+
+    def _recent(self, model: str) -> deque:
+        outcomes = self._outcomes.get(model, deque())
+        # Old failures expire, so a model routed around gets traffic again once the window passes
+        while outcomes and outcomes[0][0] <= self.clock() - self.window:
+            outcomes.popleft()
+        return outcomes
+
+    def error_rate(self, model: str):
+        outcomes = self._recent(model)
+        if not outcomes:
+            return None
+        return sum(not ok for _, ok in outcomes) / len(outcomes)
+
+    def unhealthy(self, model: str, max_p95: float = None) -> str:
+        """
+        Returns why `model` should be avoided right now, or None.
+        """
+        if resilience.breaker(model).state == "open":
+            return "circuit_open"
+        model_scheduler = scheduler.for_model(model)
+        if model_scheduler.active >= model_scheduler.concurrency and model_scheduler._heap:
+            return "saturated"
+        if len(self._recent(model)) >= ROUTER_MIN_SAMPLES and self.error_rate(model) >= ROUTER_MAX_ERROR_RATE:
+            return "error_rate"
+        if max_p95 is not None and resilience.latency.count(model) >= ROUTER_MIN_SAMPLES:
+            if resilience.latency.percentile(model, 0.95) > max_p95:
+                return "slow"
+        return None
+
+    def select(self, endpoint: str, prompt: str, language: str = None, word_count: int = None) -> dict:
+        """
+        Returns the routing decision for one upstream request: the model to call, the
+        fallback for timeouts and overload, and the rule and reason that chose them.
+        """
+        index, rule = self.match(endpoint, len(prompt), language, word_count)
+        model, fallback, reason = rule["model"], rule.get("fallback"), "rule"
+        if fallback is not None:
+            why = self.unhealthy(model, rule.get("max_p95"))
+            if why == "slow" and random.random() < ROUTER_PROBE_RATE:
+                reason = "probe"
+                self.stats["probes"] += 1
+            elif why is not None and self.unhealthy(fallback) is None:
+                model, fallback, reason = fallback, model, why
+                self.stats["rerouted"] += 1
+        self.stats["decisions"] += 1
+        ROUTE_DECISIONS.labels(endpoint, model, reason).inc()
+        return {"endpoint": endpoint, "rule": index, "model": model, "fallback": fallback, "reason": reason}
+
+    def fell_back(self, route: dict, cause: str) -> str:
+        """
+        Switches `route` to its fallback model after the routed model failed with `cause`.
+        """
+        self.stats["fallbacks"] += 1
+        ROUTE_FALLBACKS.labels(route["endpoint"], route["model"], route["fallback"], cause).inc()
+        route.update(model=route["fallback"], fallback=None, fallback_from=route["model"], fallback_cause=cause)
+        return route["model"]
+
+    def get_stats(self) -> dict:
+        models = sorted({rule["model"] for rules in self.routes.values() for rule in rules}
+                        | {rule["fallback"] for rules in self.routes.values() for rule in rules if rule.get("fallback")})
+        return {
+            **self.stats,
+            "routes": self.routes,
+            "models": {
+                model: {
+                    "error_rate": self.error_rate(model),
+                    "calls": len(self._recent(model)),
+                    "p95": resilience.latency.percentile(model, 0.95),
+                    "unhealthy": self.unhealthy(model),
+                }
+                for model in models
+            },
+        }
+
+
+router = ModelRouter()
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+from fastapi import HTTPException
+
+from utils.metrics import SANDBOX_RUNS, SANDBOX_RUN_LATENCY
+
+# Sandbox settings
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", 2))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", 5))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", 256))
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", 10))
+SANDBOX_MAX_OUTPUT_BYTES = int(os.getenv("SANDBOX_MAX_OUTPUT_BYTES", 1_000_000))
+SANDBOX_MAX_FILE_MB = int(os.getenv("SANDBOX_MAX_FILE_MB", 64))
+SANDBOX_MAX_CODE_BYTES = int(os.getenv("SANDBOX_MAX_CODE_BYTES", 100_000))
+SANDBOX_QUEUE_TIMEOUT = float(os.getenv("SANDBOX_QUEUE_TIMEOUT", 5))
+# Unprivileged user jobs run as when the server runs as root
+SANDBOX_USER = os.getenv("SANDBOX_USER", "nobody")
+# Refuse to run code when the workers could not detach from the network
+SANDBOX_REQUIRE_NO_NETWORK = os.getenv("SANDBOX_REQUIRE_NO_NETWORK", "true").lower() == "true"
+# Refuse to run code when jobs could not be confined to their own directory and the
+# toolchains, or could not drop privileges
+SANDBOX_REQUIRE_CONFINEMENT = os.getenv("SANDBOX_REQUIRE_CONFINEMENT", "true").lower() == "true"
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+LANGUAGE_ALIASES = {
+    "py": "python",
+    "python3": "python",
+    "js": "javascript",
+    "node": "javascript",
+    "nodejs": "javascript",
+    "cpp": "c++",
+    "golang": "go",
+    "sh": "bash",
+    "shell": "bash",
+    "rb": "ruby",
+}
+
+
+class SandboxUnavailable(HTTPException):
+    def __init__(self, detail: str, retry_after: int = None):
+        super().__init__(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)} if retry_after else None,
+        )
+
+
+def normalize_language(language: str) -> str:
+    language = language.strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+class SandboxWorker:
+    """
+    One long-lived worker process (utils/sandbox_worker.py) that runs a job at a time.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.languages = []
+        self.checkers = []
+        self.isolation_error = ""
+        self.confinement_error = ""
+
+    @classmethod
+    async def spawn(cls) -> "SandboxWorker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-I", WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            # Nothing from the server environment (API keys) reaches the jobs
+            env={"PATH": os.environ.get("PATH", "/usr/bin:/bin"), "SANDBOX_USER": SANDBOX_USER},
+            # Output events carry up to 64 KiB of JSON-escaped text per line
+            limit=1 << 20,
+        )
+        worker = cls(process)
+        ready = await worker.read()
+        worker.languages = ready["languages"]
+        worker.checkers = ready["checkers"]
+        worker.isolation_error = ready["isolation_error"]
+        worker.confinement_error = ready["confinement_error"]
+        return worker
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def send(self, message: dict) -> None:
+        self.process.stdin.write((json.dumps(message) + "\n").encode())
+        await self.process.stdin.drain()
+
+    async def read(self) -> dict:
+        line = await self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("Sandbox worker exited")
+        return json.loads(line)
+
+    async def kill(self, grace: float = 0) -> None:
+        if grace and self.alive:
+            # Closing stdin ends the worker's job loop
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), grace)
+            except asyncio.TimeoutError:
+                pass
+        if self.alive:
+            self.process.kill()
+        await self.process.wait()
+
+
+class SandboxPool:
+    """
+    Pool of warm sandbox workers. Each run forks a fresh child from an idle worker,
+    limited in CPU time, memory, wall clock and output, with no network access and no
+    view of the host filesystem beyond the toolchains, so per-run overhead is a fork
+    rather than an interpreter start.
+    """
+
+    def __init__(self, workers: int = SANDBOX_WORKERS):
+        self.workers = workers
+        self.languages = []
+        # Languages utils.validate can syntax-check here
+        self.checkers = []
+        self.error = None
+        self._idle = None
+        self._workers = set()
+        self.stats = {"runs": 0, "timeouts": 0, "cancelled": 0, "respawns": 0}
+
+    def limits(self) -> dict:
+        return {
+            "cpu_seconds": SANDBOX_CPU_SECONDS,
+            "memory_bytes": SANDBOX_MEMORY_MB * 1024 * 1024,
+            "wall_seconds": SANDBOX_WALL_SECONDS,
+            "output_bytes": SANDBOX_MAX_OUTPUT_BYTES,
+            # Compilers write objects and binaries into the job directory
+            "file_bytes": SANDBOX_MAX_FILE_MB * 1024 * 1024,
+            "processes": 64,
+        }
+
+    async def start(self) -> None:
+        self._idle = asyncio.Queue()
+        if self.workers <= 0:
+            self.error = "Code execution is disabled"
+            return
+        try:
+            workers = await asyncio.gather(*(SandboxWorker.spawn() for _ in range(self.workers)))
+        except Exception as e:
+            self.error = f"Sandbox workers failed to start: {e}"
+            return
+
+        self._workers.update(workers)
+        isolation_error = workers[0].isolation_error
+        if isolation_error and SANDBOX_REQUIRE_NO_NETWORK:
+            self.error = f"Sandbox network isolation unavailable ({isolation_error})"
+            await self.stop()
+            return
+        confinement_error = workers[0].confinement_error
+        if confinement_error and SANDBOX_REQUIRE_CONFINEMENT:
+            self.error = f"Sandbox confinement unavailable ({confinement_error})"
+            await self.stop()
+            return
+        self.languages = workers[0].languages
+        self.checkers = workers[0].checkers
+        for worker in workers:
+            self._idle.put_nowait(worker)
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, set()
+        await asyncio.gather(*(worker.kill(grace=1) for worker in workers), return_exceptions=True)
+
+    def check(self, language: str, code: str, syntax_only: bool = False) -> str:
+        """
+        Returns the normalized language, raising if the code cannot run (or, with
+        `syntax_only`, be syntax-checked) here.
+        """
+        if self.error:
+            raise SandboxUnavailable(self.error)
+        language = normalize_language(language)
+        available = self.checkers if syntax_only else self.languages
+        if language not in available:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported language {language!r}; available: {', '.join(available)}",
+            )
+        if len(code.encode()) > SANDBOX_MAX_CODE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Code exceeds {SANDBOX_MAX_CODE_BYTES} bytes")
+        return language
+
+    async def _acquire(self) -> SandboxWorker:
+        try:
+            return await asyncio.wait_for(self._idle.get(), SANDBOX_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SandboxUnavailable("All sandbox workers are busy, retry later", retry_after=1)
+
+    async def _release(self, worker: SandboxWorker, healthy: bool) -> None:
+        if healthy and worker.alive:
+            self._idle.put_nowait(worker)
+            return
+        # A wedged or crashed worker is replaced so the pool keeps its size
+        self._workers.discard(worker)
+        await worker.kill()
+        self.stats["respawns"] += 1
+        try:
+            replacement = await SandboxWorker.spawn()
+        except Exception:
+            return
+        self._workers.add(replacement)
+        self._idle.put_nowait(replacement)
+
+    async def _drain(self, worker: SandboxWorker) -> None:
+        """
+        Cancels the running job and returns the worker once it reports the exit.
+        """
+        try:
+            await worker.send({"type": "cancel"})
+            while (await asyncio.wait_for(worker.read(), SANDBOX_WALL_SECONDS))["type"] != "exit":
+                pass
+        except Exception:
+            await self._release(worker, healthy=False)
+        else:
+            await self._release(worker, healthy=True)
+
+    async def run(self, language: str, code: str, syntax_only: bool = False):
+        """
+        Runs `code` and yields events as they happen: {"type": "stdout"|"stderr", "data"}
+        then one {"type": "exit", "exit_code", "reason", "duration_ms"}. With `syntax_only`,
+        the language's checker runs on it instead (see TOOLCHAINS in the worker).
+        """
+        language = self.check(language, code, syntax_only)
+
+        worker = await self._acquire()
+        start = time.perf_counter()
+        finished = False
+        try:
+            await worker.send({
+                "type": "run", "language": language, "code": code, "limits": self.limits(), "syntax_only": syntax_only,
+            })
+            while True:
+                # The worker enforces the wall clock; this only catches a wedged worker
+                event = await asyncio.wait_for(worker.read(), SANDBOX_WALL_SECONDS + 5)
+                if event["type"] == "exit":
+                    finished = True
+                    self.stats["runs"] += 1
+                    if event["reason"] == "timeout":
+                        self.stats["timeouts"] += 1
+                    SANDBOX_RUNS.labels(language, event["reason"].split(":")[0]).inc()
+                    SANDBOX_RUN_LATENCY.labels(language).observe(time.perf_counter() - start)
+                yield event
+                if finished:
+                    break
+        except (asyncio.TimeoutError, RuntimeError):
+            await self._release(worker, healthy=False)
+            raise HTTPException(status_code=500, detail="Sandbox worker stopped responding")
+        finally:
+            if finished:
+                await self._release(worker, healthy=True)
+            elif worker.alive and worker in self._workers:
+                # Client went away mid-run: cancel it without holding up the response
+                self.stats["cancelled"] += 1
+                asyncio.get_running_loop().create_task(self._drain(worker))
+
+    async def execute(self, language: str, code: str, syntax_only: bool = False) -> dict:
+        """
+        Runs `code` to completion and returns its collected output.
+        """
+        output = {"stdout": [], "stderr": []}
+        async for event in self.run(language, code, syntax_only):
+            if event["type"] == "exit":
+                return {
+                    "language": normalize_language(language),
+                    "stdout": "".join(output["stdout"]),
+                    "stderr": "".join(output["stderr"]),
+                    "exit_code": event["exit_code"],
+                    "reason": event["reason"],
+                    "duration_ms": round(event["duration_ms"], 2),
+                }
+            output[event["type"]].append(event["data"])
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "workers": len(self._workers),
+            "idle": self._idle.qsize() if self._idle else 0,
+            "languages": self.languages,
+            "checkers": self.checkers,
+            "error": self.error,
+        }
+
+
+# Started and stopped by the app lifespan
+sandbox_pool = SandboxPool()
@@ -0,0 +1,519 @@
+# Long-lived sandbox worker, started by utils.sandbox. Standard library only so it
+# starts fast and stays small. Reads one JSON job per line on stdin, forks a
+# resource-limited child per job and writes JSON events (stdout, stderr, exit) to stdout.
+import codecs
+import ctypes
+import json
+import os
+import pwd
+import resource
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MNT_DETACH = 0x2
+PR_SET_NO_NEW_PRIVS = 38
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.mount.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_ulong, ctypes.c_char_p]
+
+# How each language is written and run inside its job directory, and syntax-checked
+# without running it (utils.validate; Python is checked in the server). Toolchains whose
+# runtimes reserve large virtual address ranges (V8, Go) get no RLIMIT_AS.
+TOOLCHAINS = {
+    "python": {"file": "main.py", "inline": True},
+    "javascript": {"file": "main.js", "run": ["node", "main.js"], "check": ["node", "--check", "main.js"], "address_space": False},
+    "bash": {"file": "main.sh", "run": ["bash", "main.sh"], "check": ["bash", "-n", "main.sh"]},
+    "ruby": {"file": "main.rb", "run": ["ruby", "main.rb"], "check": ["ruby", "-c", "main.rb"]},
+    "php": {"file": "main.php", "run": ["php", "main.php"], "check": ["php", "-l", "main.php"]},
+    "c": {"file": "main.c", "build": ["gcc", "-O1", "-o", "main", "main.c", "-lm"], "run": ["./main"], "check": ["gcc", "-fsyntax-only", "main.c"]},
+    "c++": {"file": "main.cpp", "build": ["g++", "-O1", "-o", "main", "main.cpp"], "run": ["./main"], "check": ["g++", "-fsyntax-only", "main.cpp"]},
+    "go": {"file": "main.go", "run": ["go", "run", "main.go"], "check": ["gofmt", "-e", "-l", "main.go"], "address_space": False},
+}
+
+# Imported once in the worker so forked Python jobs get them for free
+PRELOAD = [
+    "collections", "dataclasses", "datetime", "decimal", "fractions", "functools", "heapq",
+    "itertools", "json", "math", "random", "re", "statistics", "string", "typing",
+]
+
+# Build cache shared by every Go job on the host; a cold standard library build takes
+# longer than the wall clock limit, so it is kept across runs and restarts
+GO_CACHE = os.path.join(tempfile.gettempdir(), "sandbox-gocache")
+
+# The root every job is confined to: a tmpfs holding their directories and read-only binds of the
+# toolchains (see `confine`). Host paths a job may see; missing ones are skipped.
+ROOT = tempfile.mkdtemp(prefix="sandbox-")
+JOBS_DIR = os.path.join(ROOT, "jobs")
+READ_ONLY_PATHS = [
+    "/usr", "/bin", "/sbin", "/lib", "/lib32", "/lib64", "/libx32",
+    "/etc/alternatives", "/etc/ld.so.cache", "/etc/ld.so.conf", "/etc/ld.so.conf.d",
+]
+DEVICES = ["/dev/null", "/dev/zero", "/dev/full", "/dev/random", "/dev/urandom"]
+# Set once the root is built; jobs only run unconfined when the server allows it
+CONFINED = False
+
+out = sys.stdout
+# The protocol owns fd 1; stray prints from this process must not corrupt it
+sys.stdout = sys.stderr
+
+
+def emit(event: dict) -> None:
+    out.write(json.dumps(event) + "\n")
+    out.flush()
+
+
+def check(result: int, what: str) -> None:
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def mount(source: str, target: str, fstype: str = None, flags: int = 0, data: str = None) -> None:
+    encode = lambda value: value.encode() if value is not None else None
+    check(libc.mount(encode(source), encode(target), encode(fstype), flags, encode(data)), f"mount {target}")
+
+
+def isolate_network() -> str:
+    """
+    Moves this worker (and so every job it forks) into empty network, mount and IPC
+    namespaces; when not root, inside a user namespace with the same ids mapped.
+    """
+    uid, gid = os.getuid(), os.getgid()
+    flags = CLONE_NEWNET | CLONE_NEWNS | CLONE_NEWIPC
+    if uid != 0:
+        flags |= CLONE_NEWUSER
+    if libc.unshare(flags) != 0:
+        return f"unshare failed: {os.strerror(ctypes.get_errno())}"
+    if uid != 0:
+        # Identity maps, so file ownership and the getuid() checks read as outside
+        try:
+            for name, line in [("uid_map", f"{uid} {uid} 1"), ("setgroups", "deny"), ("gid_map", f"{gid} {gid} 1")]:
+                with open(f"/proc/self/{name}", "w") as f:
+                    f.write(line)
+        except OSError as e:
+            return f"user namespace mapping failed: {e}"
+    return ""
+
+
+def toolchain_paths() -> list:
+    """
+    Host paths bound into the root: the system directories plus the install prefix of
+    this interpreter and of every toolchain found outside them.
+    """
+    paths = [path for path in READ_ONLY_PATHS if os.path.lexists(path)]
+    covered = {os.path.realpath(path) for path in paths}
+    prefixes = {sys.prefix, sys.base_prefix}
+    for toolchain in TOOLCHAINS.values():
+        for command in (toolchain.get("build"), toolchain.get("run")):
+            found = command and shutil.which(command[0])
+            if found:
+                prefixes.add(os.path.dirname(os.path.dirname(os.path.realpath(found))))
+    for prefix in sorted(prefixes):
+        prefix = os.path.realpath(prefix)
+        if prefix != "/" and not any(prefix == path or prefix.startswith(path + "/") for path in covered):
+            paths.append(prefix)
+            covered.add(prefix)
+    return paths
+
+
+def bind(path: str, writable: bool = False) -> None:
+    """
+    Makes host `path` visible at the same place under ROOT.
+    """
+    target = ROOT + path
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.islink(path):
+        # e.g. /bin -> usr/bin on merged-/usr systems
+        os.symlink(os.readlink(path), target)
+        return
+    if os.path.isdir(path):
+        os.makedirs(target, exist_ok=True)
+    else:
+        open(target, "a").close()
+    mount(path, target, None, MS_BIND | MS_REC)
+    flags = MS_BIND | MS_REMOUNT | MS_NOSUID | (0 if writable else MS_RDONLY)
+    if path not in DEVICES:
+        flags |= MS_NODEV
+    # Submounts came along with MS_REC; each one is remounted as well
+    with open("/proc/self/mounts") as f:
+        mountpoints = [line.split()[1].replace("\\040", " ") for line in f]
+    for mountpoint in mountpoints:
+        if mountpoint == target or mountpoint.startswith(target + "/"):
+            # Flags the host mount has locked (noexec, nodev) must be kept
+            mount(None, mountpoint, None, flags | os.statvfs(mountpoint).f_flag & (MS_NOEXEC | MS_NODEV))
+
+
+def confine() -> str:
+    """
+    Builds ROOT, the only filesystem jobs see: a tmpfs holding their directories, with the
+    toolchains bound read-only, a few devices and the shared Go build cache. Nothing of the
+    server (its source, .env, databases, caches) is reachable from it.
+    """
+    global CONFINED
+    try:
+        # Nothing mounted here may propagate back to the host
+        mount(None, "/", None, MS_REC | MS_PRIVATE)
+        mount("tmpfs", ROOT, "tmpfs", MS_NOSUID | MS_NODEV, "mode=755")
+        for path in toolchain_paths():
+            bind(path)
+        for device in DEVICES:
+            bind(device, writable=True)
+        bind(GO_CACHE, writable=True)
+        os.makedirs(ROOT + "/proc")
+    except OSError as e:
+        return f"filesystem confinement failed: {e}"
+    CONFINED = True
+    return ""
+
+
+def runnable(command: str, user: str) -> bool:
+    """
+    Whether `command` is on PATH and, when jobs drop to `user`, reachable by others.
+    """
+    path = shutil.which(command)
+    if path is None:
+        return False
+    if os.getuid() != 0 or not user:
+        return True
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    while directory != "/":
+        if not os.stat(directory).st_mode & 0o001:
+            return False
+        directory = os.path.dirname(directory)
+    return bool(os.stat(path).st_mode & 0o001)
+
+
+def available_languages(user: str) -> list:
+    languages = []
+    for language, toolchain in TOOLCHAINS.items():
+        commands = [toolchain.get("build"), toolchain.get("run")]
+        if all(runnable(command[0], user) for command in commands if command and not command[0].startswith("./")):
+            languages.append(language)
+    return languages
+
+
+def available_checkers(user: str) -> list:
+    return [language for language, toolchain in TOOLCHAINS.items() if toolchain.get("check") and runnable(toolchain["check"][0], user)]
+
+
+def apply_limits(limits: dict, address_space: bool) -> None:
+    cpu = limits["cpu_seconds"]
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    if address_space:
+        memory = limits["memory_bytes"]
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limits["file_bytes"], limits["file_bytes"]))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if os.getuid() != 0:
+        # Counts every process of the sandbox uid, so it only applies once root is dropped
+        resource.setrlimit(resource.RLIMIT_NPROC, (limits["processes"], limits["processes"]))
+
+
+class CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def drop_privileges(user: str, directory: str) -> None:
+    """
+    Leaves the job no way to undo its confinement: as root, it switches to `user`;
+    otherwise it gives up the capabilities held in the worker's user namespace.
+    Either way setuid binaries cannot raise them again.
+    """
+    if os.getuid() == 0 and user:
+        entry = pwd.getpwnam(user)
+        os.chown(directory, entry.pw_uid, entry.pw_gid)
+        for name in os.listdir(directory):
+            os.chown(os.path.join(directory, name), entry.pw_uid, entry.pw_gid)
+        os.setgroups([])
+        os.setgid(entry.pw_gid)
+        os.setuid(entry.pw_uid)
+    else:
+        check(libc.capset(ctypes.byref(CapHeader(LINUX_CAPABILITY_VERSION_3, 0)), (CapData * 2)()), "capset")
+    check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "prctl")
+
+
+def privilege_error(user: str) -> str:
+    """
+    Why jobs could not drop privileges, or "".
+    """
+    if os.getuid() != 0:
+        return ""
+    if not user:
+        return "running as root and SANDBOX_USER is empty"
+    try:
+        if pwd.getpwnam(user).pw_uid == 0:
+            return f"SANDBOX_USER {user!r} is root"
+    except KeyError:
+        return f"SANDBOX_USER {user!r} does not exist"
+    return ""
+
+
+def child(job: dict, directory: str, stdout_w: int, stderr_w: int) -> None:
+    """
+    Runs in the forked child: never returns. When confined, the job runs in a fresh
+    PID namespace, so it can neither see nor signal the server or other jobs, and this
+    process relays its wait status.
+    """
+    code = 1
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(stdout_w, 1)
+        os.dup2(stderr_w, 2)
+        if not CONFINED:
+            os.chdir(directory)
+            job_process(job, directory)
+        check(libc.unshare(CLONE_NEWPID), "unshare")
+        status_r, status_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(status_r)
+            init(job, directory, status_w)
+        os.close(status_w)
+        os.waitpid(pid, 0)
+        data = os.read(status_r, 4)
+        status = int.from_bytes(data, "little") if len(data) == 4 else 1 << 8
+        if os.WIFSIGNALED(status):
+            # Die of the same signal, so the worker reports it as the job's
+            resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+            signal.signal(os.WTERMSIG(status), signal.SIG_DFL)
+            os.kill(os.getpid(), os.WTERMSIG(status))
+        code = os.waitstatus_to_exitcode(status)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(code)
+
+
+def init(job: dict, directory: str, status_w: int) -> None:
+    """
+    PID 1 of the job's namespace: mounts its /proc, enters ROOT and waits for the job,
+    writing its wait status to `status_w`. Never returns; when it exits, anything the
+    job left running is killed with the namespace.
+    """
+    status = 1 << 8
+    try:
+        check(libc.unshare(CLONE_NEWNS), "unshare")
+        try:
+            mount("proc", ROOT + "/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+        except OSError:
+            # Not every kernel allows a fresh /proc in a user namespace; jobs do without
+            pass
+        os.chroot(ROOT)
+        directory = directory[len(ROOT):]
+        os.chdir(directory)
+        pid = os.fork()
+        if pid == 0:
+            os.close(status_w)
+            job_process(job, directory)
+        _, status = os.waitpid(pid, 0)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os.write(status_w, status.to_bytes(4, "little"))
+        os._exit(0)
+
+
+def job_process(job: dict, directory: str) -> None:
+    """
+    Runs the job itself, in `directory` (the current directory): never returns.
+    """
+    code = 1
+    try:
+        toolchain = TOOLCHAINS[job["language"]]
+        env = {"PATH": os.environ.get("PATH", "/usr/bin:/bin"), "HOME": directory, "TMPDIR": directory, "LANG": "C.UTF-8"}
+        if job["language"] == "go":
+            env.update({"GOCACHE": GO_CACHE, "GOPATH": os.path.join(directory, ".go"), "GO111MODULE": "off"})
+        drop_privileges(os.environ.get("SANDBOX_USER"), directory)
+        apply_limits(job["limits"], toolchain.get("address_space", True))
+
+        if toolchain.get("inline"):
+            # Warm path: the interpreter is already loaded, so just run the code
+            sys.stdin = open(0, "r", closefd=False)
+            sys.stdout = open(1, "w", buffering=1, closefd=False)
+            sys.stderr = open(2, "w", buffering=1, closefd=False)
+            sys.argv = ["main.py"]
+            os.environ.clear()
+            os.environ.update(env)
+            try:
+                exec(compile(job["code"], "main.py", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                if e.code is not None and not isinstance(e.code, int):
+                    print(e.code, file=sys.stderr)
+            except BaseException as e:
+                # Start the traceback at the job's own frames
+                traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+                code = 1
+            sys.stdout.flush()
+            sys.stderr.flush()
+        elif job.get("syntax_only"):
+            os.execvpe(toolchain["check"][0], toolchain["check"], env)
+        else:
+            if toolchain.get("build"):
+                build = subprocess.run(toolchain["build"], env=env, stdin=subprocess.DEVNULL)
+                if build.returncode != 0:
+                    os._exit(build.returncode)
+            os.execvpe(toolchain["run"][0], toolchain["run"], env)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(code)
+
+
+def kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run(job: dict) -> None:
+    limits = job["limits"]
+    toolchain = TOOLCHAINS.get(job["language"])
+    if toolchain is None or job.get("syntax_only") and not toolchain.get("check"):
+        emit({"type": "exit", "exit_code": None, "reason": "unsupported", "duration_ms": 0})
+        return
+
+    directory = tempfile.mkdtemp(prefix="job-", dir=JOBS_DIR)
+    start = time.monotonic()
+    try:
+        with open(os.path.join(directory, toolchain["file"]), "w") as f:
+            f.write(job["code"])
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(stdout_r)
+            os.close(stderr_r)
+            child(job, directory, stdout_w, stderr_w)
+        os.close(stdout_w)
+        os.close(stderr_w)
+
+        streams = {stdout_r: "stdout", stderr_r: "stderr"}
+        decoders = {fd: codecs.getincrementaldecoder("utf-8")("replace") for fd in streams}
+        # Readable once the job's main process exits, even if children it left hold the pipes
+        exited = os.pidfd_open(pid)
+        deadline = start + limits["wall_seconds"]
+        written = 0
+        reason = None
+        leader_done = False
+        while streams:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                reason = "timeout"
+                break
+            # After the main process exits, only forward what is already buffered
+            watched = list(streams) if leader_done else list(streams) + [sys.stdin, exited]
+            ready, _, _ = select.select(watched, [], [], 0 if leader_done else remaining)
+            if not ready and leader_done:
+                break
+            if sys.stdin in ready:
+                line = sys.stdin.readline()
+                if not line or json.loads(line).get("type") == "cancel":
+                    reason = "cancelled"
+                    break
+            leader_done = leader_done or exited in ready
+            for fd in ready:
+                if fd not in streams:
+                    continue
+                data = os.read(fd, 65536)
+                if not data:
+                    os.close(fd)
+                    del streams[fd]
+                    continue
+                written += len(data)
+                if written > limits["output_bytes"]:
+                    reason = "output_limit"
+                    break
+                emit({"type": streams[fd], "data": decoders[fd].decode(data)})
+            if reason:
+                break
+        os.close(exited)
+
+        if reason:
+            kill_group(pid)
+        for fd in streams:
+            os.close(fd)
+        _, status = os.waitpid(pid, 0)
+        # Background processes the job left behind go with it
+        kill_group(pid)
+        exit_code = os.waitstatus_to_exitcode(status)
+        if reason is None:
+            if exit_code == -signal.SIGXCPU or exit_code == -signal.SIGKILL and time.monotonic() - start >= limits["cpu_seconds"]:
+                reason = "cpu_limit"
+            elif exit_code < 0:
+                reason = f"signal:{signal.Signals(-exit_code).name}"
+            else:
+                reason = "exited"
+        emit({"type": "exit", "exit_code": exit_code, "reason": reason, "duration_ms": (time.monotonic() - start) * 1000})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> None:
+    # Jobs are children of this process; reap them explicitly with waitpid
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    user = os.environ.get("SANDBOX_USER")
+    isolation_error = isolate_network()
+    os.makedirs(GO_CACHE, exist_ok=True)
+    confinement_error = privilege_error(user) or isolation_error or confine()
+    os.makedirs(JOBS_DIR, mode=0o711)
+    os.chmod(JOBS_DIR, 0o711)
+    if os.getuid() == 0 and not privilege_error(user):
+        entry = pwd.getpwnam(user)
+        os.chown(GO_CACHE, entry.pw_uid, entry.pw_gid)
+    for module in PRELOAD:
+        __import__(module)
+    emit({
+        "type": "ready",
+        "languages": available_languages(user),
+        "checkers": available_checkers(user),
+        "isolation_error": isolation_error,
+        "confinement_error": confinement_error,
+    })
+    # readline, not iteration: select() on stdin must not miss lines buffered by read-ahead
+    for line in iter(sys.stdin.readline, ""):
+        job = json.loads(line)
+        if job.get("type") != "run":
+            continue
+        try:
+            run(job)
+        except Exception as e:
+            emit({"type": "exit", "exit_code": None, "reason": f"error: {e}", "duration_ms": 0})
+    if CONFINED:
+        # Detach the binds first: removing the tree must not reach into them
+        libc.umount2(ROOT.encode(), MNT_DETACH)
+    shutil.rmtree(ROOT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from fastapi import HTTPException
+
+# Per-model admission limits; override with SCHEDULER_MODEL_LIMITS='{"gpt-4o": {"concurrency": 8, "tpm": 30000}}'
+DEFAULT_MODEL_LIMITS = {
+    "gpt-4o-mini": {"concurrency": 32, "tpm": 200000},
+    "gpt-4o": {"concurrency": 16, "tpm": 30000},
+}
+MODEL_LIMITS = {**DEFAULT_MODEL_LIMITS, **json.loads(os.getenv("SCHEDULER_MODEL_LIMITS", "{}"))}
+FALLBACK_LIMITS = {"concurrency": 16, "tpm": 100000}
+# The limits are per deployment; each worker process admits its share. serve.py sets this to --workers.
+SCHEDULER_WORKERS = max(1, int(os.getenv("SCHEDULER_WORKERS", 1)))
+
+# Priority class -> (rank, max seconds a request may wait before it is shed). Lower rank runs first.
+PRIORITY_CLASSES = {
+    "chat": (0, float(os.getenv("SCHEDULER_CHAT_DEADLINE", 5))),
+    "code": (1, float(os.getenv("SCHEDULER_CODE_DEADLINE", 10))),
+    "story": (2, float(os.getenv("SCHEDULER_STORY_DEADLINE", 15))),
+    "default": (2, 15.0),
+    "document": (3, float(os.getenv("SCHEDULER_DOCUMENT_DEADLINE", 30))),
+    "batch": (4, float(os.getenv("SCHEDULER_BATCH_DEADLINE", 60))),
+}
+
+# Completion budget assumed when a request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+TOKEN_WINDOW_SECONDS = 60.0
+
+# Set per request by the `priority` dependency
+request_priority = ContextVar("request_priority", default="default")
+# Slot reserved before a streaming response starts, claimed by the request's first upstream call
+reserved_slot = ContextVar("reserved_slot", default=None)
+
+
+class Overloaded(HTTPException):
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"Upstream capacity for {model} exhausted, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def estimate_tokens(messages: list, max_tokens: int = None) -> int:
+    """
+    Rough token cost of a request: ~4 characters per prompt token plus the completion budget.
+    """
+    prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+    return prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+class ModelScheduler:
+    """
+    Admits requests for one model under a concurrency limit and a tokens-per-minute budget.
+    Waiting requests are served by priority rank, then arrival. A request predicted to
+    start after its deadline is rejected with `Overloaded` on arrival; one that still
+    has not started by its deadline is rejected then.
+    """
+
+    def __init__(self, model: str, concurrency: int, tpm: int):
+        self.model = model
+        self.concurrency = concurrency
+        self.tpm = tpm
+        self.active = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._window = deque()
+        self._window_tokens = 0
+        self._timer = None
+        self._service_time = 1.0
+        self.stats = {"admitted": 0, "shed": 0}
+
+    def _expire_window(self, now: float) -> None:
+        while self._window and self._window[0][0] <= now - TOKEN_WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        self._expire_window(now)
+        while self._heap and self.active < self.concurrency:
+            _, _, tokens, future = self._heap[0]
+            if future.done():
+                heapq.heappop(self._heap)
+                continue
+            # A request larger than the whole budget still runs once the window is empty
+            if self._window and self._window_tokens + tokens > self.tpm:
+                self._schedule_wakeup(self._window[0][0] + TOKEN_WINDOW_SECONDS - now)
+                break
+            heapq.heappop(self._heap)
+            self.active += 1
+            self._window.append((now, tokens))
+            self._window_tokens += tokens
+            future.set_result(None)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        if self._timer is None:
+            def wakeup():
+                self._timer = None
+                self._dispatch()
+
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.01), wakeup)
+
+    def predict_wait(self, tokens: int, rank: int) -> float:
+        """
+        Seconds until a request of `tokens` at priority `rank` would start. Requests
+        queued ahead of it drain `concurrency` at a time at the observed service time,
+        and the tokens-per-minute window has to expire enough tokens to fit it.
+        """
+        now = time.monotonic()
+        self._expire_window(now)
+        ahead = [entry for entry in self._heap if entry[0] <= rank and not entry[3].done()]
+
+        completions = self.active + len(ahead) + 1 - self.concurrency
+        slot_wait = math.ceil(completions / self.concurrency) * self._service_time if completions > 0 else 0.0
+
+        token_wait = 0.0
+        ahead_tokens = sum(entry[2] for entry in ahead)
+        excess = self._window_tokens + ahead_tokens + tokens - self.tpm
+        # A request larger than the whole budget still runs once the window is empty
+        if excess > 0 and (self._window or ahead):
+            for started, window_tokens in self._window:
+                excess -= window_tokens
+                if excess <= 0:
+                    token_wait = started + TOKEN_WINDOW_SECONDS - now
+                    break
+            else:
+                # Not even an empty window fits it: the queue ahead fills further windows first
+                last = self._window[-1][0] + TOKEN_WINDOW_SECONDS - now if self._window else 0.0
+                token_wait = last + TOKEN_WINDOW_SECONDS * math.ceil(ahead_tokens / self.tpm)
+        return max(slot_wait, token_wait)
+
+    def retry_after(self, tokens: int, rank: int) -> int:
+        return max(1, math.ceil(self.predict_wait(tokens, rank)))
+
+    async def acquire(self, tokens: int, priority: str) -> None:
+        rank, deadline = PRIORITY_CLASSES.get(priority, PRIORITY_CLASSES["default"])
+        wait = self.predict_wait(tokens, rank)
+        if wait > deadline:
+            # No point queueing for the whole deadline only to be shed
+            self.stats["shed"] += 1
+            raise Overloaded(self.model, max(1, math.ceil(wait)))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (rank, next(self._sequence), tokens, future))
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), deadline)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return
+            future.cancel()
+            self.stats["shed"] += 1
+            raise Overloaded(self.model, self.retry_after(tokens, rank))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(0.0)
+            else:
+                future.cancel()
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self, elapsed: float) -> None:
+        self.active -= 1
+        if elapsed:
+            self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+        self._dispatch()
+
+
+class Scheduler:
+    """
+    Front door for upstream model calls, holding one `ModelScheduler` per model.
+    """
+
+    def __init__(self, limits: dict = None):
+        self.limits = limits or MODEL_LIMITS
+        self._models = {}
+
+    def for_model(self, model: str) -> ModelScheduler:
+        if model not in self._models:
+            limits = self.limits.get(model, FALLBACK_LIMITS)
+            self._models[model] = ModelScheduler(
+                model,
+                max(1, limits["concurrency"] // SCHEDULER_WORKERS),
+                max(1, limits["tpm"] // SCHEDULER_WORKERS),
+            )
+        return self._models[model]
+
+    @asynccontextmanager
+    async def slot(self, model: str, messages: list, max_tokens: int = None):
+        """
+        Holds an upstream slot for `model` for the duration of the block, taking over
+        the request's reserved slot if it is for the same model.
+        """
+        reservation = reserved_slot.get()
+        if reservation is not None and reservation.model == model and reservation.available:
+            reservation.claimed = True
+        else:
+            reservation = await self.reserve(model, messages, max_tokens)
+            reservation.claimed = True
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            reservation.release(time.monotonic() - start)
+
+    async def reserve(self, model: str, messages: list, max_tokens: int = None) -> "Reservation":
+        """
+        Acquires a slot for `model` ahead of time, so a streaming route can reject with a
+        503 and Retry-After before its response starts. Pass it to `holding`.
+        """
+        scheduler = self.for_model(model)
+        await scheduler.acquire(estimate_tokens(messages, max_tokens), request_priority.get())
+        return Reservation(scheduler)
+
+    async def holding(self, reservation: "Reservation", tokens):
+        """
+        Forwards `tokens` with `reservation` available to the upstream call made while
+        producing them. If that call does not claim it (a cache hit, a coalesced
+        follower), the slot is freed at the first token.
+        """
+        reserved_slot.set(reservation)
+        try:
+            async for token in tokens:
+                if reservation.available:
+                    reservation.release()
+                yield token
+        finally:
+            if reservation.available:
+                reservation.release()
+
+    def get_stats(self) -> dict:
+        return {
+            model: {
+                **scheduler.stats,
+                "active": scheduler.active,
+                "queued": len(scheduler._heap),
+                "window_tokens": scheduler._window_tokens,
+            }
+            for model, scheduler in self._models.items()
+        }
+
+
+class Reservation:
+    """
+    One admitted slot on a `ModelScheduler`; released exactly once.
+    """
+
+    def __init__(self, scheduler: ModelScheduler):
+        self.scheduler = scheduler
+        self.model = scheduler.model
+        self.claimed = False
+        self._released = False
+
+    @property
+    def available(self) -> bool:
+        return not self.claimed and not self._released
+
+    def __del__(self):
+        # A streaming response that was never iterated drops its reservation unreleased
+        if self.available:
+            self.release()
+
+    def release(self, elapsed: float = 0.0) -> None:
+        if not self._released:
+            self._released = True
+            self.scheduler.release(elapsed)
+
+
+scheduler = Scheduler()
+
+
+def priority(kind: str):
+    """
+    Route dependency factory tagging upstream calls made by the route with a priority class.
+    """
+
+    async def set_priority() -> None:
+        request_priority.set(kind)
+
+    return set_priority
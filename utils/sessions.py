@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+
+# Chat session settings
+CHAT_SESSION_DB_PATH = os.getenv("CHAT_SESSION_DB_PATH", "data/sessions.db")
+CHAT_SESSION_TTL_SECONDS = float(os.getenv("CHAT_SESSION_TTL_SECONDS", 7 * 24 * 3600))
+# Token budget for the verbatim recent turns sent with every message
+CHAT_WINDOW_TOKENS = int(os.getenv("CHAT_WINDOW_TOKENS", 2000))
+# Fold turns that left the window into the summary once they add up to this many tokens
+CHAT_SUMMARY_BATCH_TOKENS = int(os.getenv("CHAT_SUMMARY_BATCH_TOKENS", 500))
+# Completion budget for the rolling summary, which bounds its size
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", 300))
+# Upper bound on turns read back when building a window
+CHAT_WINDOW_MAX_TURNS = 200
+
+
+class SessionNotFound(HTTPException):
+    def __init__(self, session_id: str):
+        super().__init__(status_code=404, detail=f"Chat session {session_id} not found")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Rough token count, ~4 characters per token (same estimate as the scheduler).
+    """
+    return len(text) // 4 + 1
+
+
+class SessionStore:
+    """
+    SQLite store for chat sessions and their turns, shared by every uvicorn worker on the host.
+    Each session keeps a rolling summary of the turns up to `summarized_through`.
+    """
+
+    def __init__(self, path: str = CHAT_SESSION_DB_PATH, ttl: float = CHAT_SESSION_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '', "
+                "summarized_through INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE, "
+                "role TEXT NOT NULL, content TEXT NOT NULL, tokens INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at)")
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,))
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def create(self, session_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?)", (session_id, now, now))
+            conn.commit()
+
+    def get(self, session_id: str):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT summary, summarized_through, created_at, updated_at FROM sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"session_id": session_id, "summary": row[0], "summarized_through": row[1], "created_at": row[2], "updated_at": row[3]}
+
+    def append(self, session_id: str, turns: list) -> None:
+        """
+        Stores (role, content) pairs in order.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO turns (session_id, role, content, tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(session_id, role, content, count_tokens(content), now) for role, content in turns],
+            )
+            conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+            conn.commit()
+
+    def unsummarized(self, session_id: str, after: int) -> list:
+        """
+        Returns the newest turns not yet folded into the summary, oldest first.
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, role, content, tokens FROM turns WHERE session_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+                (session_id, after, CHAT_WINDOW_MAX_TURNS),
+            ).fetchall()
+        return [{"id": r[0], "role": r[1], "content": r[2], "tokens": r[3]} for r in reversed(rows)]
+
+    def history(self, session_id: str, before: int = None, limit: int = 50) -> list:
+        """
+        Returns up to `limit` turns older than turn id `before` (newest page by default), oldest first.
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, role, content, created_at FROM turns WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before if before is not None else 2 ** 63 - 1, limit),
+            ).fetchall()
+        return [{"id": r[0], "role": r[1], "content": r[2], "created_at": r[3]} for r in reversed(rows)]
+
+    def set_summary(self, session_id: str, summary: str, through: int) -> None:
+        with self._lock:
+            conn = self._connect()
+            # Never move the summary backwards if another worker got there first
+            conn.execute(
+                "UPDATE sessions SET summary = ?, summarized_through = ? WHERE id = ? AND summarized_through < ?",
+                (summary, through, session_id, through),
+            )
+            conn.commit()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+            conn.commit()
+        return deleted > 0
+
+
+def split_window(turns: list, budget: int) -> tuple:
+    """
+    Splits turns (oldest first) into (evicted, window): the window is the longest
+    suffix that fits in `budget` tokens, always ending on whole turns.
+    """
+    used = 0
+    start = len(turns)
+    for i in range(len(turns) - 1, -1, -1):
+        if used + turns[i]["tokens"] > budget:
+            break
+        used += turns[i]["tokens"]
+        start = i
+    return turns[:start], turns[start:]
+
+
+class ChatSessions:
+    """
+    Server-side chat history with a bounded prompt: each message is sent with the
+    session summary plus the most recent turns. Once turns beyond the newest
+    `window_tokens` add up to `summary_batch_tokens`, they are folded into the summary
+    in the background, so the history sent stays under roughly window + batch tokens
+    plus the summary however long the conversation runs.
+    """
+
+    def __init__(self, store: SessionStore = None, window_tokens: int = CHAT_WINDOW_TOKENS, summary_batch_tokens: int = CHAT_SUMMARY_BATCH_TOKENS):
+        self.store = store or SessionStore()
+        self.window_tokens = window_tokens
+        self.summary_batch_tokens = summary_batch_tokens
+        self._summarizing = {}
+        self.stats = {"turns": 0, "summaries": 0, "summary_failures": 0}
+
+    async def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.store.create, session_id)
+        return session_id
+
+    async def get(self, session_id: str) -> dict:
+        session = await asyncio.to_thread(self.store.get, session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        return session
+
+    async def history(self, session_id: str, before: int = None, limit: int = 50) -> dict:
+        session = await self.get(session_id)
+        turns = await asyncio.to_thread(self.store.history, session_id, before, limit)
+        return {
+            "session_id": session_id,
+            "summary": session["summary"],
+            "turns": turns,
+            "next_before": turns[0]["id"] if len(turns) == limit else None,
+        }
+
+    async def delete(self, session_id: str) -> None:
+        if not await asyncio.to_thread(self.store.delete, session_id):
+            raise SessionNotFound(session_id)
+
+    async def context(self, session_id: str, prompt: str) -> list:
+        """
+        Returns the prior messages to send ahead of `prompt`: the summary, then the recent window.
+        """
+        session = await self.get(session_id)
+        turns = await asyncio.to_thread(self.store.unsummarized, session_id, session["summarized_through"])
+        # Turns waiting to be summarized still fit in the batch allowance
+        _, window = split_window(turns, self.window_tokens + self.summary_batch_tokens - count_tokens(prompt))
+
+        messages = []
+        if session["summary"]:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {session['summary']}"})
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in window)
+        return messages
+
+    async def record(self, session_id: str, prompt: str, reply: str, summarize) -> None:
+        """
+        Stores a completed exchange and, when enough turns have left the window, schedules
+        `summarize(previous_summary, turns)` to fold them into the summary.
+        """
+        await asyncio.to_thread(self.store.append, session_id, [("user", prompt), ("assistant", reply)])
+        self.stats["turns"] += 1
+        if session_id not in self._summarizing:
+            # A fresh context, so the summary call is not attributed to this request's
+            # generation, priority or scheduler reservation
+            task = asyncio.create_task(self._maybe_summarize(session_id, summarize), context=contextvars.Context())
+            self._summarizing[session_id] = task
+            task.add_done_callback(lambda _: self._summarizing.pop(session_id, None))
+
+    async def _maybe_summarize(self, session_id: str, summarize) -> None:
+        session = await asyncio.to_thread(self.store.get, session_id)
+        if session is None:
+            return
+        turns = await asyncio.to_thread(self.store.unsummarized, session_id, session["summarized_through"])
+        evicted, _ = split_window(turns, self.window_tokens)
+        if sum(turn["tokens"] for turn in evicted) < self.summary_batch_tokens:
+            return
+        try:
+            summary = await summarize(session["summary"], evicted)
+        except Exception:
+            # The turns stay unsummarized and are retried after the next exchange
+            self.stats["summary_failures"] += 1
+            return
+        await asyncio.to_thread(self.store.set_summary, session_id, summary, evicted[-1]["id"])
+        self.stats["summaries"] += 1
+
+    async def stop(self) -> None:
+        tasks = list(self._summarizing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+chat_sessions = ChatSessions()
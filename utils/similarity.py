@@ -0,0 +1,205 @@
+import hashlib
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+
+from utils.cache import CACHE_ENABLED, CACHE_TTL_SECONDS, bypass_cache
+
+# Near-duplicate cache settings
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.8))
+SIMILARITY_NUM_PERM = int(os.getenv("SIMILARITY_NUM_PERM", 64))
+SIMILARITY_BANDS = int(os.getenv("SIMILARITY_BANDS", 16))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", 4096))
+# Content words a hit may add or drop per this many content words; swapped words always miss
+SIMILARITY_WORDS_PER_EXTRA = int(os.getenv("SIMILARITY_WORDS_PER_EXTRA", 10))
+
+# Filler words that do not change what is being asked for
+STOPWORDS = {
+    "a", "an", "the", "in", "on", "of", "for", "to", "with", "using", "and", "or",
+    "write", "create", "make", "generate", "give", "show", "me", "please", "can",
+    "you", "i", "want", "need", "how", "do", "code", "program", "example", "some",
+    "simple", "function", "implement", "implementation", "is", "that", "it",
+}
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def tokenize(text: str, exclude: set = frozenset()) -> list:
+    """
+    Lowercases, strips punctuation, drops filler words and naive plural suffixes.
+    """
+    words = re.findall(r"[a-z0-9+#]+", text.lower())
+    tokens = []
+    for word in words:
+        if word in STOPWORDS or word in exclude:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def shingles(text: str, exclude: set = frozenset()) -> set:
+    """
+    Word unigrams plus order-independent word bigrams.
+    """
+    tokens = tokenize(text, exclude)
+    result = set(tokens)
+    for first, second in zip(tokens, tokens[1:]):
+        result.add(" ".join(sorted((first, second))))
+    return result
+
+
+def _hash_shingle(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with `num_perm` universal hash permutations.
+    """
+
+    def __init__(self, num_perm: int = SIMILARITY_NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, items: set) -> tuple:
+        if not items:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [_hash_shingle(item) for item in items]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.params
+        )
+
+
+def estimate_similarity(first: tuple, second: tuple) -> float:
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def same_request(first: frozenset, second: frozenset, words_per_extra: int = SIMILARITY_WORDS_PER_EXTRA) -> bool:
+    """
+    Whether two content-word sets ask for the same thing. A high shingle similarity alone
+    lets a long prompt differ in one key word (postgres/mysql, csv/json), so the sets must
+    match, except that the longer one may carry a few extra words. Those are allowed at
+    one per `words_per_extra` words.
+    """
+    if first == second:
+        return True
+    if not (first < second or second < first):
+        return False
+    return len(first ^ second) <= len(first | second) // words_per_extra
+
+
+class SimilarityCache:
+    """
+    Offline near-duplicate cache: MinHash signatures over word shingles,
+    indexed with LSH bands so a lookup only compares against likely matches.
+    Entries are scoped (e.g. by endpoint and normalized language) and bounded by count and TTL.
+    A candidate above the similarity threshold is only served if `same_request` holds.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        num_perm: int = SIMILARITY_NUM_PERM,
+        bands: int = SIMILARITY_BANDS,
+        max_entries: int = SIMILARITY_MAX_ENTRIES,
+        ttl: float = CACHE_TTL_SECONDS,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hasher = MinHasher(num_perm)
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._next_id = 0
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _band_keys(self, scope: str, signature: tuple) -> list:
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _signature(self, scope: str, text: str) -> tuple:
+        """
+        Returns (MinHash signature, content words) of `text`, or (None, None) when it has no content words.
+        """
+        # The scope words (e.g. the language name) carry no signal inside a scope
+        exclude = set(tokenize(scope.replace(":", " ")))
+        items = shingles(text, exclude)
+        if not items:
+            return None, None
+        return self.hasher.signature(items), frozenset(tokenize(text, exclude))
+
+    def get(self, scope: str, text: str):
+        if not CACHE_ENABLED or bypass_cache.get():
+            return None
+
+        signature, words = self._signature(scope, text)
+        if signature is None:
+            return None
+        now = time.monotonic()
+        candidates = set()
+        for key in self._band_keys(scope, signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            _, entry_signature, entry_words, _, expires_at = self._entries[entry_id]
+            if expires_at < now or not same_request(words, entry_words):
+                continue
+            score = estimate_similarity(signature, entry_signature)
+            if score > best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is not None and best_score >= self.threshold:
+            self._entries.move_to_end(best_id)
+            self.stats["hits"] += 1
+            return self._entries[best_id][3]
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, scope: str, text: str, value: str) -> None:
+        if not CACHE_ENABLED:
+            return
+
+        signature, words = self._signature(scope, text)
+        if signature is None:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (scope, signature, words, value, time.monotonic() + self.ttl)
+        for key in self._band_keys(scope, signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        scope, signature, _, _, _ = self._entries.pop(entry_id)
+        for key in self._band_keys(scope, signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+similar_cache = SimilarityCache()
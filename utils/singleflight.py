@@ -0,0 +1,151 @@
+import asyncio
+
+
+class SharedCallCancelled(Exception):
+    """
+    The shared upstream stream was cancelled after this subscriber had already received
+    tokens, so it cannot be taken over transparently. Not raised for the subscriber's own
+    cancellation.
+    """
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """
+    Token buffer shared by every subscriber of one in-flight stream.
+    Late subscribers replay the buffered tokens before following live ones.
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.cancelled = False
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            # Checked before replaying, so a subscriber that has nothing yet can start afresh
+            if self.cancelled or self.task.cancelling():
+                raise SharedCallCancelled("Shared upstream stream was cancelled")
+            while index < len(self.tokens):
+                yield self.tokens[index]
+                index += 1
+            if self.error is not None:
+                raise self.error
+            if self.done:
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests: callers sharing a key await one upstream call.
+    Errors reach every waiter; the upstream call is cancelled only once all its waiters are gone.
+    If the shared call is cancelled from elsewhere, a waiter that was not cancelled itself
+    starts a fresh call rather than seeing a CancelledError it did not ask for.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: str, fn):
+        """
+        Runs `fn()` once per key among concurrent callers and returns its result to all of them.
+        """
+        while True:
+            call = self._calls.get(key)
+            # A call being cancelled elsewhere is not worth joining
+            if call is None or call.task.cancelling():
+                call = _Call(asyncio.ensure_future(fn()))
+                self._calls[key] = call
+                call.task.add_done_callback(lambda _, call=call: self._forget(self._calls, key, call))
+                self.stats["leaders"] += 1
+            else:
+                self.stats["followers"] += 1
+
+            call.waiters += 1
+            try:
+                return await asyncio.shield(call.task)
+            except asyncio.CancelledError:
+                if call.task.cancelled() and not asyncio.current_task().cancelling():
+                    # The shared call was cancelled, not this caller: take over with a fresh one
+                    self._forget(self._calls, key, call)
+                    continue
+                if call.waiters == 1 and not call.task.done():
+                    # New callers must not join a call that is being cancelled
+                    self._forget(self._calls, key, call)
+                    call.task.cancel()
+                raise
+            finally:
+                call.waiters -= 1
+
+    async def stream(self, key: str, factory):
+        """
+        Async-iterates the tokens of `factory()` once per key, fanning them out to every concurrent subscriber.
+        If the shared stream is cancelled from elsewhere, a subscriber that has not received
+        any tokens yet starts a fresh one; one that has gets `SharedCallCancelled`.
+        """
+        received = 0
+        while True:
+            broadcast = self._streams.get(key)
+            if broadcast is None or broadcast.task.cancelling():
+                broadcast = _Broadcast()
+                self._streams[key] = broadcast
+                broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, factory))
+                self.stats["leaders"] += 1
+            else:
+                self.stats["followers"] += 1
+
+            broadcast.subscribers += 1
+            try:
+                async for token in broadcast.subscribe():
+                    received += 1
+                    yield token
+                return
+            except SharedCallCancelled:
+                if received:
+                    raise
+                self._forget(self._streams, key, broadcast)
+            finally:
+                broadcast.subscribers -= 1
+                if broadcast.subscribers == 0 and not broadcast.task.done():
+                    # New subscribers must not join a stream that is being cancelled
+                    self._forget(self._streams, key, broadcast)
+                    broadcast.task.cancel()
+
+    async def _produce(self, key: str, broadcast: _Broadcast, factory) -> None:
+        try:
+            async for token in factory():
+                broadcast.tokens.append(token)
+                broadcast.notify()
+        except asyncio.CancelledError:
+            broadcast.cancelled = True
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            self._forget(self._streams, key, broadcast)
+            broadcast.notify()
+
+    @staticmethod
+    def _forget(registry: dict, key: str, entry) -> None:
+        if registry.get(key) is entry:
+            del registry[key]
+
+
+inflight = SingleFlight()
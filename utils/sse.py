@@ -0,0 +1,65 @@
+import json
+
+from fastapi.responses import StreamingResponse
+
+
+def format_event(event: str, data: dict) -> str:
+    """
+    Formats a single Server-Sent Event with a JSON data line.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream_response(stream) -> StreamingResponse:
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def error_event(e: Exception) -> str:
+    # Headers are already sent, so errors are reported in-band
+    return format_event("error", {
+        "detail": getattr(e, "detail", None) or str(e),
+        "status_code": getattr(e, "status_code", 500),
+    })
+
+
+def sse_events(events) -> StreamingResponse:
+    """
+    Forwards dicts from an async iterator as events named by their `type` key.
+    """
+
+    async def event_stream():
+        try:
+            async for event in events:
+                yield format_event(event["type"], {key: value for key, value in event.items() if key != "type"})
+        except Exception as e:
+            yield error_event(e)
+
+    return event_stream_response(event_stream())
+
+
+def sse_response(tokens, build_payload) -> StreamingResponse:
+    """
+    Forwards text deltas from an async iterator as `token` events, then emits a
+    `done` event carrying the same payload the JSON endpoint returns.
+
+    Args:
+        tokens: Async iterator of text deltas.
+        build_payload: Async callable receiving the full text and returning the final payload.
+    """
+
+    async def event_stream():
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield format_event("token", {"text": token})
+            payload = await build_payload("".join(parts).strip())
+            yield format_event("done", payload)
+        except Exception as e:
+            yield error_event(e)
+
+    return event_stream_response(event_stream())
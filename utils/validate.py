@@ -0,0 +1,96 @@
+import asyncio
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+
+from utils.sandbox import normalize_language, sandbox_pool
+
+# Validation settings
+CODE_VALIDATION = os.getenv("CODE_VALIDATION", "false").lower() == "true"
+VALIDATE_WORKERS = int(os.getenv("VALIDATE_WORKERS", 2))
+VALIDATE_TIMEOUT = float(os.getenv("VALIDATE_TIMEOUT", 5))
+# Compiler diagnostics beyond this are noise for the repair request
+MAX_ERROR_CHARS = 2000
+# Checkers that print the source's absolute path (node) are reported with the file name alone
+SOURCE_PATH = re.compile(r"(?:/[^\s:/]+)+/(main\.\w+)")
+
+validation_stats = {
+    "checked": 0,
+    "unchecked": 0,
+    "first_pass_valid": 0,
+    "format_errors": 0,
+    "syntax_errors": 0,
+    "repairs": 0,
+    "repaired": 0,
+}
+
+_executor = None
+
+
+def checker_language(language: str) -> str:
+    """
+    Returns the checker key for `language`, or None when it cannot be checked here.
+    Also used as the metric label, so unknown languages collapse to None.
+    """
+    language = normalize_language(language)
+    if language == "python" or language in sandbox_pool.checkers:
+        return language
+    return None
+
+
+def check_python(code: str) -> str:
+    try:
+        # compile() also rejects what ast.parse accepts but the compiler does not (return outside a function)
+        compile(code, "main.py", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        line = f"\n    {e.text.rstrip()}" if e.text else ""
+        return f'File "main.py", line {e.lineno}: {e.msg}{line}'
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+async def check_in_sandbox(language: str, code: str) -> str:
+    """
+    Runs the language's checker on model-generated code in the sandbox pool (utils.sandbox),
+    which gives it no network, no view of the server's files and a scrubbed environment,
+    so the code cannot pull secrets into the diagnostics (e.g. `#include "/app/.env"`).
+    Returns the error text, or None when the code parses or no verdict was reached.
+    """
+    try:
+        result = await asyncio.wait_for(sandbox_pool.execute(language, code, syntax_only=True), VALIDATE_TIMEOUT)
+    except (asyncio.TimeoutError, HTTPException):
+        # A checker that hangs, or a busy sandbox, gives no verdict; the code is returned as generated
+        return None
+    if result["exit_code"] == 0 or result["reason"] != "exited":
+        return None
+    error = SOURCE_PATH.sub(r"\1", result["stderr"] or result["stdout"]).strip()
+    return error[:MAX_ERROR_CHARS] or f"{language} checker exited with {result['exit_code']}"
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=VALIDATE_WORKERS)
+    return _executor
+
+
+def shutdown_validate_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def check_in_pool(language: str, code: str) -> str:
+    """
+    Syntax-checks `code` for a checker key: Python in the process pool so parsing stays
+    off the event loop (compile() never runs the code), everything else in the sandbox.
+    Returns the error text, or None.
+    """
+    if language != "python":
+        return await check_in_sandbox(language, code)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), check_python, code)